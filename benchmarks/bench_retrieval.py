@@ -0,0 +1,278 @@
+# benchmarks/bench_retrieval.py
+#
+# Benchmark de recuperación con catálogos FAQ sintéticos.
+#
+# Uso:
+#   python -m benchmarks.bench_retrieval --sizes 1000,10000 --output bench_retrieval.json
+#
+# Mide, para cada tamaño de catálogo y cada recuperador:
+#   - tiempo de carga (load_faq + índices, o importación a SQLite)
+#   - pico de memoria durante la carga (tracemalloc, en una carga aparte)
+#   - latencia p50/p99 de knowledge_node
+# Funciona sin red: no se llama a los nodos LLM, el NLP se construye a mano.
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Any, Optional
+
+# config.py exige la clave aunque aquí no se use la API
+os.environ.setdefault("OPENAI_API_KEY", "bench-offline")
+
+import numpy as np  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from bot import knowledge  # noqa: E402
+from bot.models import BotState, NLPResult, IntentResult  # noqa: E402
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+RETRIEVERS = ["categoria", "bm25", "vector", "sqlite"]
+
+TEMAS = {
+    "envios": ["¿Cuánto tarda el envío {sub}?", "El envío {sub} tarda entre {n} y {m} días laborables."],
+    "devoluciones": ["¿Cómo hago una devolución {sub}?", "Puedes devolver tu pedido {sub} durante {n} días."],
+    "pagos": ["¿Puedo pagar {sub}?", "Sí, aceptamos pagos {sub} sin coste adicional."],
+    "garantia": ["¿Qué garantía tiene el producto {sub}?", "Todos los productos {sub} tienen {n} meses de garantía."],
+    "pedidos": ["¿Dónde está mi pedido {sub}?", "Puedes seguir tu pedido {sub} desde tu cuenta en {n} horas."],
+    "cuenta": ["¿Cómo cambio los datos de mi cuenta {sub}?", "Entra en tu cuenta {sub} y edita tus datos en el perfil."],
+    "facturas": ["¿Cómo descargo la factura {sub}?", "La factura {sub} está disponible en tu área de cliente."],
+    "descuentos": ["¿Tenéis descuentos {sub}?", "Hay un {n}% de descuento {sub} este mes."],
+}
+SUBTEMAS = [
+    "a canarias", "a baleares", "urgente", "internacional", "con tarjeta", "con paypal",
+    "con bizum", "en tienda", "online", "de electronica", "de moda", "de hogar",
+    "para empresas", "por transferencia", "a portugal", "a domicilio",
+]
+TIPOS = ["pregunta", "queja", "devolucion", "otro", ""]
+
+
+def generate_catalog(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Catálogo sintético en español con n filas y categorías únicas.
+    """
+    rnd = random.Random(seed)
+    temas = list(TEMAS)
+    rows = []
+    for i in range(n):
+        tema = temas[i % len(temas)]
+        sub = SUBTEMAS[rnd.randrange(len(SUBTEMAS))]
+        pregunta, respuesta = TEMAS[tema]
+        valores = {"sub": sub, "n": rnd.randint(1, 30), "m": rnd.randint(31, 60)}
+        rows.append(
+            {
+                "categoria": f"{tema}_{sub.split()[-1]}_{i}",
+                "pregunta_canonica": pregunta.format(**valores),
+                "respuesta_base": respuesta.format(**valores),
+                "tipo": TIPOS[rnd.randrange(len(TIPOS))],
+            }
+        )
+    return rows
+
+
+def generate_queries(rows: List[Dict[str, str]], n: int, seed: int = 1) -> List[BotState]:
+    """
+    Mensajes de cliente con un NLP ya resuelto (sin llamar al LLM).
+    """
+    rnd = random.Random(seed)
+    states = []
+    for _ in range(n):
+        row = rows[rnd.randrange(len(rows))]
+        tema, sub = row["categoria"].split("_")[:2]
+        states.append(
+            BotState(
+                user_message=f"Hola, {row['pregunta_canonica'].lower()} Gracias.",
+                nlp=NLPResult(
+                    intent=IntentResult(
+                        tipo_mensaje=rnd.choice(["pregunta", "queja", "devolucion", "otro"]),
+                        intencion=f"{tema}_{sub}",
+                        confianza=0.9,
+                        sentimiento="neutral",
+                    )
+                ),
+            )
+        )
+    return states
+
+
+def write_csv(rows: List[Dict[str, str]], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _configure(retriever: str, csv_path: str, workdir: str) -> None:
+    """
+    Apunta el módulo knowledge al catálogo sintético y vacía sus cachés.
+    """
+    knowledge.FAQ_CSV_PATH = csv_path
+    knowledge.FAQ_COMPILED_PATH = ""
+    knowledge.FAQ_RELOAD = False
+    knowledge.FAQ_RETRIEVER = retriever
+    knowledge.FAQ_SQLITE_PATH = os.path.join(workdir, f"faq-{retriever}.db")
+    knowledge.VECTOR_INDEX_DIR = os.path.join(workdir, "vector_index")
+    knowledge.FAQ_CACHE = None
+    knowledge.FAQ_STORE = None
+
+
+_CONFIG_ATTRS = [
+    "FAQ_CSV_PATH", "FAQ_COMPILED_PATH", "FAQ_RELOAD", "FAQ_RETRIEVER",
+    "FAQ_SQLITE_PATH", "VECTOR_INDEX_DIR", "FAQ_CACHE", "FAQ_STORE",
+]
+
+
+@contextlib.contextmanager
+def _restore_knowledge_config():
+    """
+    Deja el módulo knowledge como estaba al terminar el benchmark.
+    """
+    saved = {attr: getattr(knowledge, attr) for attr in _CONFIG_ATTRS}
+    try:
+        yield
+    finally:
+        if knowledge.FAQ_STORE is not None and knowledge.FAQ_STORE is not saved["FAQ_STORE"]:
+            knowledge.FAQ_STORE.close()
+        for attr, value in saved.items():
+            setattr(knowledge, attr, value)
+
+
+def _load(retriever: str) -> None:
+    if retriever == "sqlite":
+        knowledge.get_faq_store()
+    else:
+        knowledge.load_faq()
+
+
+def bench_retriever(
+    retriever: str,
+    csv_path: str,
+    workdir: str,
+    queries: List[BotState],
+    memory: bool = True,
+) -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {}
+
+    if memory:
+        # Pasada aparte (y en frío, con su propia carpeta): tracemalloc
+        # ralentiza la carga y falsearía load_s
+        memdir = os.path.join(workdir, "mem")
+        os.makedirs(memdir, exist_ok=True)
+        _configure(retriever, csv_path, memdir)
+        tracemalloc.start()
+        _load(retriever)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics["load_peak_mb"] = round(peak / 2**20, 2)
+        if knowledge.FAQ_STORE is not None:
+            knowledge.FAQ_STORE.close()
+
+    _configure(retriever, csv_path, workdir)
+    t0 = time.perf_counter()
+    _load(retriever)
+    metrics["load_s"] = round(time.perf_counter() - t0, 4)
+
+    latencias = []
+    for state in queries:
+        t0 = time.perf_counter()
+        knowledge.knowledge_node(state)
+        latencias.append(time.perf_counter() - t0)
+
+    lat_ms = np.asarray(latencias) * 1000
+    metrics.update(
+        {
+            "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+            "p99_ms": round(float(np.percentile(lat_ms, 99)), 4),
+            "queries": len(queries),
+        }
+    )
+    return metrics
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(
+    sizes: List[int],
+    retrievers: List[str],
+    num_queries: int,
+    output: str,
+    memory: bool = True,
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [],
+    }
+
+    with _restore_knowledge_config():
+        for size in sizes:
+            rows = generate_catalog(size)
+            queries = generate_queries(rows, num_queries)
+            with tempfile.TemporaryDirectory() as workdir:
+                csv_path = os.path.join(workdir, "faq.csv")
+                write_csv(rows, csv_path)
+                del rows
+
+                for retriever in retrievers:
+                    print(f"[bench] {size} filas · {retriever} ...", file=sys.stderr)
+                    metrics = bench_retriever(retriever, csv_path, workdir, queries, memory)
+                    results["results"].append({"rows": size, "retriever": retriever, **metrics})
+                    print(f"[bench]   {metrics}", file=sys.stderr)
+
+                    if knowledge.FAQ_STORE is not None:
+                        knowledge.FAQ_STORE.close()
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"[bench] Resultados guardados en {output}", file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación de FAQ")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="tamaños de catálogo separados por comas",
+    )
+    parser.add_argument("--retrievers", default=",".join(RETRIEVERS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", default="bench_retrieval.json")
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="no medir el pico de memoria (evita una segunda carga)",
+    )
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    run(
+        sizes=[int(s) for s in args.sizes.split(",") if s],
+        retrievers=[r for r in args.retrievers.split(",") if r],
+        num_queries=args.queries,
+        output=args.output,
+        memory=not args.no_memory,
+    )
+
+
+if __name__ == "__main__":
+    main()
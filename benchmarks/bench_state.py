@@ -0,0 +1,155 @@
+# benchmarks/bench_state.py
+#
+# Micro-benchmark del coste por nodo del estado del grafo.
+#
+# Uso:
+#   python -m benchmarks.bench_state --nodes 1,8 --iterations 2000 --output bench_state.json
+#
+# Compara, con nodos que sólo hacen lo que hacen todos los nodos reales con el
+# estado (model_copy + copia de debug + escribir un campo):
+#   - "pydantic": StateGraph(BotState), que valida el estado antes de cada nodo
+#   - "lean":     StateGraph(LeanState) con deltas (bot/lean.py)
+# El coste por nodo es la diferencia entre una cadena de N nodos y una de 1,
+# dividida entre N - 1: así no cuenta el arranque del grafo ni la validación
+# final, que es la misma en los dos modos. Sin red ni LLM.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# config.py exige la clave aunque aquí no se use la API
+os.environ.setdefault("OPENAI_API_KEY", "bench-offline")
+
+from langgraph.graph import StateGraph, END  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from bot.lean import LeanState, lean_node  # noqa: E402
+from bot.models import BotState, NLPResult  # noqa: E402
+
+MODES = ["pydantic", "lean"]
+
+
+def sample_state() -> BotState:
+    """
+    Estado con el tamaño típico a mitad de grafo: NLP con entidades, 3 hits y
+    el debug que dejan los nodos.
+    """
+    nlp = NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": 0.92, "sentimiento": "neutral"},
+        entidades=[{"tipo": "lugar", "valor": "Canarias"}, {"tipo": "producto", "valor": "zapatillas"}],
+    )
+    hits = [
+        {
+            "categoria": f"envios_{i}",
+            "pregunta_canonica": f"¿Cuánto tarda el envío {i}?",
+            "respuesta_base": "El envío tarda entre 2 y 4 días laborables. " * 3,
+            "score": 1.0 - i / 10,
+        }
+        for i in range(3)
+    ]
+    return BotState(
+        user_message="Hola, ¿cuánto tarda un envío a Canarias?",
+        nlp=nlp,
+        knowledge_hits=hits,
+        debug={"nlp_raw": nlp.model_dump_json(), "knowledge_hits": hits},
+    )
+
+
+def _node(i: int) -> Callable[[BotState], BotState]:
+    def _paso(state: BotState) -> BotState:
+        new_state = state.model_copy()
+        new_state.knowledge_hits = list(state.knowledge_hits)
+        debug = new_state.debug.copy()
+        debug[f"paso_{i}"] = i
+        new_state.debug = debug
+        return new_state
+
+    return _paso
+
+
+def build_chain(mode: str, n: int):
+    graph = StateGraph(LeanState if mode == "lean" else BotState)
+    envolver = lean_node if mode == "lean" else (lambda fn: fn)
+    nombres = [f"paso_{i}" for i in range(n)]
+    for i, nombre in enumerate(nombres):
+        graph.add_node(nombre, envolver(_node(i)))
+    graph.set_entry_point(nombres[0])
+    for a, b in zip(nombres, nombres[1:]):
+        graph.add_edge(a, b)
+    graph.add_edge(nombres[-1], END)
+    return graph.compile()
+
+
+def time_invoke(app, state: BotState, iterations: int) -> float:
+    """
+    µs por conversación, validando la salida como hace bot/driver.py.
+    """
+    for _ in range(min(50, iterations)):
+        BotState.model_validate(dict(app.invoke(state)))
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        BotState.model_validate(dict(app.invoke(state)))
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(nodes: List[int], iterations: int, output: str) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [],
+        "per_node_us": {},
+    }
+    state = sample_state()
+    corta, larga = min(nodes), max(nodes)
+
+    for mode in MODES:
+        tiempos = {}
+        for n in sorted(set(nodes)):
+            us = time_invoke(build_chain(mode, n), state, iterations)
+            tiempos[n] = us
+            results["results"].append({"mode": mode, "nodes": n, "us_per_invoke": round(us, 1)})
+            print(f"[bench] {mode} · {n} nodos: {us:.1f} µs", file=sys.stderr)
+        if larga > corta:
+            results["per_node_us"][mode] = round((tiempos[larga] - tiempos[corta]) / (larga - corta), 1)
+
+    print(f"[bench] Coste por nodo (µs): {results['per_node_us']}", file=sys.stderr)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"[bench] Resultados guardados en {output}", file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Coste por nodo del estado del grafo")
+    parser.add_argument("--nodes", default="1,8", help="longitudes de cadena separadas por comas")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", default="bench_state.json")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    run(
+        nodes=[int(n) for n in args.nodes.split(",") if n],
+        iterations=args.iterations,
+        output=args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
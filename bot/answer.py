@@ -1,15 +1,112 @@
 # bot/answer.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import inspect
 import json
+import threading
+import time
 from loguru import logger
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from bot.models import BotState, NLPResult
+from bot.cache import LRUTTLCache, fingerprint, normalize_message
+from bot.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAXSIZE,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_EVICTION,
+    ANSWER_CACHE_DB,
+    ANSWER_CACHE_SKIP_ENTITIES,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_SHORT_FORM_TOKENS,
+    CONTEXT_NEAR_DUPLICATE,
+    DEGRADED_ANSWER,
+    CASCADE_ESCALATE_NEGATIVE,
+    FAQ_RETRIEVER,
+)
+from bot.cascade import cascade_min_score, cascade_models, cascade_signature, record_tier
+from bot.context_builder import build_context, compact_nlp_json
+from bot.llm import get_llm
+from bot.prompt_store import PromptTemplate, compile_template, get_prompt, record_prefix_cache
+from bot.resilience import LLMUnavailableError, client_options, get_caller
+
+
+# Caché de respuestas por (intención, filas FAQ, prompt, modelo)
+ANSWER_CACHE: Optional[LRUTTLCache] = None
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache() -> LRUTTLCache:
+    global ANSWER_CACHE
+    if ANSWER_CACHE is None:
+        with _ANSWER_CACHE_LOCK:
+            if ANSWER_CACHE is None:
+                ANSWER_CACHE = LRUTTLCache(
+                    maxsize=ANSWER_CACHE_MAXSIZE,
+                    ttl=ANSWER_CACHE_TTL,
+                    disk_path=ANSWER_CACHE_DB or None,
+                    namespace="answer",
+                    eviction=ANSWER_CACHE_EVICTION,
+                )
+    return ANSWER_CACHE
+
+
+def _hit_field(hit: Any, campo: str) -> str:
+    if isinstance(hit, dict):
+        return hit.get(campo, "") or ""
+    return getattr(hit, campo, "") or ""
+
+
+def hit_identity(hit: Any) -> str:
+    """
+    Identidad de una fila de la FAQ según su contenido: si se edita la fila,
+    cambia la identidad y las respuestas cacheadas con ella dejan de usarse.
+    """
+    return fingerprint(
+        _hit_field(hit, "categoria"),
+        _hit_field(hit, "pregunta_canonica"),
+        _hit_field(hit, "respuesta_base"),
+    )
 
-from bot.models import BotState
-from bot.config import OPENAI_MODEL_NAME, OPENAI_API_KEY
-from bot.prompt_store import get_prompt
+
+def is_personalized(nlp: Optional[NLPResult]) -> bool:
+    """
+    True si el mensaje trae entidades propias del cliente (nº de pedido,
+    email...) y por tanto su respuesta no debe reutilizarse.
+    """
+    if nlp is None:
+        return False
+    if "*" in ANSWER_CACHE_SKIP_ENTITIES:
+        return bool(nlp.entidades)
+    return any(e.tipo in ANSWER_CACHE_SKIP_ENTITIES for e in nlp.entidades)
+
+
+def answer_cache_key(nlp: NLPResult, hits: List[Any], prompt_version: str) -> str:
+    """
+    Clave de la caché de respuestas. La intención se normaliza y se le suman
+    tipo de mensaje, sentimiento (a un cliente enfadado no se le responde
+    igual) y las entidades que no evitan la caché (el envío a Canarias no se
+    responde como el envío a Baleares); la confianza no forma parte de la
+    clave.
+
+    prompt_version es la versión de la plantilla (PromptTemplate.version);
+    los modelos son los de la cascada del nodo (ver bot/cascade.py).
+    """
+    intent = nlp.intent
+    filas = ",".join(sorted(hit_identity(h) for h in hits))
+    entidades = ",".join(sorted(f"{e.tipo}={normalize_message(e.valor)}" for e in nlp.entidades))
+    return ":".join(
+        (
+            prompt_version,
+            cascade_signature("answer"),
+            intent.tipo_mensaje,
+            intent.sentimiento,
+            normalize_message(intent.intencion),
+            entidades,
+            filas,
+        )
+    )
 
 
 def build_context_text(hits: List[Dict[str, Any]]) -> str:
@@ -41,84 +138,456 @@ def build_context_text(hits: List[Dict[str, Any]]) -> str:
     return "\n".join(ctx_lines)
 
 
-def answer_node(state: BotState) -> BotState:
+def build_prompt_context(hits: List[Any]) -> str:
     """
-    Nodo de LangGraph que genera la respuesta final al cliente.
+    Contexto para el prompt: sin duplicados y dentro de CONTEXT_TOKEN_BUDGET.
+    """
+    return build_context(
+        hits,
+        budget=CONTEXT_TOKEN_BUDGET,
+        short_tokens=CONTEXT_SHORT_FORM_TOKENS,
+        near_threshold=CONTEXT_NEAR_DUPLICATE,
+    )
 
-    Usa:
-      - state['user_message']
-      - state['nlp']
-      - state['knowledge_hits']
 
-    Y añade:
-      - state['answer'] (diccionario con la respuesta y metadatos)
-    """
-    logger.info("Ejecutando answer_node...")
-    user_message = state.user_message
-    nlp = state.nlp
-    hits = state.knowledge_hits
+# Texto fijo que acompaña al prompt de sistema (va antes que cualquier dato
+# variable para que todas las peticiones compartan el prefijo)
+ANSWER_INSTRUCTIONS = """
 
-    system_prompt = get_prompt("answer_agent.system")
+INSTRUCCIONES:
+- Responde al cliente usando SOLO la información de BASE DE CONOCIMIENTO.
+- Si falta información para responder con seguridad, dilo claramente y sugiere derivar el caso a un agente humano.
+- No inventes políticas, plazos ni condiciones que no estén en el contexto.
+- Mantén un tono profesional, cercano y claro.
+"""
 
+# Campos variables, de más a menos compartidos entre peticiones
+ANSWER_FIELDS = (
+    ("BASE DE CONOCIMIENTO", "contexto"),
+    ("INTENCIÓN DETECTADA (JSON)", "nlp"),
+    ("MENSAJE DEL CLIENTE", "mensaje"),
+)
 
 
-    logger.info("Generando contexto...")
-    contexto = build_context_text(hits)
+def answer_template(system_prompt: str) -> PromptTemplate:
+    return compile_template("answer_agent", system_prompt, ANSWER_INSTRUCTIONS, ANSWER_FIELDS)
 
-    # Para inspección / depuración, a veces es útil tener el NLP en JSON plano
-    nlp_json = nlp.model_dump_json(indent=4, ensure_ascii=False)
 
-    user_prompt = f"""
-MENSAJE DEL CLIENTE:
-{user_message}
+def _cache_key_for(state: BotState, plantilla: PromptTemplate) -> Optional[str]:
+    # Sin hits la respuesta depende sólo del mensaje: no se cachea
+    nlp = state.nlp
+    hits = state.knowledge_hits
+    if ANSWER_CACHE_ENABLED and nlp is not None and hits and not is_personalized(nlp):
+        return answer_cache_key(nlp, hits, plantilla.version)
+    return None
 
-INTENCIÓN DETECTADA (JSON):
-{nlp_json}
 
-BASE DE CONOCIMIENTO:
-{contexto}
+def _from_cache(state: BotState, cache_key: Optional[str]) -> Optional[BotState]:
+    if cache_key is None:
+        return None
+    cached = get_answer_cache().get(cache_key)
+    if cached is None:
+        return None
+    logger.info("Respuesta servida desde caché.")
+    return _with_answer(state, cached, state.knowledge_hits, state.nlp, cache="hit")
 
-INSTRUCCIONES:
-- Responde al cliente usando SOLO la información de BASE DE CONOCIMIENTO.
-- Si falta información para responder con seguridad, dilo claramente y sugiere derivar el caso a un agente humano.
-- No inventes políticas, plazos ni condiciones que no estén en el contexto.
-- Mantén un tono profesional, cercano y claro.
-"""
 
-    llm = ChatOpenAI(
-        model=OPENAI_MODEL_NAME,
-        temperature=0,
-        api_key=OPENAI_API_KEY,
+def _messages(state: BotState, plantilla: PromptTemplate) -> list:
+    logger.info("Generando contexto...")
+    return plantilla.messages(
+        contexto=build_prompt_context(state.knowledge_hits),
+        # NLP en JSON compacto: la versión indentada gasta tokens en blancos
+        nlp=compact_nlp_json(state.nlp),
+        mensaje=state.user_message,
     )
 
-    response = llm.invoke(
-        [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt),
-        ]
-    )
 
-    respuesta_texto = response.content
+def needs_human_review(respuesta_texto: str) -> bool:
+    """
+    Heurística muy simple para decidir si hay que derivar a un humano.
+    """
     lower = respuesta_texto.lower()
-
-    # Heurística muy simple para decidir si hay que derivar a un humano
-    necesita_revision = (
+    return (
         "derivar a un agente humano" in lower
         or "no dispongo de suficiente información" in lower
         or "no tengo suficiente información" in lower
         or "no puedo responder con seguridad" in lower
     )
 
-    answer_dict: Dict[str, Any] = {
+
+def _from_response(
+    state: BotState,
+    respuesta_texto: str,
+    cache_key: Optional[str],
+    necesita_revision: bool = False,
+) -> BotState:
+    """
+    Aplica la heurística de revisión humana, cachea y devuelve el nuevo estado.
+    """
+    necesita_revision = necesita_revision or needs_human_review(respuesta_texto)
+
+    generado = {
         "respuesta": respuesta_texto,
         "necesita_revision_humano": necesita_revision,
         "razon": "El modelo indica falta de información o necesidad de derivar a humano"
         if necesita_revision
         else None,
+    }
+    if cache_key is not None:
+        get_answer_cache().set(cache_key, generado)
+
+    return _with_answer(
+        state, generado, state.knowledge_hits, state.nlp, cache="miss" if cache_key else None
+    )
+
+
+def answer_from_text(state: BotState, respuesta_texto: str, necesita_revision: bool = False) -> BotState:
+    """
+    Estado con la respuesta ya generada por otro camino (p. ej. el modo
+    fused), con el mismo formato y heurística de revisión que answer_node.
+    """
+    return _from_response(state, respuesta_texto, None, necesita_revision)
+
+
+def degraded_answer(state: BotState, error: LLMUnavailableError) -> BotState:
+    """
+    Respuesta sin LLM: la respuesta_base del mejor hit (o DEGRADED_ANSWER si
+    no hay ninguno), siempre marcada para revisión humana y sin cachear.
+    """
+    logger.error("Respuesta degradada: {}", error)
+    hits = state.knowledge_hits
+    generado = {
+        "respuesta": _hit_field(hits[0], "respuesta_base") if hits else DEGRADED_ANSWER,
+        "necesita_revision_humano": True,
+        "razon": "El LLM no está disponible; respuesta generada sin modelo",
+    }
+    new_state = _with_answer(state, generado, hits, state.nlp, cache=None)
+    new_state.debug["answer_degraded"] = str(error)
+    return new_state
+
+
+def token_sink(config: Optional[RunnableConfig]) -> Optional[Callable[[str], Any]]:
+    """
+    Callback de streaming que el llamador pasa al grafo:
+
+        app.stream(state, config={"configurable": {"on_token": print}})
+
+    Si existe, answer_node pide la respuesta en streaming y le va pasando
+    cada fragmento de texto según llega.
+    """
+    if not config:
+        return None
+    return (config.get("configurable") or {}).get("on_token")
+
+
+def _with_ttft(state: BotState, ttft_ms: Optional[float]) -> BotState:
+    if ttft_ms is not None:
+        state.debug = {**state.debug, "answer_ttft_ms": ttft_ms}
+    return state
+
+
+class StreamCancelled(Exception):
+    """
+    El nodo ya ha abandonado el streaming (deadline) y ha degradado.
+    """
+
+
+class StreamGuard:
+    """
+    Envuelve el sink del streaming para poder cortarlo.
+
+    Al vencer el deadline el nodo degrada, pero el hilo de _stream_answer
+    sigue vivo: tras cancel() ya no llega ningún token más al cliente (el
+    lock evita que uno se cuele entre la comprobación y el envío).
+    """
+
+    def __init__(self, sink: Callable[[str], Any]):
+        self.sink = sink
+        self.enviados = 0
+        self._cancelado = False
+        self._lock = threading.Lock()
+
+    def __call__(self, token: str) -> Any:
+        with self._lock:
+            if self._cancelado:
+                raise StreamCancelled()
+            self.enviados += 1
+            return self.sink(token)
+
+    def cancel(self) -> int:
+        """
+        Corta el reenvío y devuelve cuántos tokens llegaron al cliente.
+        """
+        with self._lock:
+            self._cancelado = True
+            return self.enviados
+
+
+def _abort_stream(guard: StreamGuard, new_state: BotState) -> Any:
+    """
+    Corta el streaming abandonado y manda al cliente la respuesta degradada,
+    que es la que queda en state.answer.
+    """
+    enviados = guard.cancel()
+    new_state.debug["answer_stream_aborted"] = enviados > 0
+    return guard.sink(("\n" if enviados else "") + new_state.answer["respuesta"])
+
+
+def _stream_answer(llm, messages: list, sink: Callable[[str], Any]) -> Tuple[str, Optional[float]]:
+    """
+    Llama al LLM en streaming reenviando los tokens a `sink`.
+    Devuelve el texto completo y el tiempo hasta el primer token (ms).
+    """
+    partes: List[str] = []
+    ttft_ms = None
+    t0 = time.perf_counter()
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            if not chunk.content:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000
+            partes.append(chunk.content)
+            sink(chunk.content)
+    finally:
+        # Con StreamCancelled se cierra la petición en curso
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return "".join(partes), ttft_ms
+
+
+async def _astream_answer(llm, messages: list, sink: Callable[[str], Any]) -> Tuple[str, Optional[float]]:
+    """
+    Como _stream_answer, con astream. `sink` puede ser una corrutina.
+    """
+    partes: List[str] = []
+    ttft_ms = None
+    t0 = time.perf_counter()
+    stream = llm.astream(messages)
+    try:
+        async for chunk in stream:
+            if not chunk.content:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000
+            partes.append(chunk.content)
+            res = sink(chunk.content)
+            if inspect.isawaitable(res):
+                await res
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return "".join(partes), ttft_ms
+
+
+def answer_start_tier(state: BotState, modelos: List[str]) -> Tuple[int, Optional[str]]:
+    """
+    Nivel de la cascada por el que empezar y motivo si no es el primero.
+    Con un mal hit o un cliente enfadado el modelo pequeño no se prueba: se
+    va directamente al grande.
+    """
+    ultimo = len(modelos) - 1
+    if ultimo == 0:
+        return 0, None
+    hits = state.knowledge_hits
+    if not hits:
+        return ultimo, "score"
+    mejor = max(hits, key=lambda h: _hit_field(h, "score") or 0.0)
+    # El umbral es el del recuperador que dio el score (ver cascade_min_score)
+    umbral = cascade_min_score(_hit_field(mejor, "retriever") or FAQ_RETRIEVER)
+    if umbral is not None and (_hit_field(mejor, "score") or 0.0) < umbral:
+        return ultimo, "score"
+    if CASCADE_ESCALATE_NEGATIVE and state.nlp is not None and state.nlp.intent.sentimiento == "negativo":
+        return ultimo, "sentimiento"
+    return 0, None
+
+
+def _with_tiers(state: BotState, registros: List[Dict[str, Any]], motivo: Optional[str]) -> BotState:
+    state.debug = {
+        **state.debug,
+        "answer_model": registros[-1]["modelo"],
+        "answer_tiers": registros,
+        "answer_escalation": motivo,
+    }
+    return state
+
+
+def _generate(state: BotState, plantilla: PromptTemplate, messages: list) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    """
+    Genera la respuesta recorriendo la cascada: si el modelo pequeño pide
+    revisión humana, se repite con el siguiente.
+    """
+    modelos = cascade_models("answer")
+    nivel, motivo = answer_start_tier(state, modelos)
+    caller = get_caller("answer")
+    registros: List[Dict[str, Any]] = []
+    while True:
+        llm = get_llm(model=modelos[nivel], temperature=0, **client_options("answer"))
+        t0 = time.perf_counter()
+        response = caller.call(lambda: llm.invoke(messages))
+        registros.append(record_tier("answer", nivel, modelos[nivel], (time.perf_counter() - t0) * 1000, response))
+        record_prefix_cache(plantilla, response)
+        if nivel + 1 < len(modelos) and needs_human_review(response.content):
+            nivel, motivo = nivel + 1, "revision"
+            continue
+        return response.content, registros, motivo
+
+
+async def _agenerate(
+    state: BotState, plantilla: PromptTemplate, messages: list
+) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    modelos = cascade_models("answer")
+    nivel, motivo = answer_start_tier(state, modelos)
+    caller = get_caller("answer")
+    registros: List[Dict[str, Any]] = []
+    while True:
+        llm = get_llm(model=modelos[nivel], temperature=0, **client_options("answer"))
+        t0 = time.perf_counter()
+        response = await caller.acall(lambda: llm.ainvoke(messages))
+        registros.append(record_tier("answer", nivel, modelos[nivel], (time.perf_counter() - t0) * 1000, response))
+        record_prefix_cache(plantilla, response)
+        if nivel + 1 < len(modelos) and needs_human_review(response.content):
+            nivel, motivo = nivel + 1, "revision"
+            continue
+        return response.content, registros, motivo
+
+
+def answer_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    """
+    Nodo de LangGraph que genera la respuesta final al cliente.
+
+    Usa:
+      - state['user_message']
+      - state['nlp']
+      - state['knowledge_hits']
+
+    Y añade:
+      - state['answer'] (diccionario con la respuesta y metadatos)
+
+    Si el llamador pasa un callback on_token (ver token_sink), la respuesta
+    se genera en streaming; el AnswerResult final es el mismo.
+    """
+    logger.info("Ejecutando answer_node...")
+
+    plantilla = answer_template(get_prompt("answer_agent.system"))
+    sink = token_sink(config)
+
+    cache_key = _cache_key_for(state, plantilla)
+    cached = _from_cache(state, cache_key)
+    if cached is not None:
+        if sink is not None:
+            sink(cached.answer["respuesta"])
+        return cached
+
+    messages = _messages(state, plantilla)
+
+    ttft_ms = None
+    guard = StreamGuard(sink) if sink is not None else None
+    try:
+        if guard is None:
+            respuesta_texto, registros, motivo = _generate(state, plantilla, messages)
+        else:
+            # En streaming no se reintenta, no se duplica la petición ni se
+            # escala tras generar: el cliente ya ha recibido la respuesta
+            modelos = cascade_models("answer")
+            nivel, motivo = answer_start_tier(state, modelos)
+            # Cliente LLM compartido (se crea una vez y reutiliza sus conexiones)
+            llm = get_llm(model=modelos[nivel], temperature=0, **client_options("answer"))
+            t0 = time.perf_counter()
+            respuesta_texto, ttft_ms = get_caller("answer").call(
+                lambda: _stream_answer(llm, messages, guard), hedge=False, retry=False
+            )
+            registros = [record_tier("answer", nivel, modelos[nivel], (time.perf_counter() - t0) * 1000)]
+    except LLMUnavailableError as e:
+        degradado = degraded_answer(state, e)
+        if guard is not None:
+            _abort_stream(guard, degradado)
+        return degradado
+
+    new_state = _with_tiers(
+        _with_ttft(_from_response(state, respuesta_texto, cache_key), ttft_ms), registros, motivo
+    )
+
+    logger.info("answer_node finalizado correctamente.")
+
+    return new_state
+
+
+async def aanswer_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    """
+    Versión asíncrona de answer_node (usa ainvoke, o astream con on_token).
+
+    Con astream los tokens también llegan como eventos on_chat_model_stream
+    a quien recorra app.astream_events(...).
+    """
+    logger.info("Ejecutando aanswer_node...")
+
+    plantilla = answer_template(get_prompt("answer_agent.system"))
+    sink = token_sink(config)
+
+    cache_key = _cache_key_for(state, plantilla)
+    cached = _from_cache(state, cache_key)
+    if cached is not None:
+        if sink is not None:
+            res = sink(cached.answer["respuesta"])
+            if inspect.isawaitable(res):
+                await res
+        return cached
+
+    messages = _messages(state, plantilla)
+
+    ttft_ms = None
+    guard = StreamGuard(sink) if sink is not None else None
+    try:
+        if guard is None:
+            respuesta_texto, registros, motivo = await _agenerate(state, plantilla, messages)
+        else:
+            modelos = cascade_models("answer")
+            nivel, motivo = answer_start_tier(state, modelos)
+            llm = get_llm(model=modelos[nivel], temperature=0, **client_options("answer"))
+            t0 = time.perf_counter()
+            respuesta_texto, ttft_ms = await get_caller("answer").acall(
+                lambda: _astream_answer(llm, messages, guard), hedge=False, retry=False
+            )
+            registros = [record_tier("answer", nivel, modelos[nivel], (time.perf_counter() - t0) * 1000)]
+    except LLMUnavailableError as e:
+        degradado = degraded_answer(state, e)
+        if guard is not None:
+            res = _abort_stream(guard, degradado)
+            if inspect.isawaitable(res):
+                await res
+        return degradado
+
+    new_state = _with_tiers(
+        _with_ttft(_from_response(state, respuesta_texto, cache_key), ttft_ms), registros, motivo
+    )
+
+    logger.info("aanswer_node finalizado correctamente.")
+
+    return new_state
+
+
+def _with_answer(
+    state: BotState,
+    generado: Dict[str, Any],
+    hits: List[Any],
+    nlp: Optional[NLPResult],
+    cache: Optional[str] = None,
+) -> BotState:
+    """
+    Copia del estado con la respuesta (generada o de caché) y su debug.
+    """
+    answer_dict: Dict[str, Any] = {
+        "respuesta": generado["respuesta"],
+        "necesita_revision_humano": generado["necesita_revision_humano"],
+        "razon": generado["razon"],
         "metadata": {
             "num_hits": len(hits),
             # Podrías añadir más cosas, por ejemplo la intención principal:
-            "intencion_principal": nlp.intent,
+            "intencion_principal": nlp.intent if nlp is not None else None,
         },
     }
 
@@ -129,9 +598,9 @@ INSTRUCCIONES:
 
     # Debug seguro (copia completa)
     debug = new_state.debug.copy()
-    debug["answer_raw"] = respuesta_texto
+    debug["answer_raw"] = generado["respuesta"]
+    if cache is not None:
+        debug["answer_cache"] = cache
     new_state.debug = debug
 
-    logger.info("answer_node finalizado correctamente.")
-
     return new_state
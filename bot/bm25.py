@@ -0,0 +1,220 @@
+# bot/bm25.py
+
+import re
+import unicodedata
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize_text(texto: str) -> str:
+    """
+    Pasa a minúsculas y quita tildes ("Envío" -> "envio").
+    """
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenize(texto: str) -> List[str]:
+    """
+    Tokeniza un texto normalizado. El guion bajo cuenta como separador,
+    así "envios_canarias" da ["envios", "canarias"].
+    """
+    return _TOKEN_RE.findall(normalize_text(texto))
+
+
+def faq_document(row: Dict[str, Any]) -> str:
+    """
+    Texto indexable de una fila de la FAQ: categoría, pregunta y respuesta.
+    """
+    return " ".join(
+        row.get(campo, "") or ""
+        for campo in ("categoria", "pregunta_canonica", "respuesta_base")
+    )
+
+
+def top_k_per_row(scores: np.ndarray, k: int, min_score: float = 0.0) -> List[List[Tuple[int, float]]]:
+    """
+    Top-k de cada fila de una matriz consultas x documentos, con
+    argpartition por filas. Devuelve (doc_id, score) > min_score, de mayor
+    a menor (a igualdad, por doc_id).
+    """
+    nq, n = scores.shape
+    if n == 0 or k <= 0:
+        return [[] for _ in range(nq)]
+
+    k = min(k, n)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (nq, 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    orden = np.lexsort((top, -top_scores), axis=1)
+    top = np.take_along_axis(top, orden, axis=1)
+    top_scores = np.take_along_axis(top_scores, orden, axis=1)
+
+    return [
+        [(int(d), float(sc)) for d, sc in zip(fila_docs, fila_scores) if sc > min_score]
+        for fila_docs, fila_scores in zip(top, top_scores)
+    ]
+
+
+def tokenize_documents(documents: Iterable[str]) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+    """
+    Tokeniza los documentos y devuelve (vocabulario, indptr, token_ids):
+    los tokens del documento d son token_ids[indptr[d]:indptr[d + 1]].
+    """
+    vocab: Dict[str, int] = {}
+    indptr = [0]
+    token_ids: List[int] = []
+    for texto in documents:
+        for tok in tokenize(texto):
+            token_ids.append(vocab.setdefault(tok, len(vocab)))
+        indptr.append(len(token_ids))
+    return (
+        vocab,
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(token_ids, dtype=np.int64),
+    )
+
+
+class BM25Index:
+    """
+    Índice BM25 sobre las filas de la FAQ.
+
+    Las estadísticas se guardan en arrays (formato CSR):
+      - indptr[t]:indptr[t+1] delimita la lista de postings del término t
+      - doc_ids / tfs: documento y frecuencia de cada posting
+      - idf[t] y doc_len[d]
+    de modo que una consulta se puntúa con unas pocas operaciones vectorizadas.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        doc_indptr: np.ndarray,
+        token_ids: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.k1 = k1
+        self.b = b
+        # Filas de origen (las rellena from_rows)
+        self.rows: Optional[Sequence[Dict[str, Any]]] = None
+        self.vocab = vocab
+
+        doc_indptr = np.asarray(doc_indptr, dtype=np.int64)
+        num_terms = len(vocab)
+        self.num_docs = len(doc_indptr) - 1
+        self.doc_len = np.diff(doc_indptr).astype(np.float32)
+        avgdl = float(self.doc_len.mean()) if self.num_docs else 0.0
+
+        # Pares (término, documento) únicos con su frecuencia, ordenados por término
+        docs = np.repeat(np.arange(self.num_docs, dtype=np.int64), np.diff(doc_indptr))
+        claves, tfs = np.unique(
+            np.asarray(token_ids, dtype=np.int64) * max(self.num_docs, 1) + docs,
+            return_counts=True,
+        )
+        terms = claves // max(self.num_docs, 1)
+
+        df = np.bincount(terms, minlength=num_terms).astype(np.float32)
+        self.idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        self.indptr = np.zeros(num_terms + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(df, dtype=np.int64)
+        self.doc_ids = (claves % max(self.num_docs, 1)).astype(np.int32)
+        self.tfs = tfs.astype(np.float32)
+
+        # Normalización por longitud precalculada: k1 * (1 - b + b * dl / avgdl)
+        if avgdl > 0:
+            self.norm = (k1 * (1 - b + b * self.doc_len / avgdl)).astype(np.float32)
+        else:
+            self.norm = np.full(self.num_docs, k1, dtype=np.float32)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[str], **kwargs) -> "BM25Index":
+        return cls(*tokenize_documents(documents), **kwargs)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], **kwargs) -> "BM25Index":
+        index = cls.from_documents((faq_document(row) for row in rows), **kwargs)
+        index.rows = rows
+        return index
+
+    def scores(self, consulta: str) -> np.ndarray:
+        """
+        Devuelve un array con el score BM25 de cada documento para la consulta.
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        term_ids = [self.vocab[t] for t in set(tokenize(consulta)) if t in self.vocab]
+        if not term_ids:
+            return scores
+
+        slices = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        pos = np.concatenate(slices)
+        idf = np.repeat(self.idf[term_ids], [len(s) for s in slices])
+
+        docs = self.doc_ids[pos]
+        tf = self.tfs[pos]
+        contrib = idf * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        np.add.at(scores, docs, contrib)
+        return scores
+
+    def scores_many(self, consultas: List[str]) -> np.ndarray:
+        """
+        Matriz (consultas x documentos) de scores BM25 en una sola pasada:
+        todos los postings de todos los pares (consulta, término) se suman
+        de golpe con np.add.at sobre la matriz aplanada.
+        """
+        scores = np.zeros((len(consultas), self.num_docs), dtype=np.float32)
+
+        pares_q: List[int] = []
+        pares_t: List[int] = []
+        for q, consulta in enumerate(consultas):
+            for tok in set(tokenize(consulta)):
+                term_id = self.vocab.get(tok)
+                if term_id is not None:
+                    pares_q.append(q)
+                    pares_t.append(term_id)
+        if not pares_t or not self.num_docs:
+            return scores
+
+        terms = np.asarray(pares_t, dtype=np.int64)
+        starts = self.indptr[terms]
+        lens = self.indptr[terms + 1] - starts
+
+        # Posiciones de todos los postings: start[i] + 0..len[i]-1
+        offsets = np.arange(int(lens.sum()), dtype=np.int64) - np.repeat(np.cumsum(lens) - lens, lens)
+        pos = np.repeat(starts, lens) + offsets
+
+        docs = self.doc_ids[pos]
+        tf = self.tfs[pos]
+        contrib = np.repeat(self.idf[terms], lens) * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        filas = np.repeat(np.asarray(pares_q, dtype=np.int64), lens)
+        np.add.at(scores.reshape(-1), filas * self.num_docs + docs, contrib)
+        return scores
+
+    def search_many(self, consultas: List[str], k: int = 3) -> List[List[Tuple[int, float]]]:
+        """
+        Como search, pero para un lote de consultas (mismo orden de entrada).
+        """
+        return top_k_per_row(self.scores_many(consultas), k)
+
+    def search(self, consulta: str, k: int = 3) -> List[Tuple[int, float]]:
+        """
+        Devuelve los k mejores (row_id, score) con score > 0, de mayor a menor.
+        A igualdad de score se respeta el orden de fila.
+        """
+        scores = self.scores(consulta)
+        candidatos = np.flatnonzero(scores > 0)
+        if candidatos.size == 0:
+            return []
+
+        if candidatos.size > k:
+            # Umbral del k-ésimo mejor; se conservan los empates para que el
+            # orden final no dependa de argpartition
+            umbral = np.partition(scores[candidatos], -k)[-k]
+            candidatos = candidatos[scores[candidatos] >= umbral]
+
+        orden = candidatos[np.argsort(-scores[candidatos], kind="stable")][:k]
+        return [(int(i), float(scores[i])) for i in orden]
@@ -0,0 +1,315 @@
+# bot/cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from bot.bm25 import tokenize
+
+
+def normalize_message(texto: str) -> str:
+    """
+    Forma normalizada de un mensaje para usarlo como clave de caché:
+    minúsculas, sin tildes ni signos y con los espacios colapsados.
+    "¿Cuánto tarda el envío?" y "cuanto tarda el envio" dan la misma clave.
+    """
+    return " ".join(tokenize(texto))
+
+
+def fingerprint(*parts: str) -> str:
+    """
+    Huella corta (sha256 truncado) de varias cadenas; sirve para versionar
+    prompts y para identificar filas de la FAQ por su contenido.
+    """
+    h = hashlib.sha256("\x1f".join(parts).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+class _FrequencyBuckets:
+    """
+    Índice LFU en O(1): las claves se agrupan por número de aciertos en una
+    lista enlazada de frecuencias en orden creciente (una clave sólo pasa de
+    f a f + 1, así que el hueco siempre está junto a su frecuencia actual).
+    Dentro de cada frecuencia, las claves van en orden de último uso.
+    """
+
+    def __init__(self):
+        self._freq: Dict[str, int] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._prev: Dict[int, Optional[int]] = {}
+        self._next: Dict[int, Optional[int]] = {}
+        self._head: Optional[int] = None
+
+    def _link_after(self, f: int, prev: Optional[int]) -> None:
+        nxt = self._head if prev is None else self._next[prev]
+        self._buckets[f] = OrderedDict()
+        self._prev[f], self._next[f] = prev, nxt
+        if prev is None:
+            self._head = f
+        else:
+            self._next[prev] = f
+        if nxt is not None:
+            self._prev[nxt] = f
+
+    def _unlink_if_empty(self, f: int) -> None:
+        if self._buckets[f]:
+            return
+        prev, nxt = self._prev.pop(f), self._next.pop(f)
+        del self._buckets[f]
+        if prev is None:
+            self._head = nxt
+        else:
+            self._next[prev] = nxt
+        if nxt is not None:
+            self._prev[nxt] = prev
+
+    def add(self, key: str) -> None:
+        """
+        Clave nueva con 0 aciertos; si ya existe, conserva sus aciertos y
+        pasa a ser la más reciente de su frecuencia.
+        """
+        f = self._freq.get(key)
+        if f is not None:
+            self._buckets[f].move_to_end(key)
+            return
+        if self._head != 0:
+            self._link_after(0, None)
+        self._buckets[0][key] = None
+        self._freq[key] = 0
+
+    def hit(self, key: str) -> None:
+        f = self._freq[key]
+        if f + 1 not in self._buckets:
+            self._link_after(f + 1, f)
+        del self._buckets[f][key]
+        self._buckets[f + 1][key] = None
+        self._freq[key] = f + 1
+        self._unlink_if_empty(f)
+
+    def remove(self, key: str) -> None:
+        f = self._freq.pop(key, None)
+        if f is not None:
+            del self._buckets[f][key]
+            self._unlink_if_empty(f)
+
+    def victim(self, skip: str) -> Optional[str]:
+        """
+        La clave con menos aciertos (empates: la usada hace más tiempo),
+        sin contar `skip`. Como mucho mira dos frecuencias.
+        """
+        f = self._head
+        while f is not None:
+            for key in self._buckets[f]:
+                if key != skip:
+                    return key
+            f = self._next[f]
+        return None
+
+    def clear(self) -> None:
+        self.__init__()
+
+
+class LRUTTLCache:
+    """
+    Caché en memoria con tamaño máximo y caducidad (TTL), con una segunda
+    capa opcional en SQLite que sobrevive a reinicios.
+
+    Política de expulsión al llenarse (`eviction`):
+      - "lru":  la entrada usada hace más tiempo (por defecto)
+      - "lfu":  la entrada con menos aciertos (empates: la usada hace más
+                tiempo), en O(1) con _FrequencyBuckets
+      - "fifo": la entrada insertada primero, aunque se siga usando
+
+    Los valores deben ser serializables a JSON (se guardan dicts, no
+    modelos Pydantic). Es segura entre hilos.
+
+    La capa en disco se consulta y escribe fuera del cerrojo de memoria
+    (con su propio cerrojo), así que un commit lento no bloquea los
+    aciertos en memoria. Las filas caducadas se borran al leerlas, y cada
+    `disk_purge_every` escrituras se purgan las caducadas y la tabla se
+    recorta a `maxsize` filas por namespace (se quedan las más recientes).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: Optional[float] = 3600,
+        disk_path: Optional[str] = None,
+        namespace: str = "default",
+        eviction: str = "lru",
+        disk_purge_every: int = 100,
+    ):
+        if eviction not in ("lru", "lfu", "fifo"):
+            raise ValueError(f"Política de expulsión desconocida: {eviction}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self.eviction = eviction
+        self._lfu = _FrequencyBuckets() if eviction == "lfu" else None
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self.disk_purge_every = disk_purge_every
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_writes = 0
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            self._disk.commit()
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[Optional[float], Any]]:
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is None or row[1] > now:
+                return row[1], json.loads(row[0])
+            try:
+                self._disk.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("No se pudo borrar de la caché en disco: {}", e)
+            return None
+
+    def _write_disk(self, key: str, expires_at: Optional[float], value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._disk_lock:
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, payload, expires_at),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % self.disk_purge_every == 0:
+                    self._purge_disk()
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("No se pudo guardar en la caché en disco: {}", e)
+
+    def _purge_disk(self) -> None:
+        """
+        Borra las filas caducadas del namespace y lo recorta a `maxsize`
+        filas. INSERT OR REPLACE da un rowid nuevo, así que el orden por
+        rowid es el de última escritura. Llamar con `_disk_lock` tomado.
+        """
+        self._disk.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, time.time()),
+        )
+        self._disk.execute(
+            """
+            DELETE FROM cache WHERE namespace = ? AND rowid NOT IN (
+                SELECT rowid FROM cache WHERE namespace = ? ORDER BY rowid DESC LIMIT ?
+            )
+            """,
+            (self.namespace, self.namespace, self.maxsize),
+        )
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def _put_memory(self, key: str, expires_at: Optional[float], value: Any) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if self._lfu is not None:
+            self._lfu.add(key)
+        while len(self._data) > self.maxsize:
+            if self._lfu is not None:
+                # La recién insertada no compite (aún no tiene aciertos)
+                victima = self._lfu.victim(skip=key)
+                if victima is None:
+                    victima = key
+            else:
+                victima = next(iter(self._data))
+            self._discard(victima)
+            self.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        del self._data[key]
+        if self._lfu is not None:
+            self._lfu.remove(key)
+
+    def _touch(self, key: str) -> None:
+        if self.eviction != "fifo":
+            self._data.move_to_end(key)
+        if self._lfu is not None:
+            self._lfu.hit(key)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at is None or expires_at > now:
+                    self._touch(key)
+                    self.hits += 1
+                    return value
+                self._discard(key)
+
+        encontrado = self._read_disk(key, now) if self._disk is not None else None
+        with self._lock:
+            if encontrado is None:
+                self.misses += 1
+                return None
+            expires_at, value = encontrado
+            self._put_memory(key, expires_at, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = self._expires_at()
+        with self._lock:
+            self._put_memory(key, expires_at, value)
+        if self._disk is not None:
+            self._write_disk(key, expires_at, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            if self._lfu is not None:
+                self._lfu.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                self._disk.commit()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
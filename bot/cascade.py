@@ -0,0 +1,110 @@
+# bot/cascade.py
+#
+# Cascada de modelos por nodo: primero el modelo pequeño (rápido y barato) y
+# el grande sólo cuando hace falta. Cada nodo decide cuándo escalar; aquí
+# están los modelos de cada nodo, el registro de cada nivel usado (modelo,
+# latencia, tokens) y las estadísticas agregadas para ajustar coste/latencia.
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from bot.config import (
+    OPENAI_MODEL_NAME,
+    ANSWER_MODEL_CASCADE,
+    NLP_MODEL_CASCADE,
+    CASCADE_MIN_SCORE,
+    CASCADE_MIN_SCORE_VECTOR,
+    CASCADE_MIN_SCORE_BM25,
+    CASCADE_MIN_SCORE_SQLITE,
+)
+
+_CASCADAS: Dict[str, List[str]] = {
+    "answer": ANSWER_MODEL_CASCADE,
+    "nlp": NLP_MODEL_CASCADE,
+}
+
+# recuperador -> score mínimo del mejor hit para empezar por el modelo pequeño
+_MIN_SCORES: Dict[str, Optional[float]] = {
+    "categoria": CASCADE_MIN_SCORE,
+    "vector": float(CASCADE_MIN_SCORE_VECTOR) if CASCADE_MIN_SCORE_VECTOR else None,
+    "bm25": float(CASCADE_MIN_SCORE_BM25) if CASCADE_MIN_SCORE_BM25 else None,
+    "sqlite": float(CASCADE_MIN_SCORE_SQLITE) if CASCADE_MIN_SCORE_SQLITE else None,
+}
+
+# nodo -> {"escalations": n, "modelos": {modelo: {"calls", "latency_ms", "prompt_tokens", "completion_tokens"}}}
+CASCADE_STATS: Dict[str, Dict[str, Any]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def cascade_models(nodo: str) -> List[str]:
+    """
+    Modelos del nodo, del más pequeño al más grande. Sin cascada
+    configurada, sólo OPENAI_MODEL_NAME.
+    """
+    return _CASCADAS.get(nodo) or [OPENAI_MODEL_NAME]
+
+
+def cascade_min_score(retriever: str) -> Optional[float]:
+    """
+    Umbral de score del recuperador que produjo los hits; None si su score
+    no tiene cota y no sirve para decidir por dónde empezar.
+    """
+    return _MIN_SCORES.get(retriever, CASCADE_MIN_SCORE)
+
+
+def cascade_signature(nodo: str) -> str:
+    # Para las claves de caché: cambia si cambia cualquier modelo de la cascada
+    return ",".join(cascade_models(nodo))
+
+
+def token_usage(response: Any) -> Dict[str, int]:
+    """
+    Tokens de entrada y salida de una respuesta de LangChain (0 si el
+    proveedor no los informa, p. ej. en streaming).
+    """
+    uso = getattr(response, "usage_metadata", None) or {}
+    if uso:
+        return {
+            "prompt_tokens": uso.get("input_tokens", 0) or 0,
+            "completion_tokens": uso.get("output_tokens", 0) or 0,
+        }
+    meta = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": meta.get("prompt_tokens", 0) or 0,
+        "completion_tokens": meta.get("completion_tokens", 0) or 0,
+    }
+
+
+def record_tier(nodo: str, nivel: int, modelo: str, latency_ms: float, response: Any = None) -> Dict[str, Any]:
+    """
+    Registro de un nivel de la cascada (va al debug del estado) y suma a
+    CASCADE_STATS. Un nivel > 0 cuenta como escalado.
+    """
+    registro = {"tier": nivel, "modelo": modelo, "latency_ms": round(latency_ms, 1), **token_usage(response)}
+    with _STATS_LOCK:
+        nodo_stats = CASCADE_STATS.setdefault(nodo, {"escalations": 0, "modelos": {}})
+        if nivel > 0:
+            nodo_stats["escalations"] += 1
+        m = nodo_stats["modelos"].setdefault(
+            modelo, {"calls": 0, "latency_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+        m["calls"] += 1
+        m["latency_ms"] += registro["latency_ms"]
+        m["prompt_tokens"] += registro["prompt_tokens"]
+        m["completion_tokens"] += registro["completion_tokens"]
+    return registro
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """
+    Por nodo: escalados y, por modelo, llamadas, latencia media y tokens.
+    """
+    with _STATS_LOCK:
+        out: Dict[str, Any] = {}
+        for nodo, s in CASCADE_STATS.items():
+            modelos = {
+                modelo: {**m, "avg_latency_ms": m["latency_ms"] / m["calls"] if m["calls"] else 0.0}
+                for modelo, m in s["modelos"].items()
+            }
+            out[nodo] = {"escalations": s["escalations"], "modelos": modelos}
+        return out
@@ -11,7 +11,168 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL_NAME = os.environ.get("OPENAI_MODEL_NAME", "gpt-4.1-mini") # Es un fall-back (valor por defecto) por si olvidas definirlo en .env. Si en .env está definido, ese valor siempre gana.
 FAQ_CSV_PATH = os.environ.get("FAQ_CSV_PATH", "data/faq.csv")
+# Catálogo compilado (python -m bot.faq_catalog data/faq.csv data/faq.faqc).
+# Si se define, se abre con mmap en lugar de parsear el CSV.
+FAQ_COMPILED_PATH = os.environ.get("FAQ_COMPILED_PATH", "")
+# Recarga en caliente de faq.csv: un hilo comprueba mtime/tamaño cada
+# FAQ_RELOAD_INTERVAL segundos y publica una snapshot nueva si cambia
+FAQ_RELOAD = os.environ.get("FAQ_RELOAD", "0") == "1"
+FAQ_RELOAD_INTERVAL = float(os.environ.get("FAQ_RELOAD_INTERVAL", "5"))
 PROMPTS_DB_PATH = os.environ.get("PROMPTS_DB_PATH", "data/prompts.json")
 
+# Recuperador de la base de conocimiento:
+#   "categoria" -> compara la intención del NLP con la columna categoria
+#   "bm25"      -> BM25 sobre categoria + pregunta_canonica + respuesta_base,
+#                  consultado con el mensaje del cliente y la intención
+#   "vector"    -> búsqueda semántica local (TF-IDF con hashing, sin red)
+#   "sqlite"    -> FTS5 + bm25() sobre una base SQLite (no carga la FAQ en RAM)
+FAQ_RETRIEVER = os.environ.get("FAQ_RETRIEVER", "categoria")
+
+# Si la intención no coincide con ninguna categoría, búsqueda aproximada por
+# trigramas (tolera erratas, plurales y tildes) con esta similitud mínima (Dice)
+FAQ_FUZZY = os.environ.get("FAQ_FUZZY", "1") == "1"
+FAQ_FUZZY_MIN_SIMILARITY = float(os.environ.get("FAQ_FUZZY_MIN_SIMILARITY", "0.5"))
+
+# Recuperación particionada por tipo de mensaje (columna opcional `tipo` en
+# faq.csv: pregunta/queja/devolucion/otro; vacía = vale para todos)
+FAQ_PARTITION_BY_TIPO = os.environ.get("FAQ_PARTITION_BY_TIPO", "1") == "1"
+# Las filas que mencionan una entidad extraída multiplican su score por (1 + boost)
+FAQ_ENTITY_BOOST = float(os.environ.get("FAQ_ENTITY_BOOST", "0.5"))
+# Candidatos que se piden al recuperador antes de aplicar el boost y quedarnos con 3
+FAQ_CANDIDATES = int(os.environ.get("FAQ_CANDIDATES", "10"))
+
+# search_many: consultas por bloque (la matriz consultas x filas ocupa
+# SEARCH_BATCH_SIZE * nº de filas * 4 bytes)
+SEARCH_BATCH_SIZE = int(os.environ.get("SEARCH_BATCH_SIZE", "256"))
+
+# Base SQLite con FTS5 (si está vacía se importa FAQ_CSV_PATH la primera vez)
+FAQ_SQLITE_PATH = os.environ.get("FAQ_SQLITE_PATH", "data/faq.db")
+
+# Índice vectorial: carpeta donde se persiste (clave = hash de faq.csv),
+# dimensión de los vectores y similitud mínima para considerar un hit
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "data/.vector_index")
+VECTOR_DIMS = int(os.environ.get("VECTOR_DIMS", "512"))
+VECTOR_MIN_SCORE = float(os.environ.get("VECTOR_MIN_SCORE", "0.1"))
+
+# Pool de conexiones HTTP compartido por los clientes LLM (bot/llm.py)
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# Caché de clasificaciones NLP (mensaje normalizado + versión del prompt).
+# NLP_CACHE_DB: ruta SQLite para una segunda capa persistente (vacía = sólo RAM)
+NLP_CACHE_ENABLED = os.environ.get("NLP_CACHE_ENABLED", "1") == "1"
+NLP_CACHE_MAXSIZE = int(os.environ.get("NLP_CACHE_MAXSIZE", "10000"))
+NLP_CACHE_TTL = float(os.environ.get("NLP_CACHE_TTL", "3600"))
+NLP_CACHE_DB = os.environ.get("NLP_CACHE_DB", "")
+
+# Caché de respuestas: clave = (intención normalizada, filas FAQ recuperadas,
+# versión del prompt, modelo). Al cambiar una fila cambia su huella y las
+# respuestas que dependían de ella dejan de servirse.
+# ANSWER_CACHE_EVICTION: lru / lfu / fifo
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_MAXSIZE = int(os.environ.get("ANSWER_CACHE_MAXSIZE", "5000"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_EVICTION = os.environ.get("ANSWER_CACHE_EVICTION", "lru")
+ANSWER_CACHE_DB = os.environ.get("ANSWER_CACHE_DB", "")
+# Mensajes personalizados que nunca se cachean: tipos de entidad separados por
+# comas ("*" = cualquier entidad)
+ANSWER_CACHE_SKIP_ENTITIES = [
+    t.strip()
+    for t in os.environ.get(
+        "ANSWER_CACHE_SKIP_ENTITIES", "numero_pedido,email,telefono,nombre,direccion"
+    ).split(",")
+    if t.strip()
+]
+
+# Conversaciones atendidas a la vez por el driver async (bot/driver.py)
+CONVERSATION_CONCURRENCY = int(os.environ.get("CONVERSATION_CONCURRENCY", "100"))
+
+# main.py muestra la respuesta token a token según la genera el LLM
+ANSWER_STREAMING = os.environ.get("ANSWER_STREAMING", "0") == "1"
+
+# Clasificador de intención local: si su confianza supera el umbral,
+# nlp_node no llama al LLM. Sin INTENT_MODEL_PATH se entrena al vuelo con la FAQ.
+NLP_FAST_PATH = os.environ.get("NLP_FAST_PATH", "0") == "1"
+NLP_FAST_PATH_THRESHOLD = float(os.environ.get("NLP_FAST_PATH_THRESHOLD", "0.9"))
+INTENT_MODEL_PATH = os.environ.get("INTENT_MODEL_PATH", "data/intent_model.npz")
+# Registro JSONL de las clasificaciones del LLM (para reentrenar); vacío = no se guarda
+NLP_LOG_PATH = os.environ.get("NLP_LOG_PATH", "")
+
+# Micro-batching de clasificaciones NLP en el grafo async: se agrupan los
+# mensajes que llegan en NLP_BATCH_MAX_WAIT_MS ms (o hasta NLP_BATCH_MAX_ITEMS)
+NLP_BATCHING = os.environ.get("NLP_BATCHING", "0") == "1"
+NLP_BATCH_MAX_ITEMS = int(os.environ.get("NLP_BATCH_MAX_ITEMS", "16"))
+NLP_BATCH_MAX_WAIT_MS = float(os.environ.get("NLP_BATCH_MAX_WAIT_MS", "20"))
+
+# Topología del grafo:
+#   "pipeline" -> nlp → knowledge → answer (dos llamadas al LLM)
+#   "fused"    -> recuperación con el mensaje en bruto → una sola llamada que
+#                 devuelve NLP y respuesta (bot/fused_agent.py)
+#   "speculative" -> recuperación con el mensaje en bruto en paralelo con el
+#                 NLP; al llegar la intención se reordena (bot/speculative.py)
+GRAPH_MODE = os.environ.get("GRAPH_MODE", "pipeline")
+# Estado ligero entre nodos (bot/lean.py): sin validar BotState en cada nodo y
+# con actualizaciones parciales; se valida sólo a la entrada y a la salida
+GRAPH_LEAN_STATE = os.environ.get("GRAPH_LEAN_STATE", "0") == "1"
+# Peso de la coincidencia intención/categoría al reordenar los candidatos especulativos
+SPECULATIVE_INTENT_BOOST = float(os.environ.get("SPECULATIVE_INTENT_BOOST", "0.5"))
+
+# Contexto del prompt de respuesta (bot/context_builder.py): presupuesto de
+# tokens estimados, tamaño de las respuestas recortadas y umbral (Jaccard)
+# para considerar dos hits casi duplicados
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "600"))
+CONTEXT_SHORT_FORM_TOKENS = int(os.environ.get("CONTEXT_SHORT_FORM_TOKENS", "80"))
+CONTEXT_NEAR_DUPLICATE = float(os.environ.get("CONTEXT_NEAR_DUPLICATE", "0.8"))
+
+# Fast path de plantillas (bot/template_agent.py): con un único hit exacto
+# (score 1.0) y confianza >= TEMPLATE_MIN_CONFIDENCE se responde con la
+# respuesta_base de la FAQ sin llamar al LLM. Saludo y despedida admiten
+# huecos {tipo_entidad}; vacíos = no se añaden.
+TEMPLATE_FAST_PATH = os.environ.get("TEMPLATE_FAST_PATH", "0") == "1"
+TEMPLATE_MIN_CONFIDENCE = float(os.environ.get("TEMPLATE_MIN_CONFIDENCE", "0.9"))
+TEMPLATE_GREETING = os.environ.get("TEMPLATE_GREETING", "¡Hola!")
+TEMPLATE_CLOSING = os.environ.get("TEMPLATE_CLOSING", "¿Hay algo más en lo que pueda ayudarte?")
+
+# Cascada de modelos por nodo (bot/cascade.py): modelos separados por comas,
+# del más pequeño al más grande; vacío = sólo OPENAI_MODEL_NAME.
+#   answer: se escala si la respuesta pide revisión humana; se empieza por el
+#           grande si el mejor hit no llega al umbral de su recuperador o el
+#           cliente está enfadado (CASCADE_ESCALATE_NEGATIVE)
+#   nlp:    se escala si el JSON no es válido o la confianza no llega a
+#           NLP_CASCADE_MIN_CONFIDENCE
+ANSWER_MODEL_CASCADE = [m.strip() for m in os.environ.get("ANSWER_MODEL_CASCADE", "").split(",") if m.strip()]
+NLP_MODEL_CASCADE = [m.strip() for m in os.environ.get("NLP_MODEL_CASCADE", "").split(",") if m.strip()]
+# Umbral de score por recuperador: las escalas no son comparables (categoria
+# 0-1, coseno del vectorial casi siempre < 0.5, BM25/FTS5 sin cota). Vacío =
+# ese recuperador no escala por score (sólo tras generar, por revisión).
+CASCADE_MIN_SCORE = float(os.environ.get("CASCADE_MIN_SCORE", "0.5"))  # categoria
+CASCADE_MIN_SCORE_VECTOR = os.environ.get("CASCADE_MIN_SCORE_VECTOR", "0.3")
+CASCADE_MIN_SCORE_BM25 = os.environ.get("CASCADE_MIN_SCORE_BM25", "")
+CASCADE_MIN_SCORE_SQLITE = os.environ.get("CASCADE_MIN_SCORE_SQLITE", "")
+CASCADE_ESCALATE_NEGATIVE = os.environ.get("CASCADE_ESCALATE_NEGATIVE", "1") == "1"
+NLP_CASCADE_MIN_CONFIDENCE = float(os.environ.get("NLP_CASCADE_MIN_CONFIDENCE", "0.7"))
+
+# Llamadas resilientes al LLM (bot/resilience.py): deadline por nodo en
+# segundos (reintentos incluidos), reintentos con backoff y jitter, hedging
+# (segunda petición si la primera pasa del p95) y circuit breaker
+LLM_DEADLINE_NLP = float(os.environ.get("LLM_DEADLINE_NLP", "8"))
+LLM_DEADLINE_ANSWER = float(os.environ.get("LLM_DEADLINE_ANSWER", "20"))
+# Lotes de NLP (NLP_BATCHING): segundos extra de deadline por mensaje adicional
+LLM_DEADLINE_NLP_BATCH_ITEM = float(os.environ.get("LLM_DEADLINE_NLP_BATCH_ITEM", "1"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.environ.get("LLM_RETRY_BASE", "0.25"))
+LLM_RETRY_MAX = float(os.environ.get("LLM_RETRY_MAX", "2"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+# Respuesta cuando no se puede generar (LLM caído y sin hits en la FAQ)
+DEGRADED_ANSWER = os.environ.get(
+    "DEGRADED_ANSWER",
+    "Ahora mismo no podemos generar una respuesta automática. "
+    "Un agente revisará tu consulta y te contestará lo antes posible.",
+)
+
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY no está definida. Añádela en el archivo .env.")
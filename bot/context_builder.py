@@ -0,0 +1,136 @@
+# bot/context_builder.py
+#
+# Montaje del contexto del prompt de respuesta con un presupuesto de tokens:
+# sin hits repetidos, con respuestas largas recortadas y el NLP compacto.
+
+import math
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Set
+
+from bot.bm25 import tokenize
+from bot.models import NLPResult
+
+_PIEZAS = re.compile(r"\w+|[^\w\s]")
+_FRASES = re.compile(r"(?<=[.!?])\s+")
+
+SIN_CONTEXTO = "No hay información relevante en la base de conocimiento."
+
+
+def estimate_tokens(texto: str) -> int:
+    """
+    Estimación local (sin tokenizador ni red) de los tokens de un texto:
+    cada signo cuenta 1 y cada palabra 1 por cada 4 caracteres. En español
+    suele quedarse a un ±15 % del tokenizador real, suficiente para un
+    presupuesto.
+    """
+    return sum(math.ceil(len(p) / 4) for p in _PIEZAS.findall(texto))
+
+
+@lru_cache(maxsize=4096)
+def short_form(texto: str, max_tokens: int) -> str:
+    """
+    Forma corta de una respuesta_base: frases completas desde el principio
+    hasta `max_tokens`; si la primera frase ya no cabe, se corta por palabras.
+
+    Se memoriza por texto, así que cada fila de la FAQ se recorta una vez.
+    """
+    texto = " ".join(texto.split())
+    if estimate_tokens(texto) <= max_tokens:
+        return texto
+
+    partes: List[str] = []
+    usados = 0
+    for frase in _FRASES.split(texto):
+        coste = estimate_tokens(frase)
+        if usados + coste > max_tokens:
+            break
+        partes.append(frase)
+        usados += coste
+    if partes:
+        return " ".join(partes)
+
+    palabras: List[str] = []
+    for palabra in texto.split():
+        usados += estimate_tokens(palabra)
+        if usados > max_tokens:
+            break
+        palabras.append(palabra)
+    return " ".join(palabras) + "…"
+
+
+def _field(hit: Any, campo: str) -> str:
+    if isinstance(hit, dict):
+        return hit.get(campo, "") or ""
+    return getattr(hit, campo, "") or ""
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_hits(hits: List[Any], near_threshold: float = 0.8) -> List[Any]:
+    """
+    Quita hits repetidos conservando el primero (los hits llegan ordenados
+    por score). Son repetidos si tienen la misma respuesta normalizada o si
+    sus palabras (pregunta + respuesta) se solapan >= near_threshold (Jaccard).
+    """
+    vistos: List[Set[str]] = []
+    respuestas: Set[str] = set()
+    unicos = []
+    for hit in hits:
+        respuesta = " ".join(tokenize(_field(hit, "respuesta_base")))
+        palabras = set(tokenize(f"{_field(hit, 'pregunta_canonica')} {_field(hit, 'respuesta_base')}"))
+        if respuesta and respuesta in respuestas:
+            continue
+        if any(_jaccard(palabras, v) >= near_threshold for v in vistos):
+            continue
+        respuestas.add(respuesta)
+        vistos.append(palabras)
+        unicos.append(hit)
+    return unicos
+
+
+def build_context(
+    hits: List[Any],
+    budget: int = 600,
+    short_tokens: int = 80,
+    near_threshold: float = 0.8,
+) -> str:
+    """
+    Contexto para el LLM con, como mucho, `budget` tokens estimados.
+
+    Mismo formato de línea que build_context_text. Cada hit entra completo si
+    cabe; si no, con su respuesta recortada a `short_tokens`; si tampoco cabe,
+    se descarta junto con los de menor score. El mejor hit siempre entra
+    (recortado si hace falta).
+    """
+    lineas: List[str] = []
+    usados = 0
+    for hit in dedupe_hits(hits, near_threshold):
+        cabecera = f"[{_field(hit, 'categoria')}] {_field(hit, 'pregunta_canonica')}: "
+        respuesta = _field(hit, "respuesta_base")
+
+        linea = cabecera + respuesta
+        coste = estimate_tokens(linea)
+        if usados + coste > budget:
+            linea = cabecera + short_form(respuesta, short_tokens)
+            coste = estimate_tokens(linea)
+            if lineas and usados + coste > budget:
+                break
+        lineas.append(linea)
+        usados += coste + 1
+
+    return "\n".join(lineas) if lineas else SIN_CONTEXTO
+
+
+def compact_nlp_json(nlp: Optional[NLPResult]) -> str:
+    """
+    NLP en JSON sin sangría ni espacios (la versión con indent=4 gasta
+    tokens sólo en blancos).
+    """
+    if nlp is None:
+        return "{}"
+    return nlp.model_dump_json(exclude_none=True)
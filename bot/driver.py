@@ -0,0 +1,80 @@
+# bot/driver.py
+#
+# Driver asíncrono: atiende muchas conversaciones a la vez en un único bucle
+# de eventos. Mientras una espera a OpenAI, las demás avanzan.
+#
+# Uso (un mensaje por línea, salida JSONL):
+#   python -m bot.driver mensajes.txt [--concurrencia 100]
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Iterable, List, Optional
+
+from loguru import logger
+
+from bot.cascade import cascade_stats
+from bot.config import CONVERSATION_CONCURRENCY
+from bot.graph import build_graph, initial_state
+from bot.llm import aclose_llm_clients
+from bot.models import BotState
+from bot.template_agent import template_stats
+
+
+async def run_conversation(app, user_message: str, semaforo: asyncio.Semaphore) -> BotState:
+    """
+    Ejecuta el grafo async para un mensaje, respetando el límite de concurrencia.
+    """
+    async with semaforo:
+        try:
+            final = await app.ainvoke(initial_state(user_message))
+        except Exception as e:
+            # Una conversación fallida no debe tumbar a las demás
+            logger.error("Error procesando el mensaje {!r}: {}", user_message, e)
+            return BotState(user_message=user_message, debug={"error": str(e)})
+    # LangGraph devuelve los campos del estado como dict
+    return BotState.model_validate(dict(final))
+
+
+async def run_conversations(
+    mensajes: Iterable[str],
+    concurrencia: int = CONVERSATION_CONCURRENCY,
+    app=None,
+) -> List[BotState]:
+    """
+    Procesa todos los mensajes con como mucho `concurrencia` conversaciones
+    en vuelo. Devuelve los estados finales en el mismo orden que los mensajes;
+    las conversaciones que fallan vuelven sin answer y con debug["error"].
+    """
+    app = app or build_graph(asincrono=True)
+    semaforo = asyncio.Semaphore(concurrencia)
+    return await asyncio.gather(*(run_conversation(app, m, semaforo) for m in mensajes))
+
+
+async def _run_and_close(mensajes: List[str], concurrencia: int) -> List[BotState]:
+    try:
+        return await run_conversations(mensajes, concurrencia)
+    finally:
+        # El pool HTTP asíncrono es de este bucle: se cierra antes de que acabe
+        await aclose_llm_clients()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Atiende muchos mensajes en paralelo")
+    parser.add_argument("mensajes", help="fichero con un mensaje por línea")
+    parser.add_argument("--concurrencia", type=int, default=CONVERSATION_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    with open(args.mensajes, encoding="utf-8") as f:
+        mensajes = [linea.strip() for linea in f if linea.strip()]
+
+    estados = asyncio.run(_run_and_close(mensajes, args.concurrencia))
+    for estado in estados:
+        sys.stdout.write(estado.model_dump_json(include={"user_message", "answer"}) + "\n")
+    logger.info("Respuestas por plantilla (sin LLM): {}", template_stats())
+    logger.info("Cascada de modelos: {}", cascade_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# bot/faq_catalog.py
+#
+# Formato binario columnar de la FAQ ("catálogo compilado").
+#
+# Uso:
+#   python -m bot.faq_catalog data/faq.csv data/faq.faqc
+#
+# El fichero se abre con mmap: arrancar es casi instantáneo y varios procesos
+# comparten las mismas páginas físicas en lugar de tener cada uno sus dicts.
+
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from bot.bm25 import BM25Index, faq_document, tokenize
+
+
+MAGIC = b"FAQC"
+VERSION = 1
+
+# magic, versión, nº de secciones, nº de filas, nº de categorías, nº de tokens
+_HEADER = struct.Struct("<4sHHIII")
+# offset y longitud (en bytes) de cada sección
+_SECTION = struct.Struct("<QQ")
+
+# Secciones fijas; detrás van los offsets de cada columna de texto (meta["columns"])
+_META, _BLOB, _CAT_OFF, _ROW_CAT, _VOCAB_OFF, _TOK_INDPTR, _TOK_IDS = range(7)
+_FIXED_SECTIONS = 7
+
+
+class _BlobWriter:
+    """
+    Acumula cadenas UTF-8 en un único blob y devuelve sus offsets.
+    """
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def offsets(self, strings: List[str]) -> np.ndarray:
+        offs = np.empty(len(strings) + 1, dtype=np.uint64)
+        offs[0] = self.buf.tell()
+        for i, s in enumerate(strings):
+            self.buf.write(s.encode("utf-8"))
+            offs[i + 1] = self.buf.tell()
+        return offs
+
+
+def compile_faq(csv_path: str, out_path: str) -> str:
+    """
+    Convierte faq.csv en un catálogo compilado:
+      - tabla de categorías internadas + id de categoría por fila
+      - una tabla de offsets por cada columna de texto
+      - tokens precalculados por fila (vocabulario + CSR de ids)
+
+    Devuelve la ruta escrita.
+    """
+    with open(csv_path, "rb") as f:
+        data = f.read()
+
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""))
+    rows = list(reader)
+    fieldnames = list(reader.fieldnames or [])
+    columns = [c for c in fieldnames if c != "categoria"]
+
+    categorias: Dict[str, int] = {}
+    row_cat = np.fromiter(
+        (categorias.setdefault(r.get("categoria") or "", len(categorias)) for r in rows),
+        dtype=np.uint32,
+        count=len(rows),
+    )
+
+    vocab: Dict[str, int] = {}
+    tok_indptr = np.zeros(len(rows) + 1, dtype=np.uint64)
+    tok_ids: List[int] = []
+    for i, row in enumerate(rows):
+        tok_ids.extend(vocab.setdefault(t, len(vocab)) for t in tokenize(faq_document(row)))
+        tok_indptr[i + 1] = len(tok_ids)
+
+    blob = _BlobWriter()
+    cat_off = blob.offsets(list(categorias))
+    vocab_off = blob.offsets(list(vocab))
+    col_offs = [blob.offsets([r.get(c) or "" for r in rows]) for c in columns]
+
+    meta = {
+        "columns": columns,
+        "fieldnames": fieldnames,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "source": os.path.abspath(csv_path),
+    }
+
+    sections = [
+        json.dumps(meta).encode("utf-8"),
+        blob.buf.getvalue(),
+        cat_off.tobytes(),
+        row_cat.tobytes(),
+        vocab_off.tobytes(),
+        tok_indptr.tobytes(),
+        np.asarray(tok_ids, dtype=np.uint32).tobytes(),
+    ] + [offs.tobytes() for offs in col_offs]
+
+    # Cabecera + tabla de secciones; cada sección alineada a 8 bytes
+    pos = _HEADER.size + _SECTION.size * len(sections)
+    tabla = []
+    for sec in sections:
+        pos += -pos % 8
+        tabla.append((pos, len(sec)))
+        pos += len(sec)
+
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections), len(rows), len(categorias), len(vocab)))
+        for off, length in tabla:
+            f.write(_SECTION.pack(off, length))
+        for (off, _), sec in zip(tabla, sections):
+            f.write(b"\0" * (off - f.tell()))
+            f.write(sec)
+    os.replace(tmp, out_path)
+
+    logger.info(
+        "Catálogo compilado en {}: {} filas, {} categorías, {} tokens",
+        out_path, len(rows), len(categorias), len(vocab),
+    )
+    return out_path
+
+
+class CompiledFaq(Sequence):
+    """
+    Catálogo compilado abierto con mmap.
+
+    Se comporta como una lista de filas (dicts) de sólo lectura: cada fila se
+    decodifica al pedirla. Como FaqSnapshot, lleva su propio dict `indexes`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mtime_ns = st.st_mtime_ns
+            self.size = st.st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, nsec, self.num_rows, self.num_categorias, self.num_tokens = (
+            _HEADER.unpack_from(self._mm, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} no es un catálogo FAQ compilado (v{VERSION})")
+
+        self._sections: List[Tuple[int, int]] = [
+            _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            for i in range(nsec)
+        ]
+
+        meta = json.loads(self._bytes(_META).decode("utf-8"))
+        self.columns: List[str] = meta["columns"]
+        self.fieldnames: List[str] = meta["fieldnames"]
+        self.sha256: str = meta["sha256"]
+
+        self._blob_start = self._sections[_BLOB][0]
+        self._cat_off = self._array(_CAT_OFF, np.uint64)
+        self.row_cat = self._array(_ROW_CAT, np.uint32)
+        self._vocab_off = self._array(_VOCAB_OFF, np.uint64)
+        self.tok_indptr = self._array(_TOK_INDPTR, np.uint64)
+        self.tok_ids = self._array(_TOK_IDS, np.uint32)
+        self._col_offs = [
+            self._array(_FIXED_SECTIONS + i, np.uint64) for i in range(len(self.columns))
+        ]
+
+        # Tabla de categorías internadas (pocas, se decodifica una vez)
+        self.categorias_tabla: List[str] = [
+            self._string(self._cat_off, i) for i in range(self.num_categorias)
+        ]
+        # nombre del recuperador -> índice construido sobre estas filas
+        self.indexes: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------
+    # Acceso a secciones
+    # ------------------------------------------------------------------
+
+    def _bytes(self, sec: int) -> bytes:
+        off, length = self._sections[sec]
+        return self._mm[off:off + length]
+
+    def _array(self, sec: int, dtype) -> np.ndarray:
+        off, length = self._sections[sec]
+        # Vista directa sobre el mmap: no copia
+        return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=off)
+
+    def _string(self, offs: np.ndarray, i: int) -> str:
+        a = self._blob_start + int(offs[i])
+        b = self._blob_start + int(offs[i + 1])
+        return self._mm[a:b].decode("utf-8")
+
+    # ------------------------------------------------------------------
+    # Interfaz de lista de filas
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.num_rows))]
+        if i < 0:
+            i += self.num_rows
+        if not 0 <= i < self.num_rows:
+            raise IndexError(i)
+
+        row = {"categoria": self.categorias_tabla[self.row_cat[i]]}
+        for col, offs in zip(self.columns, self._col_offs):
+            row[col] = self._string(offs, i)
+        return row
+
+    def categorias(self) -> List[str]:
+        """
+        Categoría de cada fila, sin decodificar el resto de columnas.
+        """
+        tabla = self.categorias_tabla
+        return [tabla[c] for c in self.row_cat.tolist()]
+
+    def vocabulario(self) -> Dict[str, int]:
+        return {self._string(self._vocab_off, i): i for i in range(self.num_tokens)}
+
+    def bm25_index(self, **kwargs) -> BM25Index:
+        """
+        Índice BM25 a partir de los tokens precalculados (sin re-tokenizar).
+        """
+        index = BM25Index(self.vocabulario(), self.tok_indptr, self.tok_ids, **kwargs)
+        index.rows = self
+        return index
+
+    def is_stale(self) -> bool:
+        """
+        True si el fichero compilado ha cambiado en disco.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) != (self.mtime_ns, self.size)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Uso: python -m bot.faq_catalog <faq.csv> <salida.faqc>")
+        sys.exit(1)
+    compile_faq(argv[0], argv[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# bot/faq_snapshot.py
+
+import csv
+import hashlib
+import io
+import os
+from typing import List, Dict, Any, Optional
+
+
+# Bytes finales ya leídos que se guardan (para saber si el último byte
+# consumido cierra una línea)
+_TAIL_BYTES = 4096
+
+# Tamaño de bloque al volver a hashear el contenido ya leído
+_CHUNK_BYTES = 1 << 20
+
+
+class FaqSnapshot(list):
+    """
+    Foto inmutable de la FAQ: las filas (es una lista) más los metadatos del
+    fichero del que salieron y los índices derivados.
+
+    Una vez publicada no se modifica: una recarga construye otra FaqSnapshot
+    y la sustituye de golpe, así nadie ve nunca un catálogo a medio cargar.
+    """
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        path: str = "",
+        mtime_ns: int = 0,
+        size: int = 0,
+        fieldnames: Optional[List[str]] = None,
+        hasher: Optional[Any] = None,
+        tail: bytes = b"",
+    ):
+        super().__init__(rows)
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size  # bytes consumidos del fichero
+        self.fieldnames = fieldnames or []
+        self._hasher = hasher or hashlib.sha256()
+        self.tail = tail
+        # nombre del recuperador -> índice construido sobre estas filas
+        self.indexes: Dict[str, Any] = {}
+
+    @property
+    def sha256(self) -> str:
+        """
+        Hash del contenido leído (clave de los índices persistidos).
+        """
+        return self._hasher.hexdigest()
+
+    def is_stale(self) -> bool:
+        """
+        True si el fichero de origen ha cambiado (mtime o tamaño).
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) != (self.mtime_ns, self.size)
+
+
+def read_snapshot(path: str) -> FaqSnapshot:
+    """
+    Lee el CSV completo y devuelve una FaqSnapshot nueva (sin índices).
+    """
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""))
+    rows = list(reader)
+
+    return FaqSnapshot(
+        rows,
+        path=path,
+        mtime_ns=st.st_mtime_ns,
+        size=len(data),
+        fieldnames=list(reader.fieldnames or []),
+        hasher=hashlib.sha256(data),
+        tail=data[-_TAIL_BYTES:],
+    )
+
+
+def append_snapshot(prev: FaqSnapshot) -> Optional[FaqSnapshot]:
+    """
+    Si el fichero sólo ha crecido por el final, lee únicamente las líneas
+    nuevas y devuelve una FaqSnapshot con las filas anteriores + las nuevas.
+
+    Devuelve None si el cambio no es un "append" limpio (hay que releer todo).
+
+    Que el contenido anterior siga intacto se comprueba con el sha256 de los
+    primeros prev.size bytes (una edición del mismo tamaño en mitad del
+    fichero no cambia el final): leer y hashear es mucho más barato que
+    volver a parsear el CSV, y el hash es la clave de los índices persistidos.
+    """
+    if not prev.fieldnames or (prev.tail and not prev.tail.endswith(b"\n")):
+        return None
+
+    with open(prev.path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size <= prev.size:
+            return None
+
+        # El contenido ya leído debe seguir igual
+        hasher = hashlib.sha256()
+        restante = prev.size
+        while restante > 0:
+            bloque = f.read(min(_CHUNK_BYTES, restante))
+            if not bloque:
+                return None
+            hasher.update(bloque)
+            restante -= len(bloque)
+        if hasher.hexdigest() != prev.sha256:
+            return None
+
+        nuevo = f.read()
+
+    # Sólo consumimos líneas completas; el resto se leerá en la siguiente pasada
+    nuevo = nuevo[: nuevo.rfind(b"\n") + 1]
+    if not nuevo:
+        return None
+
+    try:
+        reader = csv.DictReader(
+            io.StringIO(nuevo.decode("utf-8"), newline=""),
+            fieldnames=prev.fieldnames,
+        )
+        nuevas = list(reader)
+    except (csv.Error, UnicodeDecodeError):
+        return None
+
+    hasher.update(nuevo)
+
+    return FaqSnapshot(
+        list(prev) + nuevas,
+        path=prev.path,
+        mtime_ns=st.st_mtime_ns,
+        size=prev.size + len(nuevo),
+        fieldnames=prev.fieldnames,
+        hasher=hasher,
+        tail=(prev.tail + nuevo)[-_TAIL_BYTES:],
+    )
@@ -0,0 +1,209 @@
+# bot/faq_sqlite.py
+#
+# Base de conocimiento en SQLite con un índice FTS5 sobre
+# categoria, pregunta_canonica y respuesta_base.
+#
+# Importar el CSV:
+#   python -m bot.faq_sqlite data/faq.csv data/faq.db
+
+import csv
+import sqlite3
+import sys
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from loguru import logger
+
+from bot.bm25 import tokenize
+
+
+COLUMNS = ("categoria", "pregunta_canonica", "respuesta_base", "tipo")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS faq (
+    id INTEGER PRIMARY KEY,
+    categoria TEXT NOT NULL DEFAULT '',
+    pregunta_canonica TEXT NOT NULL DEFAULT '',
+    respuesta_base TEXT NOT NULL DEFAULT '',
+    -- pregunta/queja/devolucion/otro; vacío = aplica a cualquier tipo
+    tipo TEXT NOT NULL DEFAULT ''
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS faq_fts USING fts5(
+    categoria, pregunta_canonica, respuesta_base,
+    content='faq', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+-- Triggers: el índice FTS se mantiene solo al insertar/editar/borrar filas
+CREATE TRIGGER IF NOT EXISTS faq_ai AFTER INSERT ON faq BEGIN
+    INSERT INTO faq_fts(rowid, categoria, pregunta_canonica, respuesta_base)
+    VALUES (new.id, new.categoria, new.pregunta_canonica, new.respuesta_base);
+END;
+
+CREATE TRIGGER IF NOT EXISTS faq_ad AFTER DELETE ON faq BEGIN
+    INSERT INTO faq_fts(faq_fts, rowid, categoria, pregunta_canonica, respuesta_base)
+    VALUES ('delete', old.id, old.categoria, old.pregunta_canonica, old.respuesta_base);
+END;
+
+CREATE TRIGGER IF NOT EXISTS faq_au AFTER UPDATE ON faq BEGIN
+    INSERT INTO faq_fts(faq_fts, rowid, categoria, pregunta_canonica, respuesta_base)
+    VALUES ('delete', old.id, old.categoria, old.pregunta_canonica, old.respuesta_base);
+    INSERT INTO faq_fts(rowid, categoria, pregunta_canonica, respuesta_base)
+    VALUES (new.id, new.categoria, new.pregunta_canonica, new.respuesta_base);
+END;
+"""
+
+
+def _match_query(consulta: str) -> str:
+    """
+    Convierte un texto libre en una expresión MATCH de FTS5 (tokens en OR).
+    Cada token va entre comillas para que no se interprete como sintaxis FTS.
+    """
+    tokens = dict.fromkeys(tokenize(consulta))
+    return " OR ".join(f'"{t}"' for t in tokens)
+
+
+def _values(row: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Valores de una fila en el orden de COLUMNS (tipo normalizado).
+    """
+    categoria, pregunta, respuesta, tipo = (row.get(c) or "" for c in COLUMNS)
+    return categoria, pregunta, respuesta, tipo.strip().lower()
+
+
+class FaqSqliteStore:
+    """
+    FAQ en una base SQLite local (modo WAL).
+
+    Cada hilo reutiliza su propia conexión; las búsquedas se ordenan con
+    bm25() y se limitan en SQL, así el catálogo no tiene que caber en RAM.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(_SCHEMA)
+            # Bases creadas antes de existir la columna tipo
+            cols = {r["name"] for r in conn.execute("PRAGMA table_info(faq)")}
+            if "tipo" not in cols:
+                conn.execute("ALTER TABLE faq ADD COLUMN tipo TEXT NOT NULL DEFAULT ''")
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def replace_all(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Sustituye todo el contenido por estas filas (en una transacción).
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM faq")
+            conn.execute("INSERT INTO faq_fts(faq_fts) VALUES ('delete-all')")
+            cur = conn.executemany(
+                "INSERT INTO faq (categoria, pregunta_canonica, respuesta_base, tipo) VALUES (?, ?, ?, ?)",
+                (_values(row) for row in rows),
+            )
+        return cur.rowcount
+
+    def import_csv(self, csv_path: str) -> int:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            n = self.replace_all(csv.DictReader(f))
+        logger.info("FAQ importada a SQLite ({}): {} filas", self.path, n)
+        return n
+
+    def upsert_row(self, row: Dict[str, Any], row_id: Optional[int] = None) -> int:
+        """
+        Inserta una fila nueva o actualiza la fila row_id. Devuelve su id.
+        """
+        values = _values(row)
+        conn = self.connection()
+        with conn:
+            if row_id is None:
+                cur = conn.execute(
+                    "INSERT INTO faq (categoria, pregunta_canonica, respuesta_base, tipo) VALUES (?, ?, ?, ?)",
+                    values,
+                )
+                return cur.lastrowid
+            conn.execute(
+                "UPDATE faq SET categoria = ?, pregunta_canonica = ?, respuesta_base = ?, tipo = ? WHERE id = ?",
+                values + (row_id,),
+            )
+            return row_id
+
+    def delete_row(self, row_id: int) -> None:
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM faq WHERE id = ?", (row_id,))
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM faq").fetchone()[0]
+
+    def search(
+        self, consulta: str, k: int = 3, tipo: Optional[str] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Devuelve las k filas más relevantes como (fila, score), de mayor a
+        menor score. bm25() de FTS5 es "menor es mejor", así que se invierte.
+
+        Con `tipo`, sólo se buscan las filas de ese tipo y las filas sin tipo.
+        """
+        match = _match_query(consulta)
+        if not match:
+            return []
+
+        filtro = "AND faq.tipo IN (?, '')" if tipo else ""
+        params = (match, tipo, k) if tipo else (match, k)
+
+        cur = self.connection().execute(
+            f"""
+            SELECT faq.id, faq.categoria, faq.pregunta_canonica, faq.respuesta_base,
+                   faq.tipo, bm25(faq_fts) AS rank
+            FROM faq_fts
+            JOIN faq ON faq.id = faq_fts.rowid
+            WHERE faq_fts MATCH ? {filtro}
+            ORDER BY rank, faq.id
+            LIMIT ?
+            """,
+            params,
+        )
+        return [
+            ({c: r[c] for c in COLUMNS}, -float(r["rank"]))
+            for r in cur.fetchall()
+        ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Uso: python -m bot.faq_sqlite <faq.csv> <faq.db>")
+        sys.exit(1)
+    store = FaqSqliteStore(argv[1])
+    store.import_csv(argv[0])
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# bot/fused_agent.py
+#
+# Modo "fused" (GRAPH_MODE=fused): la recuperación se hace con el mensaje en
+# bruto y una única llamada al LLM devuelve a la vez el NLP y la respuesta.
+# El BotState resultante tiene la misma forma que con el grafo de dos llamadas.
+
+import inspect
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+from pydantic import ValidationError
+from langchain_core.runnables import RunnableConfig
+
+from bot.answer import (
+    answer_from_text,
+    answer_node,
+    aanswer_node,
+    build_prompt_context,
+    degraded_answer,
+    token_sink,
+)
+from bot.config import OPENAI_MODEL_NAME
+from bot.llm import get_llm
+from bot.models import BotState, NLPResult
+from bot.prompt_store import PromptTemplate, compile_template, get_prompt, record_prefix_cache
+from bot.resilience import LLMUnavailableError, client_options, get_caller
+
+
+FUSED_INSTRUCTIONS = """
+
+MODO COMBINADO:
+Haz en un solo paso las dos tareas anteriores: clasifica el mensaje y
+respóndelo usando SOLO la BASE DE CONOCIMIENTO que se adjunta.
+Devuelve SOLO un objeto JSON con esta forma:
+{
+  "intent": {"tipo_mensaje": ..., "intencion": ..., "confianza": ..., "sentimiento": ...},
+  "entidades": [{"tipo": ..., "valor": ...}],
+  "respuesta": "texto para el cliente",
+  "necesita_revision_humano": true | false
+}
+"""
+
+_NLP_FALLBACK = {
+    "intent": {
+        "tipo_mensaje": "otro",
+        "intencion": "unknown",
+        "confianza": 0.0,
+        "sentimiento": "neutral",
+    },
+    "entidades": [],
+}
+
+
+def fused_template() -> PromptTemplate:
+    return compile_template(
+        "fused_agent",
+        get_prompt("nlp_agent.system") + "\n\n" + get_prompt("answer_agent.system"),
+        FUSED_INSTRUCTIONS,
+        (("BASE DE CONOCIMIENTO", "contexto"), ("MENSAJE DEL CLIENTE", "mensaje")),
+    )
+
+
+def _messages(state: BotState) -> Tuple[PromptTemplate, list]:
+    plantilla = fused_template()
+    messages = plantilla.messages(
+        contexto=build_prompt_context(state.knowledge_hits), mensaje=state.user_message
+    )
+    return plantilla, messages
+
+
+def _get_client():
+    # Modo JSON de OpenAI: la salida siempre es un objeto JSON parseable
+    return get_llm(model=OPENAI_MODEL_NAME, temperature=0, **client_options("fused")).bind(
+        response_format={"type": "json_object"}
+    )
+
+
+def parse_fused(raw: str) -> Optional[Tuple[NLPResult, str, bool]]:
+    """
+    (NLPResult, respuesta, necesita_revision_humano) o None si la salida
+    no tiene la forma esperada.
+    """
+    try:
+        data: Dict[str, Any] = json.loads(raw)
+        nlp = NLPResult.model_validate(data)
+        respuesta = data["respuesta"]
+    except (json.JSONDecodeError, ValidationError, KeyError, TypeError):
+        return None
+    if not isinstance(respuesta, str) or not respuesta.strip():
+        return None
+    return nlp, respuesta, bool(data.get("necesita_revision_humano", False))
+
+
+def _with_nlp(state: BotState, nlp: NLPResult, raw: str) -> BotState:
+    new_state = state.model_copy()
+    new_state.nlp = nlp
+    debug = new_state.debug.copy()
+    debug["nlp_raw"] = nlp.model_dump_json()
+    debug["fused_raw"] = raw
+    new_state.debug = debug
+    return new_state
+
+
+def _from_raw(state: BotState, raw: str) -> Tuple[BotState, bool]:
+    """
+    Nuevo estado y si hace falta generar la respuesta aparte (salida inválida).
+    """
+    parsed = parse_fused(raw)
+    if parsed is None:
+        logger.warning("Salida del modo fused inválida; se genera la respuesta por separado.")
+        return _with_nlp(state, NLPResult(**_NLP_FALLBACK), raw), True
+
+    nlp, respuesta, necesita_revision = parsed
+    return answer_from_text(_with_nlp(state, nlp, raw), respuesta, necesita_revision), False
+
+
+def _degraded(state: BotState, error: LLMUnavailableError) -> BotState:
+    # Sin LLM no tiene sentido la segunda llamada: NLP por defecto y respuesta degradada
+    return degraded_answer(_with_nlp(state, NLPResult(**_NLP_FALLBACK), ""), error)
+
+
+def fused_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    """
+    Nodo único de NLP + respuesta. Espera state.knowledge_hits ya rellenado
+    (message_knowledge_node). Si la salida no es válida, el NLP queda con el
+    valor por defecto y la respuesta se pide con answer_node (2ª llamada).
+
+    La salida es un JSON, así que con on_token la respuesta llega de una vez
+    al final en lugar de token a token.
+    """
+    logger.info("Ejecutando fused_node...")
+    plantilla, messages = _messages(state)
+    client = _get_client()
+    try:
+        response = get_caller("fused").call(lambda: client.invoke(messages))
+    except LLMUnavailableError as e:
+        return _degraded(state, e)
+    record_prefix_cache(plantilla, response)
+    raw = response.content
+    new_state, reintentar = _from_raw(state, raw)
+    if reintentar:
+        return answer_node(new_state, config)
+
+    sink = token_sink(config)
+    if sink is not None:
+        sink(new_state.answer["respuesta"])
+    logger.info("fused_node finalizado correctamente.")
+    return new_state
+
+
+async def afused_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    logger.info("Ejecutando afused_node...")
+    plantilla, messages = _messages(state)
+    client = _get_client()
+    try:
+        response = await get_caller("fused").acall(lambda: client.ainvoke(messages))
+    except LLMUnavailableError as e:
+        return _degraded(state, e)
+    record_prefix_cache(plantilla, response)
+    raw = response.content
+    new_state, reintentar = _from_raw(state, raw)
+    if reintentar:
+        return await aanswer_node(new_state, config)
+
+    sink = token_sink(config)
+    if sink is not None:
+        res = sink(new_state.answer["respuesta"])
+        if inspect.isawaitable(res):
+            await res
+    logger.info("afused_node finalizado correctamente.")
+    return new_state
@@ -1,9 +1,28 @@
 # bot/graph.py
-from langgraph.graph import StateGraph, END
+from typing import Callable, List, Optional
+
+from langgraph.graph import StateGraph, START, END
 from bot.models import BotState  # lo puedes seguir usando para tipos internos si quieres
-from bot.nlp_agent import nlp_node
-from bot.knowledge import knowledge_node
-from bot.answer import answer_node  # o como lo llames
+from bot.config import GRAPH_MODE, GRAPH_LEAN_STATE
+from bot.lean import LeanState, lean_node, lean_route
+from bot.nlp_agent import nlp_node, anlp_node
+from bot.knowledge import (
+    knowledge_node,
+    aknowledge_node,
+    message_knowledge_node,
+    amessage_knowledge_node,
+)
+from bot.answer import answer_node, aanswer_node  # o como lo llames
+from bot.fused_agent import fused_node, afused_node
+from bot.template_agent import template_node, atemplate_node, route_after_knowledge
+from bot.speculative import (
+    nlp_branch_node,
+    anlp_branch_node,
+    speculative_retrieval_node,
+    aspeculative_retrieval_node,
+    merge_knowledge_node,
+    amerge_knowledge_node,
+)
 
 
 def initial_state(user_message: str) -> BotState:
@@ -20,17 +39,92 @@ def initial_state(user_message: str) -> BotState:
     )
 
 
-def build_graph():
-    #  El estado base del grafo es un dict
-    graph = StateGraph(BotState)
+def _both_branches(state: BotState) -> List[str]:
+    return ["nlp_agent", "speculative_agent"]
+
+
+def _identity(fn: Callable) -> Callable:
+    return fn
+
+
+def _add_answer_step(graph: StateGraph, asincrono: bool, nodo: Callable, ruta: Callable) -> None:
+    """
+    knowledge_agent → answer_agent (LLM) o template_agent (respuesta de la
+    FAQ sin LLM, ver bot/template_agent.py) → END.
+    """
+    graph.add_node("answer_agent", nodo(aanswer_node if asincrono else answer_node))
+    graph.add_node("template_agent", nodo(atemplate_node if asincrono else template_node))
+    graph.add_conditional_edges(
+        "knowledge_agent",
+        ruta(route_after_knowledge),
+        {"answer_agent": "answer_agent", "template_agent": "template_agent"},
+    )
+    graph.add_edge("answer_agent", END)
+    graph.add_edge("template_agent", END)
+
+
+def build_graph(asincrono: bool = False, modo: Optional[str] = None, lean: Optional[bool] = None):
+    """
+    Construye el grafo según `modo` (por defecto GRAPH_MODE):
+
+      - "pipeline": nlp → knowledge → answer (o template, ver _add_answer_step)
+      - "fused":    knowledge (mensaje en bruto) → fused (NLP + respuesta)
+      - "speculative": nlp y búsqueda con el mensaje en bruto en paralelo →
+                    knowledge (une/reordena) → answer
+
+    Todos dejan el mismo BotState. Con asincrono=True los nodos usan ainvoke
+    y el grafo se ejecuta con app.ainvoke / app.astream (ver bot/driver.py).
+
+    Con lean=True (por defecto GRAPH_LEAN_STATE) el estado entre nodos no se
+    valida y cada nodo sólo publica lo que cambia (ver bot/lean.py); el
+    resultado final es el mismo.
+
+    Los nodos no pueden llamarse igual que un campo de BotState ("nlp",
+    "answer"), por eso llevan el sufijo _agent.
+    """
+    modo = modo or GRAPH_MODE
+    lean = GRAPH_LEAN_STATE if lean is None else lean
+    graph = StateGraph(LeanState if lean else BotState)
+    nodo = lean_node if lean else _identity
+    ruta = lean_route if lean else _identity
+
+    if modo == "fused":
+        graph.add_node("knowledge_agent", nodo(amessage_knowledge_node if asincrono else message_knowledge_node))
+        graph.add_node("fused_agent", nodo(afused_node if asincrono else fused_node))
+
+        graph.set_entry_point("knowledge_agent")
+        graph.add_edge("knowledge_agent", "fused_agent")
+        graph.add_edge("fused_agent", END)
+        return graph.compile()
+
+    if modo == "speculative":
+        graph.add_node("nlp_agent", nodo(anlp_branch_node if asincrono else nlp_branch_node))
+        graph.add_node(
+            "speculative_agent", nodo(aspeculative_retrieval_node if asincrono else speculative_retrieval_node)
+        )
+        graph.add_node("knowledge_agent", nodo(amerge_knowledge_node if asincrono else merge_knowledge_node))
+
+        # Las dos ramas arrancan a la vez (una arista condicional que devuelve
+        # ambos nodos) y knowledge espera a las dos
+        graph.add_conditional_edges(
+            START, _both_branches, {"nlp_agent": "nlp_agent", "speculative_agent": "speculative_agent"}
+        )
+        graph.add_edge(["nlp_agent", "speculative_agent"], "knowledge_agent")
+        _add_answer_step(graph, asincrono, nodo, ruta)
+        return graph.compile()
+
+    if modo != "pipeline":
+        raise ValueError(f"GRAPH_MODE desconocido: {modo}")
 
-    graph.add_node("nlp", nlp_node)
-    graph.add_node("knowledge", knowledge_node)
-    graph.add_node("answer", answer_node)
+    if asincrono:
+        graph.add_node("nlp_agent", nodo(anlp_node))
+        graph.add_node("knowledge_agent", nodo(aknowledge_node))
+    else:
+        graph.add_node("nlp_agent", nodo(nlp_node))
+        graph.add_node("knowledge_agent", nodo(knowledge_node))
 
-    graph.set_entry_point("nlp")
-    graph.add_edge("nlp", "knowledge")
-    graph.add_edge("knowledge", "answer")
-    graph.add_edge("answer", END)
+    graph.set_entry_point("nlp_agent")
+    graph.add_edge("nlp_agent", "knowledge_agent")
+    _add_answer_step(graph, asincrono, nodo, ruta)
 
     return graph.compile()
@@ -0,0 +1,229 @@
+# bot/intent_classifier.py
+#
+# Clasificador de intención local ("fast path"): si está seguro, nlp_node no
+# llama al LLM.
+#
+# Se entrena con las filas de la FAQ (categoria + pregunta_canonica) y, si
+# existe, con el registro de clasificaciones del LLM (NLP_LOG_PATH):
+#   python -m bot.intent_classifier data/faq.csv data/intent_model.npz --log data/nlp_log.jsonl
+
+import argparse
+import csv
+import json
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from bot.models import IntentResult
+from bot.vector_index import HashingVectorizer
+
+# (texto, intencion, tipo_mensaje, sentimiento)
+Ejemplo = Tuple[str, str, str, str]
+
+TIPOS = ("pregunta", "queja", "devolucion", "otro")
+SENTIMIENTOS = ("positivo", "neutral", "negativo")
+
+
+class IntentClassifier:
+    """
+    Modelo lineal de centroides: cada intención es el vector TF-IDF medio
+    (palabras + trigramas de caracteres, con hashing) de sus ejemplos.
+
+    La confianza es un softmax de las similitudes coseno al que se añade una
+    clase "ninguna" con similitud fija `umbral_ood`: un mensaje que no se
+    parece a nada tiene confianza baja aunque sólo haya una intención.
+
+    tipo_mensaje y sentimiento son los mayoritarios entre los ejemplos de
+    cada intención.
+    """
+
+    def __init__(
+        self,
+        labels: List[str],
+        tipos: List[str],
+        sentimientos: List[str],
+        centroids: np.ndarray,
+        idf: np.ndarray,
+        temperatura: float = 0.1,
+        umbral_ood: float = 0.3,
+    ):
+        self.labels = labels
+        self.tipos = tipos
+        self.sentimientos = sentimientos
+        self.centroids = centroids
+        self.idf = idf
+        self.temperatura = temperatura
+        self.umbral_ood = umbral_ood
+        self.vectorizer = HashingVectorizer(centroids.shape[1])
+
+    @classmethod
+    def train(cls, ejemplos: List[Ejemplo], dims: int = 1024, **kwargs) -> "IntentClassifier":
+        if not ejemplos:
+            raise ValueError("No hay ejemplos para entrenar el clasificador")
+
+        vectorizer = HashingVectorizer(dims)
+        counts = vectorizer.counts_many([e[0] for e in ejemplos])
+        df = (counts > 0).sum(axis=0).astype(np.float32)
+        idf = (np.log((1.0 + len(ejemplos)) / (1.0 + df)) + 1.0).astype(np.float32)
+        X = _normalize(np.log1p(counts) * idf)
+
+        por_clase: Dict[str, List[int]] = defaultdict(list)
+        for i, (_, intencion, _, _) in enumerate(ejemplos):
+            por_clase[intencion].append(i)
+
+        labels = sorted(por_clase)
+        centroids = _normalize(np.stack([X[por_clase[l]].mean(axis=0) for l in labels]))
+        tipos = [_mayoritario(ejemplos, por_clase[l], 2, TIPOS, "otro") for l in labels]
+        sentimientos = [
+            _mayoritario(ejemplos, por_clase[l], 3, SENTIMIENTOS, "neutral") for l in labels
+        ]
+        return cls(labels, tipos, sentimientos, centroids.astype(np.float32), idf, **kwargs)
+
+    def _vectors(self, textos: List[str]) -> np.ndarray:
+        return _normalize(np.log1p(self.vectorizer.counts_many(textos)) * self.idf)
+
+    def predict_many(self, textos: List[str]) -> List[IntentResult]:
+        sims = self._vectors(textos) @ self.centroids.T
+        logits = np.hstack([sims, np.full((len(textos), 1), self.umbral_ood, dtype=sims.dtype)])
+        logits = logits / self.temperatura
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        best = sims.argmax(axis=1)
+        return [
+            IntentResult(
+                tipo_mensaje=self.tipos[b],
+                intencion=self.labels[b],
+                confianza=round(float(probs[i, b]), 4),
+                sentimiento=self.sentimientos[b],
+            )
+            for i, b in enumerate(best.tolist())
+        ]
+
+    def predict(self, texto: str) -> IntentResult:
+        return self.predict_many([texto])[0]
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            labels=np.array(self.labels),
+            tipos=np.array(self.tipos),
+            sentimientos=np.array(self.sentimientos),
+            centroids=self.centroids,
+            idf=self.idf,
+            params=np.array([self.temperatura, self.umbral_ood], dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            temperatura, umbral_ood = (float(x) for x in data["params"])
+            return cls(
+                data["labels"].tolist(),
+                data["tipos"].tolist(),
+                data["sentimientos"].tolist(),
+                data["centroids"],
+                data["idf"],
+                temperatura=temperatura,
+                umbral_ood=umbral_ood,
+            )
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+def _mayoritario(ejemplos: List[Ejemplo], idx: List[int], campo: int, validos, defecto: str) -> str:
+    votos = Counter(ejemplos[i][campo] for i in idx if ejemplos[i][campo] in validos)
+    return votos.most_common(1)[0][0] if votos else defecto
+
+
+# ----------------------------------------------------------------------
+# Datos de entrenamiento
+# ----------------------------------------------------------------------
+
+def examples_from_rows(rows) -> List[Ejemplo]:
+    """
+    Ejemplos semilla a partir de la FAQ: la intención es la categoría.
+    La FAQ no dice nada del sentimiento ("neutral"), por eso nlp_node deja
+    las quejas al LLM (ver nlp_agent.complaint_cues).
+    """
+    ejemplos: List[Ejemplo] = []
+    for row in rows:
+        categoria = (row.get("categoria") or "").strip()
+        if not categoria:
+            continue
+        tipo = (row.get("tipo") or "").strip().lower() or "pregunta"
+        for texto in (row.get("pregunta_canonica"), categoria.replace("_", " ")):
+            if texto and texto.strip():
+                ejemplos.append((texto.strip(), categoria, tipo, "neutral"))
+    return ejemplos
+
+
+def examples_from_log(path: str) -> List[Ejemplo]:
+    """
+    Ejemplos a partir del registro JSONL de nlp_node (user_message + nlp_raw).
+    Se descartan las clasificaciones ilegibles y las de intención "unknown".
+    """
+    ejemplos: List[Ejemplo] = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+                intent = json.loads(registro["nlp_raw"])["intent"]
+                intencion = intent["intencion"].strip()
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if not intencion or intencion == "unknown":
+                continue
+            ejemplos.append(
+                (
+                    registro["user_message"],
+                    intencion,
+                    intent.get("tipo_mensaje", "otro"),
+                    intent.get("sentimiento", "neutral"),
+                )
+            )
+    return ejemplos
+
+
+_LOG_LOCK = threading.Lock()
+
+
+def log_classification(path: str, user_message: str, raw: str) -> None:
+    """
+    Añade una clasificación del LLM al registro JSONL (datos de reentrenamiento).
+    """
+    linea = json.dumps({"user_message": user_message, "nlp_raw": raw}, ensure_ascii=False)
+    try:
+        with _LOG_LOCK, open(path, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    except OSError as e:
+        logger.warning("No se pudo escribir el registro NLP en {}: {}", path, e)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de intención local")
+    parser.add_argument("faq", help="faq.csv con las categorías semilla")
+    parser.add_argument("salida", help="fichero .npz del modelo")
+    parser.add_argument("--log", action="append", default=[], help="registro JSONL de nlp_node")
+    parser.add_argument("--dims", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    with open(args.faq, newline="", encoding="utf-8") as f:
+        ejemplos = examples_from_rows(csv.DictReader(f))
+    for path in args.log:
+        ejemplos.extend(examples_from_log(path))
+
+    modelo = IntentClassifier.train(ejemplos, dims=args.dims)
+    modelo.save(args.salida)
+    print(f"Modelo guardado en {args.salida}: {len(modelo.labels)} intenciones, {len(ejemplos)} ejemplos")
+
+
+if __name__ == "__main__":
+    main()
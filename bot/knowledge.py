@@ -1,15 +1,408 @@
 # bot/knowledge.py
 
-import csv
-from typing import List, Dict, Any
-
-from bot.config import FAQ_CSV_PATH
-from bot.models import BotState  # aunque lo uses como dict, viene bien para el IDE
+import asyncio
+import threading
+from collections.abc import Sequence
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
+
+from bot.bm25 import BM25Index, faq_document, normalize_text
+from bot.config import (
+    FAQ_COMPILED_PATH,
+    FAQ_CANDIDATES,
+    FAQ_CSV_PATH,
+    FAQ_ENTITY_BOOST,
+    FAQ_FUZZY,
+    FAQ_FUZZY_MIN_SIMILARITY,
+    FAQ_PARTITION_BY_TIPO,
+    FAQ_RELOAD,
+    FAQ_RELOAD_INTERVAL,
+    FAQ_RETRIEVER,
+    FAQ_SQLITE_PATH,
+    SEARCH_BATCH_SIZE,
+    VECTOR_INDEX_DIR,
+    VECTOR_DIMS,
+    VECTOR_MIN_SCORE,
+)
+from bot.faq_catalog import CompiledFaq
+from bot.faq_sqlite import FaqSqliteStore
+from bot.faq_snapshot import FaqSnapshot, read_snapshot, append_snapshot
+from bot.intent_classifier import TIPOS
+from bot.trigram import TrigramIndex
+from bot.vector_index import VectorIndex, load_or_build
+from bot.models import BotState, KnowledgeHit  # aunque lo uses como dict, viene bien para el IDE
 from loguru import logger
 
 
-# Pequeña caché en memoria para no leer el CSV todo el rato
-FAQ_CACHE: List[Dict[str, Any]] = []
+# Pequeña caché en memoria para no leer el CSV todo el rato.
+# Siempre se sustituye entera (nunca se modifica en sitio).
+FAQ_CACHE: Optional[Union[FaqSnapshot, CompiledFaq]] = None
+
+_RELOAD_LOCK = threading.RLock()
+_WATCHER: Optional[threading.Thread] = None
+_WATCHER_STOP = threading.Event()
+
+
+class FaqIndex:
+    """
+    Índices precalculados sobre las filas de la FAQ para no recorrerlas todas
+    en cada mensaje.
+
+    - by_categoria: categoría en minúsculas -> ids de fila (caso "categoría
+      contenida en la intención").
+    - trigramas: trigrama de categoría -> categorías que lo contienen (caso
+      "intención contenida en la categoría").
+    - postings: token de categoría -> ids de fila (coincidencia débil).
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.by_categoria: Dict[str, List[int]] = {}
+        self.trigramas: Dict[str, Set[str]] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self.num_tokens: List[int] = []
+        self.max_len = 0
+        self._add_rows(0)
+
+    def _add_rows(self, start: int, copiar: bool = False) -> None:
+        """
+        Indexa rows[start:]. Con copiar=True, las listas y conjuntos que se
+        tocan se copian antes, para no modificar el índice del que se partió.
+        """
+        tocadas: Set[int] = set()
+
+        def _append(d: Dict[str, List[int]], key: str, row_id: int) -> None:
+            lista = d.get(key)
+            if lista is None:
+                d[key] = [row_id]
+                tocadas.add(id(d[key]))
+                return
+            if copiar and id(lista) not in tocadas:
+                lista = d[key] = list(lista)
+                tocadas.add(id(lista))
+            lista.append(row_id)
+
+        # El catálogo compilado da las categorías sin decodificar cada fila
+        if hasattr(self.rows, "categorias"):
+            categorias = self.rows.categorias()
+        else:
+            categorias = [row.get("categoria", "") for row in self.rows]
+
+        nuevas: List[str] = []
+        for row_id in range(start, len(self.rows)):
+            categoria = (categorias[row_id] or "").lower()
+            tokens = set(categoria.split())
+            self.num_tokens.append(len(tokens))
+            if not categoria:
+                continue
+
+            if categoria not in self.by_categoria:
+                nuevas.append(categoria)
+            _append(self.by_categoria, categoria, row_id)
+            self.max_len = max(self.max_len, len(categoria))
+            for tok in tokens:
+                _append(self.postings, tok, row_id)
+
+        for categoria in nuevas:
+            for i in range(len(categoria) - 2):
+                tri = categoria[i:i + 3]
+                cats = self.trigramas.get(tri)
+                if cats is None:
+                    cats = self.trigramas[tri] = set()
+                    tocadas.add(id(cats))
+                elif copiar and id(cats) not in tocadas:
+                    cats = self.trigramas[tri] = set(cats)
+                    tocadas.add(id(cats))
+                cats.add(categoria)
+
+    def extended(self, rows: List[Dict[str, Any]], start: int) -> "FaqIndex":
+        """
+        Devuelve un índice nuevo para `rows`, cuyas primeras `start` filas son
+        las ya indexadas aquí. Sólo se procesan las filas nuevas y este
+        índice no se modifica (lo pueden estar usando otras peticiones).
+        """
+        nuevo = FaqIndex.__new__(FaqIndex)
+        nuevo.rows = rows
+        nuevo.by_categoria = dict(self.by_categoria)
+        nuevo.trigramas = dict(self.trigramas)
+        nuevo.postings = dict(self.postings)
+        nuevo.num_tokens = list(self.num_tokens)
+        nuevo.max_len = self.max_len
+        nuevo._add_rows(start, copiar=True)
+        return nuevo
+
+    def _categorias_que_contienen(self, intencion: str) -> Set[str]:
+        """
+        Categorías que contienen la intención como subcadena.
+        """
+        if len(intencion) < 3:
+            # Intenciones muy cortas: basta con recorrer las categorías distintas
+            return {c for c in self.by_categoria if intencion in c}
+
+        candidatas: Optional[Set[str]] = None
+        for i in range(len(intencion) - 2):
+            cats = self.trigramas.get(intencion[i:i + 3])
+            if not cats:
+                return set()
+            candidatas = set(cats) if candidatas is None else candidatas & cats
+            if not candidatas:
+                return set()
+
+        return {c for c in candidatas if intencion in c}
+
+    def match(self, intencion: str) -> List[Tuple[int, float]]:
+        """
+        Devuelve (row_id, score) de las filas con score > 0, en orden de fila.
+
+        Los scores son idénticos a los de simple_match_score, pero sólo se
+        evalúan las filas candidatas que salen de los índices.
+        """
+        intencion = (intencion or "").lower()
+        if not intencion:
+            return []
+
+        scores: Dict[int, float] = {}
+
+        # Coincidencia fuerte: la categoría está contenida en la intención
+        n = len(intencion)
+        for i in range(n):
+            for j in range(i + 1, min(n, i + self.max_len) + 1):
+                for row_id in self.by_categoria.get(intencion[i:j], ()):
+                    scores[row_id] = 1.0
+
+        # Coincidencia fuerte: la intención está contenida en la categoría
+        for categoria in self._categorias_que_contienen(intencion):
+            for row_id in self.by_categoria[categoria]:
+                scores[row_id] = 1.0
+
+        # Coincidencia débil: tokens compartidos con la categoría
+        comunes: Dict[int, int] = {}
+        for tok in set(intencion.split()):
+            for row_id in self.postings.get(tok, ()):
+                if row_id not in scores:
+                    comunes[row_id] = comunes.get(row_id, 0) + 1
+
+        for row_id, inter in comunes.items():
+            scores[row_id] = inter / self.num_tokens[row_id]
+
+        return sorted(scores.items())
+
+
+class FaqPartition(Sequence):
+    """
+    Vista de sólo lectura sobre las filas de un tipo de mensaje
+    (pregunta/queja/devolucion/otro) más las filas sin tipo.
+
+    No copia filas: parent[row_ids[i]]. Lleva sus propios índices, que se
+    construyen sólo con las filas de la partición.
+    """
+
+    def __init__(self, parent: Sequence, tipo: str, row_ids: List[int]):
+        self.parent = parent
+        self.tipo = tipo
+        self.row_ids = row_ids
+        self.indexes: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.parent[j] for j in self.row_ids[i]]
+        return self.parent[self.row_ids[i]]
+
+    def categorias(self) -> List[str]:
+        if hasattr(self.parent, "categorias"):
+            todas = self.parent.categorias()
+            return [todas[j] for j in self.row_ids]
+        return [self.parent[j].get("categoria", "") for j in self.row_ids]
+
+
+# Índices de la última lista de filas que no lleva los suyos
+# (p. ej. filas construidas a mano en tests o notebooks)
+_ADHOC_ROWS: Optional[List[Dict[str, Any]]] = None
+_ADHOC_INDEXES: Dict[str, Any] = {}
+
+
+def _indexes_for(rows: Sequence) -> Dict[str, Any]:
+    """
+    Devuelve el diccionario de índices asociado a estas filas.
+    FaqSnapshot, CompiledFaq y FaqPartition llevan los suyos; para listas
+    normales se usa una caché de una sola entrada.
+    """
+    global _ADHOC_ROWS, _ADHOC_INDEXES
+    indexes = getattr(rows, "indexes", None)
+    if isinstance(indexes, dict):
+        return indexes
+    if _ADHOC_ROWS is not rows:
+        _ADHOC_ROWS, _ADHOC_INDEXES = rows, {}
+    return _ADHOC_INDEXES
+
+
+def get_faq_index(rows: List[Dict[str, Any]]) -> FaqIndex:
+    """
+    Devuelve el índice asociado a estas filas, construyéndolo si hace falta.
+    """
+    indexes = _indexes_for(rows)
+    if "categoria" not in indexes:
+        logger.debug("Construyendo índice de FAQ ({} filas).", len(rows))
+        indexes["categoria"] = FaqIndex(rows)
+    return indexes["categoria"]
+
+
+def get_trigram_index(rows: List[Dict[str, Any]]) -> TrigramIndex:
+    """
+    Devuelve el índice de trigramas (categorías y preguntas normalizadas)
+    asociado a estas filas, construyéndolo si hace falta.
+    """
+    indexes = _indexes_for(rows)
+    if "trigram" not in indexes:
+        logger.debug("Construyendo índice de trigramas de FAQ ({} filas).", len(rows))
+        indexes["trigram"] = TrigramIndex(rows)
+    return indexes["trigram"]
+
+
+def get_bm25_index(rows: List[Dict[str, Any]]) -> BM25Index:
+    """
+    Devuelve el índice BM25 asociado a estas filas, construyéndolo si hace falta.
+    """
+    indexes = _indexes_for(rows)
+    if "bm25" not in indexes:
+        logger.debug("Construyendo índice BM25 de FAQ ({} filas).", len(rows))
+        if isinstance(rows, CompiledFaq):
+            indexes["bm25"] = rows.bm25_index()
+        else:
+            indexes["bm25"] = BM25Index.from_rows(rows)
+    return indexes["bm25"]
+
+
+def get_vector_index(rows: List[Dict[str, Any]]) -> VectorIndex:
+    """
+    Devuelve el índice vectorial asociado a estas filas.
+
+    Para una FaqSnapshot o un CompiledFaq se reutiliza el índice persistido
+    en disco (clave = hash del CSV); una partición usa las filas del índice
+    de su catálogo; para otras filas se construye en memoria.
+    """
+    indexes = _indexes_for(rows)
+    if "vector" not in indexes:
+        digest = getattr(rows, "sha256", None)
+        if isinstance(rows, FaqPartition):
+            # Las particiones reutilizan los vectores del catálogo completo
+            indexes["vector"] = get_vector_index(rows.parent).subset(rows.row_ids)
+            indexes["vector"].rows = rows
+        elif digest:
+            indexes["vector"] = load_or_build(
+                rows, digest, VECTOR_INDEX_DIR, dims=VECTOR_DIMS
+            )
+        else:
+            logger.debug("Construyendo índice vectorial de FAQ ({} filas).", len(rows))
+            indexes["vector"] = VectorIndex.from_rows(rows, dims=VECTOR_DIMS)
+    return indexes["vector"]
+
+
+def get_partitions(rows: Sequence) -> Dict[str, FaqPartition]:
+    """
+    Particiones por la columna opcional `tipo`. Cada partición contiene las
+    filas de ese tipo más las filas sin tipo (que valen para cualquiera).
+    Se crean de una vez para todos los TIPOS (un tipo sin filas propias se
+    queda con las filas sin tipo), así que el dict no cambia tras publicarse.
+
+    Si ninguna fila tiene tipo, devuelve {} y se busca en toda la FAQ.
+    """
+    indexes = _indexes_for(rows)
+    if "particiones" not in indexes:
+        por_tipo: Dict[str, List[int]] = {}
+        sin_tipo: List[int] = []
+        for row_id in range(len(rows)):
+            tipo = (rows[row_id].get("tipo") or "").strip().lower()
+            if tipo:
+                por_tipo.setdefault(tipo, []).append(row_id)
+            else:
+                sin_tipo.append(row_id)
+
+        particiones: Dict[str, FaqPartition] = {}
+        if por_tipo:
+            for tipo in dict.fromkeys((*TIPOS, *por_tipo)):
+                particiones[tipo] = FaqPartition(rows, tipo, sorted(por_tipo.get(tipo, []) + sin_tipo))
+        indexes["particiones"] = particiones
+        if por_tipo:
+            logger.debug(
+                "Particiones de FAQ por tipo: {}",
+                {t: len(p) for t, p in indexes["particiones"].items()},
+            )
+    return indexes["particiones"]
+
+
+def partition_for(rows: Sequence, tipo_mensaje: Optional[str]) -> Sequence:
+    """
+    Devuelve la partición en la que buscar para este tipo de mensaje, o
+    todas las filas si la FAQ no tiene tipos o el tipo no tiene partición.
+    Sólo lee: las particiones se construyen en _build_indexes.
+    """
+    if not FAQ_PARTITION_BY_TIPO or not tipo_mensaje:
+        return rows
+    return get_partitions(rows).get(tipo_mensaje, rows)
+
+
+def apply_entity_boost(
+    matches: List[Tuple[Dict[str, Any], float]],
+    entidades: List[Any],
+    boost: float,
+) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Multiplica por (1 + boost) el score de las filas cuyo texto contiene el
+    valor de alguna entidad extraída (p. ej. "Canarias", "zapatillas").
+    """
+    valores = [normalize_text(getattr(e, "valor", "") or "").strip() for e in entidades]
+    valores = [v for v in valores if v]
+    if not valores or not boost:
+        return matches
+
+    boosted = []
+    for row, score in matches:
+        texto = normalize_text(faq_document(row))
+        if any(v in texto for v in valores):
+            score *= 1 + boost
+        boosted.append((row, score))
+    return boosted
+
+
+def _read_catalog() -> Union[FaqSnapshot, CompiledFaq]:
+    """
+    Abre el catálogo compilado si está configurado; si no, lee el CSV.
+    """
+    if FAQ_COMPILED_PATH:
+        logger.info("Abriendo catálogo compilado: {}", FAQ_COMPILED_PATH)
+        return CompiledFaq(FAQ_COMPILED_PATH)
+    logger.info("Cargando FAQ desde CSV: {}", FAQ_CSV_PATH)
+    return read_snapshot(FAQ_CSV_PATH)
+
+
+def _build_indexes(
+    snapshot: Union[FaqSnapshot, CompiledFaq, FaqPartition],
+    prev: Optional[Union[FaqSnapshot, CompiledFaq]] = None,
+) -> Union[FaqSnapshot, CompiledFaq, FaqPartition]:
+    """
+    Construye los índices del recuperador configurado (también los de cada
+    partición por tipo) antes de publicar la snapshot. Si es un "append"
+    sobre prev, el índice por categoría se amplía en lugar de rehacerse.
+    """
+    if FAQ_RETRIEVER == "bm25":
+        get_bm25_index(snapshot)
+    elif FAQ_RETRIEVER == "vector":
+        get_vector_index(snapshot)
+    else:
+        if isinstance(prev, FaqSnapshot) and "categoria" in prev.indexes:
+            snapshot.indexes["categoria"] = prev.indexes["categoria"].extended(snapshot, len(prev))
+        else:
+            get_faq_index(snapshot)
+        if FAQ_FUZZY:
+            get_trigram_index(snapshot)
+
+    if FAQ_PARTITION_BY_TIPO and not isinstance(snapshot, FaqPartition):
+        for particion in get_partitions(snapshot).values():
+            _build_indexes(particion)
+    return snapshot
 
 
 def load_faq() -> List[Dict[str, Any]]:
@@ -17,31 +410,173 @@ def load_faq() -> List[Dict[str, Any]]:
     Carga el CSV de FAQ una única vez y lo deja en memoria.
 
     Así no estamos abriendo el archivo en cada llamada al nodo.
+    Con FAQ_RELOAD activo, un hilo en segundo plano vigila el fichero y
+    sustituye FAQ_CACHE por una snapshot nueva cuando cambia.
     """
     global FAQ_CACHE
-    if FAQ_CACHE:
+    if FAQ_CACHE is not None:
         logger.debug("FAQ_CACHE ya cargada en memoria ({} filas).", len(FAQ_CACHE))
         return FAQ_CACHE
 
-    logger.info("Cargando FAQ desde CSV: {}", FAQ_CSV_PATH)
-    
-    rows: List[Dict[str, Any]] = []
+    with _RELOAD_LOCK:
+        if FAQ_CACHE is None:
+            try:
+                snapshot = _read_catalog()
+            except Exception as e:
+                logger.error("Error al leer la FAQ ({}): {}", FAQ_COMPILED_PATH or FAQ_CSV_PATH, e)
+                raise
 
-    try:
-        with open(FAQ_CSV_PATH, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                rows.append(row)
-    except Exception as e:
-        logger.error("Error al leer FAQ_CSV_PATH ({}): {}", FAQ_CSV_PATH, e)
-        raise
+            FAQ_CACHE = _build_indexes(snapshot)
+            logger.info("FAQ cargada correctamente: {} filas", len(snapshot))
 
-    FAQ_CACHE = rows
-    logger.info("FAQ cargada correctamente: {} filas", len(rows))
+    if FAQ_RELOAD:
+        start_faq_watcher()
 
     return FAQ_CACHE
 
 
+def reload_faq_if_changed() -> bool:
+    """
+    Comprueba mtime/tamaño de faq.csv y, si ha cambiado, construye una
+    snapshot nueva (incremental si sólo se han añadido filas al final) y la
+    publica con una única asignación.
+
+    Devuelve True si se ha publicado una snapshot nueva.
+    """
+    global FAQ_CACHE
+    with _RELOAD_LOCK:
+        prev = FAQ_CACHE
+        if prev is None or not prev.is_stale():
+            return False
+
+        try:
+            snapshot = append_snapshot(prev) if isinstance(prev, FaqSnapshot) else None
+            if snapshot is not None:
+                _build_indexes(snapshot, prev)
+                logger.info("FAQ ampliada: {} filas nuevas", len(snapshot) - len(prev))
+            else:
+                snapshot = _build_indexes(_read_catalog())
+                logger.info("FAQ recargada: {} filas", len(snapshot))
+        except Exception as e:
+            # Seguimos sirviendo la snapshot anterior
+            logger.error("Error al recargar la FAQ ({}): {}", prev.path, e)
+            return False
+
+        FAQ_CACHE = snapshot
+        return True
+
+
+def _watch_faq(interval: float) -> None:
+    while not _WATCHER_STOP.wait(interval):
+        reload_faq_if_changed()
+
+
+def start_faq_watcher(interval: Optional[float] = None) -> None:
+    """
+    Arranca (una sola vez) el hilo que vigila faq.csv.
+    """
+    global _WATCHER
+    with _RELOAD_LOCK:
+        if _WATCHER is not None and _WATCHER.is_alive():
+            return
+        _WATCHER_STOP.clear()
+        _WATCHER = threading.Thread(
+            target=_watch_faq,
+            args=(interval or FAQ_RELOAD_INTERVAL,),
+            name="faq-watcher",
+            daemon=True,
+        )
+        _WATCHER.start()
+        logger.info("Recarga en caliente de FAQ activada ({}).", FAQ_CSV_PATH)
+
+
+def stop_faq_watcher() -> None:
+    global _WATCHER
+    _WATCHER_STOP.set()
+    if _WATCHER is not None:
+        _WATCHER.join()
+        _WATCHER = None
+
+
+FAQ_STORE: Optional[FaqSqliteStore] = None
+
+
+def get_faq_store() -> FaqSqliteStore:
+    """
+    Devuelve la base SQLite de la FAQ (una por proceso; cada hilo usa su
+    propia conexión). Si está vacía, importa FAQ_CSV_PATH.
+    """
+    global FAQ_STORE
+    if FAQ_STORE is None:
+        with _RELOAD_LOCK:
+            if FAQ_STORE is None:
+                store = FaqSqliteStore(FAQ_SQLITE_PATH)
+                if store.count() == 0:
+                    store.import_csv(FAQ_CSV_PATH)
+                FAQ_STORE = store
+    return FAQ_STORE
+
+
+def _to_knowledge_hit(row: Dict[str, Any], score: float, retriever: str) -> KnowledgeHit:
+    return KnowledgeHit(
+        categoria=row.get("categoria", "") or "",
+        pregunta_canonica=row.get("pregunta_canonica", "") or "",
+        respuesta_base=row.get("respuesta_base", "") or "",
+        score=score,
+        retriever=retriever,
+    )
+
+
+def search_many(
+    intents: List[str],
+    k: int = 3,
+    retriever: Optional[str] = None,
+    chunk_size: int = SEARCH_BATCH_SIZE,
+) -> List[List[KnowledgeHit]]:
+    """
+    Recupera los k mejores hits para cada intención de un lote, en el mismo
+    orden de entrada. Pensado para reprocesado offline y evaluación.
+
+    - "bm25" / "vector": una matriz consultas x documentos por bloque de
+      `chunk_size` consultas y top-k por filas (sin bucles por fila de FAQ).
+    - "categoria": el índice invertido por intención (mismos scores que
+      knowledge_node).
+    - "sqlite": una consulta FTS5 por intención.
+    """
+    retriever = retriever or FAQ_RETRIEVER
+    results: List[List[KnowledgeHit]] = []
+
+    if retriever == "sqlite":
+        store = get_faq_store()
+        return [[_to_knowledge_hit(r, s, retriever) for r, s in store.search(i, k=k)] for i in intents]
+
+    faq_rows = load_faq()
+
+    if retriever == "categoria":
+        index = get_faq_index(faq_rows)
+        for intencion in intents:
+            ranked = index.match(intencion)
+            ranked.sort(key=lambda m: m[1], reverse=True)
+            results.append([_to_knowledge_hit(faq_rows[i], s, retriever) for i, s in ranked[:k]])
+        return results
+
+    for start in range(0, len(intents), chunk_size):
+        bloque = intents[start:start + chunk_size]
+        if retriever == "bm25":
+            ranked = get_bm25_index(faq_rows).search_many(bloque, k=k)
+        elif retriever == "vector":
+            ranked = get_vector_index(faq_rows).search_many(
+                bloque, k=k, min_score=VECTOR_MIN_SCORE
+            )
+        else:
+            raise ValueError(f"Recuperador desconocido: {retriever}")
+        results.extend(
+            [_to_knowledge_hit(faq_rows[i], s, retriever) for i, s in fila] for fila in ranked
+        )
+
+    return results
+
+
 def simple_match_score(intencion: str, categoria: str) -> float:
     """
     Heurística muy simple para medir la similitud entre:
@@ -72,34 +607,64 @@ def simple_match_score(intencion: str, categoria: str) -> float:
     return 0.0
 
 
-def knowledge_node(state: BotState) -> BotState:
+def retrieve_hits(
+    consulta: str,
+    intencion: str = "",
+    tipo_mensaje: Optional[str] = None,
+    entidades: Optional[List[Any]] = None,
+    retriever: Optional[str] = None,
+    top: int = 3,
+) -> List[Dict[str, Any]]:
     """
-    Nodo de LangGraph que:
-    - Lee la intención desde state["nlp"]
-    - Busca en faq.csv las filas más relevantes
-    - Mete el resultado en state["knowledge_hits"]
+    Busca en la FAQ y devuelve los `top` mejores hits (dicts) de mayor a menor
+    score. Es la búsqueda de knowledge_node, reutilizable sin BotState.
     """
-
-    logger.info("Ejecutando knowledge_node...")
-
-    # 1) Cargar FAQ de disco o de caché
-    faq_rows = load_faq()
-    print(f"\nTotal filas cargadas: {len(faq_rows)}\n")
-
-    # 2) Recuperar intención
-    if state.nlp is None:
-        logger.warning("No se encontró NLP en el estado, usando cadena vacía.")
-        intencion = ""
+    retriever = retriever or FAQ_RETRIEVER
+    entidades = entidades or []
+    # Con boost por entidades pedimos más candidatos para poder reordenar
+    k = max(top, FAQ_CANDIDATES) if entidades and FAQ_ENTITY_BOOST else top
+
+    # Sólo la coincidencia fuerte del índice por categoría cuenta como exacta
+    exacta = False
+
+    # Buscar candidatos: en SQLite, o en la partición de la FAQ cargada
+    if retriever == "sqlite":
+        tipo = tipo_mensaje if FAQ_PARTITION_BY_TIPO else None
+        matches = get_faq_store().search(consulta, k=k, tipo=tipo)
     else:
-        intencion = state.nlp.intent.intencion
-        logger.debug("Intención detectada: '{}'", intencion)
-
-    # 3) Calcular hits
+        faq_rows = load_faq()
+        # Log, no print: la salida estándar es del driver (JSONL) y del streaming
+        logger.debug("Total filas cargadas: {}", len(faq_rows))
+        faq_rows = partition_for(faq_rows, tipo_mensaje)
+
+        if retriever == "bm25":
+            ranked = get_bm25_index(faq_rows).search(consulta, k=k)
+        elif retriever == "vector":
+            ranked = get_vector_index(faq_rows).search(
+                consulta, k=k, min_score=VECTOR_MIN_SCORE
+            )
+        else:
+            # Sólo sobre las filas candidatas del índice por categoría
+            ranked = get_faq_index(faq_rows).match(intencion)
+            exacta = True
+            if not ranked and FAQ_FUZZY and intencion:
+                exacta = False
+                # Sin coincidencia exacta: probamos con erratas/plurales/tildes
+                ranked = get_trigram_index(faq_rows).similar(
+                    intencion, k=k, min_similarity=FAQ_FUZZY_MIN_SIMILARITY
+                )
+                logger.debug("Búsqueda aproximada por trigramas: {}", ranked)
+        matches = [(faq_rows[row_id], score) for row_id, score in ranked]
+
+    # Antes del boost: con él, una coincidencia débil puede llegar a 1.0
+    exactos = [exacta and score >= 1.0 for _, score in matches]
+    matches = apply_entity_boost(matches, entidades, FAQ_ENTITY_BOOST)
+
+    # Calcular hits
     hits: List[Dict[str, Any]] = []
 
-    for row in faq_rows:
+    for (row, score), exacto in zip(matches, exactos):
         categoria = row.get("categoria", "")
-        score = simple_match_score(intencion, categoria)
         if score > 0:
             logger.debug("Match: categoria='{}' ,  score={}", categoria, score)
             hits.append(
@@ -108,17 +673,53 @@ def knowledge_node(state: BotState) -> BotState:
                     "pregunta_canonica": row.get("pregunta_canonica", ""),
                     "respuesta_base": row.get("respuesta_base", ""),
                     "score": score,
+                    "exacto": exacto,
+                    "retriever": retriever,
                 }
             )
 
-    # Ordenamos de mayor a menor score y nos quedamos con los 3 mejores
+    # Ordenamos de mayor a menor score y nos quedamos con los mejores
     hits.sort(key=lambda h: h["score"], reverse=True)
-    top_hits = hits[:3]
-    logger.info("Total hits encontrados: {}. Top 3: {}", len(hits), top_hits)
+    top_hits = hits[:top]
+    logger.info("Total hits encontrados: {}. Top {}: {}", len(hits), top, top_hits)
+    return top_hits
+
 
+def message_retriever() -> str:
+    """
+    Recuperador para buscar sólo con el texto del cliente (sin NLP):
+    "categoria" necesita una intención, así que en ese caso se usa BM25.
+    """
+    return "bm25" if FAQ_RETRIEVER == "categoria" else FAQ_RETRIEVER
 
 
-    # 4) Actualizar el estado
+def knowledge_node(state: BotState) -> BotState:
+    """
+    Nodo de LangGraph que:
+    - Lee la intención desde state["nlp"]
+    - Busca en faq.csv las filas más relevantes
+    - Mete el resultado en state["knowledge_hits"]
+    """
+
+    logger.info("Ejecutando knowledge_node...")
+
+    # 1) Recuperar intención, tipo de mensaje y entidades
+    if state.nlp is None:
+        logger.warning("No se encontró NLP en el estado, usando cadena vacía.")
+        intencion = ""
+        tipo_mensaje = None
+        entidades = []
+    else:
+        intencion = state.nlp.intent.intencion
+        tipo_mensaje = state.nlp.intent.tipo_mensaje
+        entidades = state.nlp.entidades
+        logger.debug("Intención detectada: '{}' (tipo: {})", intencion, tipo_mensaje)
+
+    # 2) Buscar en la FAQ con el mensaje del cliente y la intención
+    consulta = f"{state.user_message} {intencion}"
+    top_hits = retrieve_hits(consulta, intencion, tipo_mensaje, entidades)
+
+    # 3) Actualizar el estado
     new_state = state.model_copy()
     new_state.knowledge_hits = top_hits
 
@@ -130,3 +731,32 @@ def knowledge_node(state: BotState) -> BotState:
     logger.info("knowledge_node finalizado correctamente.")
 
     return new_state
+
+
+async def aknowledge_node(state: BotState) -> BotState:
+    """
+    Versión asíncrona de knowledge_node para el grafo async.
+
+    La búsqueda es local (CPU/disco), así que se ejecuta en un hilo para no
+    bloquear el bucle de eventos, sobre todo en la primera carga de la FAQ.
+    """
+    return await asyncio.to_thread(knowledge_node, state)
+
+
+def message_knowledge_node(state: BotState) -> BotState:
+    """
+    Recuperación sobre el mensaje en bruto, antes de tener NLP (modo fused).
+    """
+    logger.info("Ejecutando message_knowledge_node...")
+    top_hits = retrieve_hits(state.user_message, retriever=message_retriever())
+
+    new_state = state.model_copy()
+    new_state.knowledge_hits = top_hits
+    debug = new_state.debug.copy()
+    debug["knowledge_hits"] = top_hits
+    new_state.debug = debug
+    return new_state
+
+
+async def amessage_knowledge_node(state: BotState) -> BotState:
+    return await asyncio.to_thread(message_knowledge_node, state)
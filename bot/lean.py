@@ -0,0 +1,110 @@
+# bot/lean.py
+#
+# Camino ligero del estado del grafo (GRAPH_LEAN_STATE=1).
+#
+# Con BotState como esquema, LangGraph reconstruye y valida el estado entero
+# (BotState(**canales), con el NLP y los hits incluidos) antes de cada nodo,
+# y cada nodo vuelve a escribir todos los campos. Aquí:
+#   - el esquema del grafo es un TypedDict: entre nodos no se valida nada
+#   - cada nodo publica sólo lo que ha cambiado (un delta) y sus claves de
+#     debug nuevas, que un reducer fusiona con las anteriores
+#   - BotState se valida sólo en los bordes: la entrada ya es un BotState
+#     (initial_state) y la salida la valida quien llama al grafo
+#     (BotState.model_validate(dict(final)), como en bot/driver.py)
+#
+# Los nodos no cambian: lean_node adapta cualquier nodo BotState -> BotState.
+
+import inspect
+from typing import Annotated, Any, Callable, Dict, List, Optional, TypedDict
+
+from langchain_core.runnables import RunnableConfig
+
+from bot.models import BotState, NLPResult
+
+_FALTA = object()
+
+
+def merge_debug(actual: Optional[Dict[str, Any]], nuevo: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not actual:
+        return dict(nuevo or {})
+    if not nuevo:
+        return actual
+    return {**actual, **nuevo}
+
+
+class LeanState(TypedDict, total=False):
+    """
+    Mismos campos que BotState, sin validación entre nodos.
+    """
+    user_message: str
+    nlp: Optional[NLPResult]
+    knowledge_hits: List[Any]
+    speculative_hits: List[Any]
+    answer: Optional[Dict[str, Any]]
+    debug: Annotated[dict, merge_debug]
+
+
+def as_bot_state(values: Dict[str, Any]) -> BotState:
+    """
+    BotState sobre los valores del grafo sin validarlos (ya se validaron en
+    la entrada y los nodos sólo escriben objetos que construyen ellos).
+    """
+    return BotState.model_construct(**values)
+
+
+def state_delta(antes: BotState, despues: BotState) -> Dict[str, Any]:
+    """
+    Campos que el nodo ha cambiado (por identidad: model_copy conserva los
+    objetos que no se tocan) y, de debug, sólo las claves nuevas o cambiadas.
+    """
+    previos = antes.__dict__
+    delta = {
+        campo: valor
+        for campo, valor in despues.__dict__.items()
+        if campo != "debug" and previos.get(campo, _FALTA) is not valor
+    }
+    debug_previo = antes.debug or {}
+    # Siempre se escribe debug (aunque vacío): LangGraph exige que cada nodo
+    # escriba al menos un campo y el reducer lo fusiona sin coste
+    delta["debug"] = {k: v for k, v in (despues.debug or {}).items() if debug_previo.get(k, _FALTA) is not v}
+    return delta
+
+
+def _to_delta(antes: BotState, resultado: Any) -> Dict[str, Any]:
+    # Las ramas paralelas (bot/speculative.py) ya devuelven un dict parcial
+    if isinstance(resultado, dict):
+        return resultado
+    return state_delta(antes, resultado)
+
+
+def lean_node(fn: Callable) -> Callable:
+    """
+    Adapta un nodo BotState -> BotState al grafo ligero: recibe los valores
+    del grafo sin validar y devuelve sólo el delta.
+    """
+    pasa_config = "config" in inspect.signature(fn).parameters
+
+    if inspect.iscoroutinefunction(fn):
+        async def _anodo(values: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+            antes = as_bot_state(values)
+            despues = await (fn(antes, config) if pasa_config else fn(antes))
+            return _to_delta(antes, despues)
+
+        return _anodo
+
+    def _nodo(values: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        antes = as_bot_state(values)
+        despues = fn(antes, config) if pasa_config else fn(antes)
+        return _to_delta(antes, despues)
+
+    return _nodo
+
+
+def lean_route(fn: Callable[[BotState], Any]) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Adapta una función de arista condicional que espera un BotState.
+    """
+    def _ruta(values: Dict[str, Any]) -> Any:
+        return fn(as_bot_state(values))
+
+    return _ruta
@@ -0,0 +1,157 @@
+# bot/llm.py
+#
+# Registro de clientes LLM compartidos.
+#
+# En lugar de un ChatOpenAI nuevo por mensaje (cliente HTTP nuevo y handshake
+# TLS cada vez), se crea un único cliente por configuración (modelo,
+# temperatura, ...) sobre un pool de conexiones keep-alive, y lo comparten
+# todos los nodos, hilos y tareas.
+#
+# El pool asíncrono queda ligado al bucle de eventos que lo usa primero, así
+# que hay uno por bucle (como en nlp_batcher): un segundo asyncio.run no
+# reutiliza conexiones de un bucle ya cerrado.
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from loguru import logger
+from langchain_openai import ChatOpenAI
+
+from bot.config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL_NAME,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+)
+
+
+# Clientes creados fuera de un bucle de eventos (nodos síncronos, hilos)
+_REGISTRY: Dict[Tuple[Any, ...], ChatOpenAI] = {}
+_HTTP_CLIENTS: Dict[str, Any] = {}
+_LOCK = threading.Lock()
+
+
+class _LoopClients:
+    """
+    Pool HTTP asíncrono y clientes LLM de un bucle de eventos.
+    """
+
+    def __init__(self, http_async_client: httpx.AsyncClient):
+        self.http_async_client = http_async_client
+        self.registry: Dict[Tuple[Any, ...], ChatOpenAI] = {}
+
+
+_LOOPS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Pools HTTP (síncrono y asíncrono) compartidos por los clientes LLM creados
+    fuera de un bucle de eventos. Se llama con _LOCK tomado.
+    """
+    if not _HTTP_CLIENTS:
+        _HTTP_CLIENTS["sync"] = httpx.Client(limits=_limits())
+        _HTTP_CLIENTS["async"] = httpx.AsyncClient(limits=_limits())
+    return _HTTP_CLIENTS["sync"], _HTTP_CLIENTS["async"]
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def get_llm(model: str = OPENAI_MODEL_NAME, temperature: float = 0, **kwargs: Any) -> ChatOpenAI:
+    """
+    Devuelve el cliente compartido para esta configuración, creándolo la
+    primera vez. Es seguro llamarlo desde varios hilos y tareas async.
+
+    Los kwargs extra (p. ej. streaming=True) forman parte de la clave.
+    Dentro de un bucle de eventos el cliente es el de ese bucle.
+    """
+    key = (model, temperature) + tuple(sorted(kwargs.items()))
+    loop = _running_loop()
+    pool = _LOOPS.get(loop) if loop is not None else None
+    registry = _REGISTRY if loop is None else (pool.registry if pool is not None else {})
+    llm = registry.get(key)
+    if llm is not None:
+        return llm
+
+    with _LOCK:
+        http_client, http_async_client = _http_clients()
+        if loop is not None:
+            pool = _LOOPS.get(loop)
+            if pool is None:
+                # Bucles cerrados sin aclose_llm_clients: sus conexiones ya no sirven
+                for cerrado in [l for l in _LOOPS if l.is_closed()]:
+                    del _LOOPS[cerrado]
+                pool = _LOOPS[loop] = _LoopClients(httpx.AsyncClient(limits=_limits()))
+            registry, http_async_client = pool.registry, pool.http_async_client
+        llm = registry.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                api_key=OPENAI_API_KEY,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs,
+            )
+            registry[key] = llm
+            logger.info("Cliente LLM creado: modelo={}, temperatura={}, {}", model, temperature, kwargs)
+    return llm
+
+
+async def aclose_llm_clients() -> None:
+    """
+    Cierra el pool asíncrono del bucle actual y olvida sus clientes LLM.
+    Se llama al terminar, dentro del mismo bucle (ver bot/driver.py).
+    """
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        pool = _LOOPS.pop(loop, None)
+    if pool is not None:
+        await pool.http_async_client.aclose()
+
+
+def _close_async(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    try:
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        elif loop is not None and not loop.is_closed():
+            loop.run_until_complete(client.aclose())
+        else:
+            asyncio.run(client.aclose())
+    except Exception as e:  # bucle ya cerrado: sus conexiones ya no sirven
+        logger.debug("No se pudo cerrar un pool HTTP asíncrono: {}", e)
+
+
+def close_llm_clients() -> None:
+    """
+    Cierra los pools HTTP y vacía el registro (p. ej. al apagar el proceso).
+    """
+    with _LOCK:
+        sync_client = _HTTP_CLIENTS.pop("sync", None)
+        async_client = _HTTP_CLIENTS.pop("async", None)
+        pools = list(_LOOPS.items())
+        _LOOPS.clear()
+        _REGISTRY.clear()
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        _close_async(async_client, None)
+    for loop, pool in pools:
+        _close_async(pool.http_async_client, loop)
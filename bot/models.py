@@ -38,6 +38,11 @@ class KnowledgeHit(BaseModel):
     pregunta_canonica: str
     respuesta_base: str
     score: float
+    # Coincidencia fuerte del índice por categoría (antes de boosts): el score
+    # de BM25/vector/FTS5 no es comparable con 1.0
+    exacto: bool = False
+    # Recuperador que dio el score (su escala depende de él)
+    retriever: str = ""
 
 
 class AnswerResult(BaseModel):
@@ -60,5 +65,7 @@ class BotState(BaseModel):
     nlp: Optional[NLPResult] = None
     # default_factory también aquí
     knowledge_hits: List[KnowledgeHit] = Field(default_factory=list)
+    # Candidatos de la búsqueda especulativa (GRAPH_MODE=speculative)
+    speculative_hits: List[KnowledgeHit] = Field(default_factory=list)
     answer: Optional[AnswerResult] = None
     debug: Dict[str, Any] = Field(default_factory=dict)
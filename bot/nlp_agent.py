@@ -1,55 +1,195 @@
 import json
-from loguru import logger
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from loguru import logger
+from pydantic import ValidationError
 
 from bot.models import BotState, NLPResult
-from bot.config import OPENAI_MODEL_NAME, OPENAI_API_KEY
-from bot.prompt_store import get_prompt
+from bot.cache import LRUTTLCache, fingerprint, normalize_message
+from bot.config import (
+    OPENAI_MODEL_NAME,
+    NLP_CACHE_ENABLED,
+    NLP_CACHE_MAXSIZE,
+    NLP_CACHE_TTL,
+    NLP_CACHE_DB,
+    NLP_FAST_PATH,
+    NLP_FAST_PATH_THRESHOLD,
+    INTENT_MODEL_PATH,
+    NLP_LOG_PATH,
+    NLP_BATCHING,
+    NLP_CASCADE_MIN_CONFIDENCE,
+)
+from bot.cascade import cascade_models, cascade_signature, record_tier
+from bot.intent_classifier import IntentClassifier, examples_from_rows, log_classification
+from bot.knowledge import load_faq
+from bot.llm import get_llm
+from bot.nlp_batcher import get_nlp_batcher
+from bot.prompt_store import PromptTemplate, compile_template, get_prompt, record_prefix_cache
+from bot.resilience import LLMUnavailableError, client_options, get_caller
 
 # Los nodos de los agentes siempre reciben siempre BotState, que recordemos tiene. Estado global que viaja a través del grafo de LangGraph. user_message, nlp, knowledge_hits, answer, debug
 
 
+# Caché de clasificaciones: muchos mensajes son casi idénticos
+NLP_CACHE: Optional[LRUTTLCache] = None
+_NLP_CACHE_LOCK = threading.Lock()
 
 
+def get_nlp_cache() -> LRUTTLCache:
+    global NLP_CACHE
+    if NLP_CACHE is None:
+        with _NLP_CACHE_LOCK:
+            if NLP_CACHE is None:
+                NLP_CACHE = LRUTTLCache(
+                    maxsize=NLP_CACHE_MAXSIZE,
+                    ttl=NLP_CACHE_TTL,
+                    disk_path=NLP_CACHE_DB or None,
+                    namespace="nlp",
+                )
+    return NLP_CACHE
 
-def nlp_node(bot_state: BotState) -> BotState:
 
-    user_message = bot_state.user_message
+def nlp_template(system_prompt: str) -> PromptTemplate:
+    # Prompt fijo en el mensaje de sistema y el mensaje del cliente tal cual
+    return compile_template("nlp_agent", system_prompt, "", (("", "mensaje"),))
 
 
-    system_prompt = get_prompt("nlp_agent.system")
+def prompt_version(system_prompt: str) -> str:
+    """
+    Versión de la plantilla más los modelos: al cambiar cualquiera, las
+    clasificaciones antiguas dejan de servirse.
+    """
+    return fingerprint(cascade_signature("nlp"), nlp_template(system_prompt).version)
+
+
+def nlp_cache_key(user_message: str, system_prompt: str) -> str:
+    return f"{prompt_version(system_prompt)}:{normalize_message(user_message)}"
+
+
+
+# Clasificador local (fast path) y cuántas veces se ha evitado el LLM
+INTENT_CLASSIFIER: Optional[IntentClassifier] = None
+_CLASSIFIER_LOCK = threading.Lock()
+FAST_PATH_STATS: Dict[str, int] = {"fast": 0, "llm": 0}
+_STATS_LOCK = threading.Lock()
+
+# Mensajes con posibles datos personales (nº de pedido, email): sus entidades
+# sólo las extrae el LLM, así que nunca van por el fast path
+_ENTIDAD_PROBABLE = re.compile(r"\d{4,}|@")
+
+# Quejas y enfado: el clasificador local sólo sabe la intención (entrenado
+# con la FAQ, su sentimiento es siempre "neutral" y su tipo el de la fila),
+# así que estos mensajes los clasifica el LLM. Se buscan sobre
+# normalize_message (minúsculas, sin tildes ni signos).
+_QUEJA_PROBABLE = re.compile(
+    r"\b(fatal|horrible|pesim|penos|verguenza|vergonzos|desastre|estafa|timo|"
+    r"inaceptable|indignad|enfadad|cabread|harto|harta|hartos|queja|quejar|"
+    r"reclam|denuncia|mal servicio|peor|nunca mas|basura|ridicul|incompetent)"
+)
+
+
+def complaint_cues(user_message: str) -> bool:
+    """
+    True si el mensaje suena a queja o enfado (palabras clave o "!!").
+    """
+    return "!!" in user_message or bool(_QUEJA_PROBABLE.search(normalize_message(user_message)))
+
+
+def get_intent_classifier() -> IntentClassifier:
+    global INTENT_CLASSIFIER
+    if INTENT_CLASSIFIER is None:
+        with _CLASSIFIER_LOCK:
+            if INTENT_CLASSIFIER is None:
+                if os.path.exists(INTENT_MODEL_PATH):
+                    INTENT_CLASSIFIER = IntentClassifier.load(INTENT_MODEL_PATH)
+                    logger.info("Clasificador de intención cargado de {}", INTENT_MODEL_PATH)
+                else:
+                    INTENT_CLASSIFIER = IntentClassifier.train(examples_from_rows(load_faq()))
+                    logger.info("Clasificador de intención entrenado con la FAQ")
+    return INTENT_CLASSIFIER
+
+
+def fast_path_stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        stats = dict(FAST_PATH_STATS)
+    total = stats["fast"] + stats["llm"]
+    return {**stats, "rate": stats["fast"] / total if total else 0.0}
+
+
+def _fast_path(bot_state: BotState) -> Optional[BotState]:
+    """
+    Estado clasificado localmente si el clasificador supera el umbral;
+    si no, None y se sigue con el LLM.
+    """
+    if not NLP_FAST_PATH:
+        return None
+
+    intent = None
+    mensaje = bot_state.user_message
+    if not _ENTIDAD_PROBABLE.search(mensaje) and not complaint_cues(mensaje):
+        intent = get_intent_classifier().predict(mensaje)
+
+    if intent is None or intent.confianza < NLP_FAST_PATH_THRESHOLD:
+        with _STATS_LOCK:
+            FAST_PATH_STATS["llm"] += 1
+        return None
 
-    # Creamos el LLM de LangChain (ChatOpenAI)
+    with _STATS_LOCK:
+        FAST_PATH_STATS["fast"] += 1
+    logger.info("Intención clasificada localmente ({}, {:.2f})", intent.intencion, intent.confianza)
+    new_state = bot_state.model_copy()
+    new_state.nlp = NLPResult(intent=intent, entidades=[])
+    debug = new_state.debug.copy()
+    debug["nlp_raw"] = new_state.nlp.model_dump_json()
+    debug["nlp_fast_path"] = True
+    new_state.debug = debug
+    return new_state
+
+
+def _from_cache(bot_state: BotState, cache_key: Optional[str]) -> Optional[BotState]:
+    """
+    Estado con la clasificación cacheada, o None si no hay entrada.
+    """
+    if cache_key is None:
+        return None
+    cached = get_nlp_cache().get(cache_key)
+    if cached is None:
+        return None
+
+    logger.info("Clasificación NLP servida desde caché.")
+    new_state = bot_state.model_copy()
+    new_state.nlp = NLPResult(**cached["nlp"])
+    debug = new_state.debug.copy()
+    debug["nlp_raw"] = cached["raw"]
+    debug["nlp_cache"] = "hit"
+    new_state.debug = debug
+    return new_state
+
+
+def _get_client(modelo: str = OPENAI_MODEL_NAME):
+    # Cliente LLM compartido (se crea una vez y reutiliza sus conexiones)
     try:
-        llm = ChatOpenAI(
-            model=OPENAI_MODEL_NAME,
-            temperature=0,
-            api_key=OPENAI_API_KEY,
-        )
-        logger.info("Conexión con OpenAI inicializada correctamente. Modelo: {}", OPENAI_MODEL_NAME)
+        llm = get_llm(model=modelo, temperature=0, **client_options("nlp"))
+        logger.info("Conexión con OpenAI inicializada correctamente. Modelo: {}", modelo)
     except Exception as e:
         logger.error("Error al inicializar la conexión con OpenAI: {}", e)
         raise
+    return llm
 
-    # Realizamos la llamada al modelo
-    try:
-        response = llm.invoke(
-            [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_message),
-            ]
-        )
-        raw = response.content
-        logger.info("Petición a OpenAI realizada correctamente. Respuesta recibida.")
-    except Exception as e:
-        logger.error("Error al invocar el modelo OpenAI: {}", e)
-        raise
 
+def _with_nlp(bot_state: BotState, raw: str, cache_key: Optional[str]) -> BotState:
+    """
+    Interpreta la respuesta del modelo y devuelve el nuevo estado.
+    """
     try:
         data = json.loads(raw)
+        parsed = True
     except json.JSONDecodeError:
+        parsed = False
         data = {
             "intent": {
                 "tipo_mensaje": "otro",
@@ -70,10 +210,144 @@ def nlp_node(bot_state: BotState) -> BotState:
     # Guardar NLPResult
     new_state.nlp = NLPResult(**data)
 
+    # Sólo se cachean (y registran) clasificaciones válidas, nunca el valor por defecto
+    if cache_key is not None and parsed:
+        get_nlp_cache().set(cache_key, {"nlp": new_state.nlp.model_dump(), "raw": raw})
+    if NLP_LOG_PATH and parsed:
+        log_classification(NLP_LOG_PATH, bot_state.user_message, raw)
+
     # Actualizar debug
     debug = new_state.debug.copy()
     debug["nlp_raw"] = raw
+    if cache_key is not None:
+        debug["nlp_cache"] = "miss"
     new_state.debug = debug
 
     return new_state
 
+
+def needs_escalation(raw: str) -> bool:
+    """
+    La clasificación de un modelo pequeño no vale si no es un NLPResult
+    válido o su confianza no llega a NLP_CASCADE_MIN_CONFIDENCE.
+    """
+    try:
+        nlp = NLPResult.model_validate_json(raw)
+    except ValidationError:
+        return True
+    return nlp.intent.confianza < NLP_CASCADE_MIN_CONFIDENCE
+
+
+def _with_tiers(new_state: BotState, registros: List[Dict[str, Any]]) -> BotState:
+    new_state.debug["nlp_model"] = registros[-1]["modelo"]
+    new_state.debug["nlp_tiers"] = registros
+    return new_state
+
+
+def _classify(plantilla: PromptTemplate, messages: list) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Clasifica recorriendo la cascada de modelos del nodo (bot/cascade.py).
+    """
+    modelos = cascade_models("nlp")
+    registros: List[Dict[str, Any]] = []
+    for nivel, modelo in enumerate(modelos):
+        llm = _get_client(modelo)
+        t0 = time.perf_counter()
+        response = get_caller("nlp").call(lambda: llm.invoke(messages))
+        registros.append(record_tier("nlp", nivel, modelo, (time.perf_counter() - t0) * 1000, response))
+        record_prefix_cache(plantilla, response)
+        if nivel + 1 == len(modelos) or not needs_escalation(response.content):
+            break
+    return response.content, registros
+
+
+async def _aclassify(plantilla: PromptTemplate, messages: list) -> Tuple[str, List[Dict[str, Any]]]:
+    modelos = cascade_models("nlp")
+    registros: List[Dict[str, Any]] = []
+    for nivel, modelo in enumerate(modelos):
+        llm = _get_client(modelo)
+        t0 = time.perf_counter()
+        response = await get_caller("nlp").acall(lambda: llm.ainvoke(messages))
+        registros.append(record_tier("nlp", nivel, modelo, (time.perf_counter() - t0) * 1000, response))
+        record_prefix_cache(plantilla, response)
+        if nivel + 1 == len(modelos) or not needs_escalation(response.content):
+            break
+    return response.content, registros
+
+
+def _degraded(bot_state: BotState, error: LLMUnavailableError) -> BotState:
+    """
+    Sin LLM disponible: intención por defecto (la respuesta acabará derivada
+    a un humano) en lugar de dejar la conversación esperando o fallar.
+    """
+    logger.error("NLP degradado: {}", error)
+    new_state = _with_nlp(bot_state, "", None)
+    new_state.debug["nlp_degraded"] = str(error)
+    return new_state
+
+
+def nlp_node(bot_state: BotState) -> BotState:
+
+    user_message = bot_state.user_message
+
+
+    system_prompt = get_prompt("nlp_agent.system")
+
+    cache_key = nlp_cache_key(user_message, system_prompt) if NLP_CACHE_ENABLED else None
+    cached = _from_cache(bot_state, cache_key)
+    if cached is not None:
+        return cached
+
+    rapido = _fast_path(bot_state)
+    if rapido is not None:
+        return rapido
+
+    # Realizamos la llamada al modelo
+    try:
+        plantilla = nlp_template(system_prompt)
+        raw, registros = _classify(plantilla, plantilla.messages(mensaje=user_message))
+        logger.info("Petición a OpenAI realizada correctamente. Respuesta recibida.")
+    except LLMUnavailableError as e:
+        return _degraded(bot_state, e)
+    except Exception as e:
+        logger.error("Error al invocar el modelo OpenAI: {}", e)
+        raise
+
+    return _with_tiers(_with_nlp(bot_state, raw, cache_key), registros)
+
+
+async def anlp_node(bot_state: BotState) -> BotState:
+    """
+    Versión asíncrona de nlp_node (usa ainvoke): mientras espera a OpenAI,
+    el bucle de eventos atiende otras conversaciones. Con NLP_BATCHING las
+    clasificaciones concurrentes se agrupan (ver bot/nlp_batcher.py).
+    """
+    user_message = bot_state.user_message
+    system_prompt = get_prompt("nlp_agent.system")
+
+    cache_key = nlp_cache_key(user_message, system_prompt) if NLP_CACHE_ENABLED else None
+    cached = _from_cache(bot_state, cache_key)
+    if cached is not None:
+        return cached
+
+    rapido = _fast_path(bot_state)
+    if rapido is not None:
+        return rapido
+
+    registros: List[Dict[str, Any]] = []
+    try:
+        if NLP_BATCHING:
+            # Se agrupa con otras conversaciones en vuelo (una sola petición)
+            raw = await get_nlp_batcher().classify(user_message)
+        else:
+            plantilla = nlp_template(system_prompt)
+            raw, registros = await _aclassify(plantilla, plantilla.messages(mensaje=user_message))
+        logger.info("Petición a OpenAI realizada correctamente. Respuesta recibida.")
+    except LLMUnavailableError as e:
+        return _degraded(bot_state, e)
+    except Exception as e:
+        logger.error("Error al invocar el modelo OpenAI: {}", e)
+        raise
+
+    new_state = _with_nlp(bot_state, raw, cache_key)
+    return _with_tiers(new_state, registros) if registros else new_state
@@ -0,0 +1,191 @@
+# bot/nlp_batcher.py
+#
+# Micro-batching de clasificaciones NLP para el grafo async: los mensajes que
+# llegan en una ventana de NLP_BATCH_MAX_WAIT_MS (o hasta NLP_BATCH_MAX_ITEMS)
+# se clasifican en una sola petición al LLM que devuelve un array JSON.
+#
+# Las llamadas pasan por la misma capa resiliente que nlp_node
+# (bot/resilience.py), con un deadline que crece con el tamaño del lote. Si el
+# lote falla o se pasa de plazo, sus mensajes se clasifican uno a uno; sólo
+# con el circuit breaker abierto degradan todas las conversaciones a la vez.
+
+import asyncio
+import json
+import weakref
+from typing import List, Dict, Optional, Tuple
+
+from loguru import logger
+from pydantic import ValidationError
+
+from bot.config import OPENAI_MODEL_NAME, NLP_BATCH_MAX_ITEMS, NLP_BATCH_MAX_WAIT_MS
+from bot.llm import get_llm
+from bot.models import NLPResult
+from bot.prompt_store import PromptTemplate, compile_template, get_prompt, record_prefix_cache
+from bot.resilience import CircuitOpenError, batch_deadline, client_options, get_caller
+
+
+BATCH_INSTRUCTIONS = """
+
+MODO LOTE:
+Recibirás un array JSON de mensajes de clientes, cada uno con su "id".
+Devuelve SOLO un array JSON con un objeto por mensaje, en el mismo orden,
+con el mismo formato que usarías para un único mensaje y además su "id".
+"""
+
+
+def batch_template(system_prompt: str) -> PromptTemplate:
+    return compile_template("nlp_batch", system_prompt, BATCH_INSTRUCTIONS, (("", "mensajes"),))
+
+
+class NLPBatcher:
+    """
+    Agrupa clasificaciones concurrentes en una única llamada al LLM y reparte
+    cada resultado (JSON crudo, como el de una llamada individual) a quien lo
+    esperaba.
+
+    Si la respuesta del lote no es un array válido, o falta/está mal algún
+    elemento, esos mensajes se clasifican uno a uno.
+
+    Vive en un único bucle de eventos (ver get_nlp_batcher).
+    """
+
+    def __init__(self, max_items: int = NLP_BATCH_MAX_ITEMS, max_wait_ms: float = NLP_BATCH_MAX_WAIT_MS):
+        self.max_items = max_items
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.stats: Dict[str, int] = {"batches": 0, "items": 0, "fallbacks": 0, "degraded": 0}
+
+    async def classify(self, user_message: str) -> str:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((user_message, fut))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lote, self._pending = self._pending, []
+        if lote:
+            task = asyncio.ensure_future(self._run(lote))
+            # Referencia fuerte hasta que termine (si no, el GC puede cancelarla)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, lote: List[Tuple[str, asyncio.Future]]) -> None:
+        self.stats["batches"] += 1
+        self.stats["items"] += len(lote)
+        system_prompt = get_prompt("nlp_agent.system")
+        mensajes = [m for m, _ in lote]
+
+        try:
+            resultados = await self._classify_batch(system_prompt, mensajes)
+        except CircuitOpenError as e:
+            # Proveedor caído: no tiene sentido reintentar uno a uno
+            logger.warning("LLM no disponible para el lote ({} mensajes): {}", len(lote), e)
+            self.stats["degraded"] += len(lote)
+            for _, fut in lote:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except Exception as e:
+            logger.warning("Falló la clasificación por lotes ({} mensajes): {}", len(lote), e)
+            resultados = [None] * len(lote)
+
+        pendientes = []
+        for (mensaje, fut), raw in zip(lote, resultados):
+            if raw is not None:
+                if not fut.done():
+                    fut.set_result(raw)
+            else:
+                pendientes.append(self._fallback(system_prompt, mensaje, fut))
+        if pendientes:
+            self.stats["fallbacks"] += len(pendientes)
+            await asyncio.gather(*pendientes)
+
+    async def _classify_batch(self, system_prompt: str, mensajes: List[str]) -> List[Optional[str]]:
+        if len(mensajes) == 1:
+            # Un lote de uno es una llamada normal
+            return [None]
+
+        # Un único cliente para todos los lotes: su timeout es el del lote más grande
+        llm = get_llm(
+            model=OPENAI_MODEL_NAME, temperature=0, **client_options("nlp", batch_deadline(self.max_items))
+        )
+        payload = json.dumps(
+            [{"id": i, "mensaje": m} for i, m in enumerate(mensajes)], ensure_ascii=False
+        )
+        plantilla = batch_template(system_prompt)
+        messages = plantilla.messages(mensajes=payload)
+        response = await get_caller("nlp").acall(
+            lambda: llm.ainvoke(messages), deadline=batch_deadline(len(mensajes))
+        )
+        record_prefix_cache(plantilla, response)
+        return parse_batch_response(response.content, len(mensajes))
+
+    async def _fallback(self, system_prompt: str, mensaje: str, fut: asyncio.Future) -> None:
+        try:
+            llm = get_llm(model=OPENAI_MODEL_NAME, temperature=0, **client_options("nlp"))
+            # Misma plantilla que nlp_node (compile_template devuelve la misma instancia)
+            plantilla = compile_template("nlp_agent", system_prompt, "", (("", "mensaje"),))
+            messages = plantilla.messages(mensaje=mensaje)
+            response = await get_caller("nlp").acall(lambda: llm.ainvoke(messages))
+            record_prefix_cache(plantilla, response)
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if not fut.done():
+            fut.set_result(response.content)
+
+
+def parse_batch_response(raw: str, n: int) -> List[Optional[str]]:
+    """
+    Separa la respuesta del lote en n JSON individuales. Los elementos que
+    faltan o no son un NLPResult válido quedan a None (se reintentan solos).
+    Los elementos se colocan por su "id" si lo traen, si no por posición.
+    """
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return [None] * n
+    if isinstance(data, dict) and len(data) == 1:
+        # Algunos modelos envuelven el array: {"resultados": [...]}
+        data = next(iter(data.values()))
+    if not isinstance(data, list):
+        return [None] * n
+
+    resultados: List[Optional[str]] = [None] * n
+    for pos, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        idx = item.pop("id", pos)
+        if not isinstance(idx, int) or not 0 <= idx < n:
+            continue
+        try:
+            NLPResult.model_validate(item)
+        except ValidationError:
+            continue
+        resultados[idx] = json.dumps(item, ensure_ascii=False)
+    return resultados
+
+
+_BATCHERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, NLPBatcher]" = weakref.WeakKeyDictionary()
+
+
+def get_nlp_batcher() -> NLPBatcher:
+    """
+    Batcher del bucle de eventos actual (los futures no se pueden compartir
+    entre bucles).
+    """
+    loop = asyncio.get_running_loop()
+    batcher = _BATCHERS.get(loop)
+    if batcher is None:
+        batcher = _BATCHERS[loop] = NLPBatcher()
+    return batcher
@@ -1,7 +1,13 @@
 # bot/prompt_store.py
+import hashlib
 import json
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 
 from bot.config import PROMPTS_DB_PATH
 
@@ -32,3 +38,106 @@ def get_prompt(key: str) -> str:
         raise KeyError(
             f"No existe un prompt con clave '{key}' en {PROMPTS_DB_PATH}"
         )
+
+
+# ----------------------------------------------------------------------
+# Plantillas precompiladas
+# ----------------------------------------------------------------------
+#
+# Todo el texto fijo (prompt de sistema + instrucciones) va primero, en el
+# mensaje de sistema, y los campos variables al final, en el mensaje del
+# usuario. Así todas las peticiones de una plantilla comparten el mismo
+# prefijo largo y el proveedor puede reutilizarlo (prompt caching).
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    Plantilla compilada: texto fijo ya concatenado, formato de los campos
+    variables y `version` (hash del texto fijo y los campos) para usar en
+    claves de caché.
+    """
+    nombre: str
+    system: str
+    campos: Tuple[Tuple[str, str], ...]
+    version: str
+    formato: str
+
+    def render(self, **valores: Any) -> str:
+        """
+        Mensaje de usuario con los campos variables. Los valores se insertan
+        tal cual (las llaves que contengan no se interpretan).
+        """
+        return self.formato.format(**{campo: valores[campo] for _, campo in self.campos})
+
+    def messages(self, **valores: Any) -> List[BaseMessage]:
+        return [SystemMessage(content=self.system), HumanMessage(content=self.render(**valores))]
+
+
+@lru_cache(maxsize=64)
+def compile_template(
+    nombre: str,
+    system: str,
+    instrucciones: str = "",
+    campos: Tuple[Tuple[str, str], ...] = (),
+) -> PromptTemplate:
+    """
+    Compila (una vez por texto de sistema) una plantilla.
+
+    `campos` son pares (título, nombre) en el orden en que irán al final del
+    prompt: primero los que más se repiten entre peticiones. Con título vacío
+    el campo se inserta sin encabezado.
+    """
+    fijo = system + instrucciones
+    bloques = []
+    for titulo, campo in campos:
+        bloques.append(f"{titulo}:\n{{{campo}}}" if titulo else f"{{{campo}}}")
+    formato = "\n\n".join(bloques)
+    version = hashlib.sha256(f"{nombre}\x1f{fijo}\x1f{formato}".encode("utf-8")).hexdigest()[:12]
+    return PromptTemplate(nombre=nombre, system=fijo, campos=campos, version=version, formato=formato)
+
+
+# ----------------------------------------------------------------------
+# Estadísticas de prefix caching
+# ----------------------------------------------------------------------
+
+PREFIX_CACHE_STATS: Dict[str, Dict[str, int]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _cached_tokens(response: Any) -> Tuple[int, int]:
+    """
+    (prompt_tokens, cached_tokens) de los metadatos de una respuesta de
+    OpenAI; (0, 0) si no vienen (p. ej. modelos o fakes sin usage).
+    """
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    detalles = usage.get("prompt_tokens_details") or {}
+    return int(usage.get("prompt_tokens") or 0), int(detalles.get("cached_tokens") or 0)
+
+
+def record_prefix_cache(plantilla: PromptTemplate, response: Any) -> None:
+    prompt_tokens, cached = _cached_tokens(response)
+    if not prompt_tokens:
+        return
+    with _STATS_LOCK:
+        stats = PREFIX_CACHE_STATS.setdefault(
+            plantilla.nombre, {"calls": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+        stats["calls"] += 1
+        stats["cache_hits"] += 1 if cached else 0
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached
+
+
+def prefix_cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Por plantilla: llamadas, llamadas con prefijo cacheado y fracción de
+    tokens de entrada servidos desde la caché del proveedor.
+    """
+    with _STATS_LOCK:
+        return {
+            nombre: {
+                **stats,
+                "cached_ratio": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+            }
+            for nombre, stats in PREFIX_CACHE_STATS.items()
+        }
@@ -0,0 +1,443 @@
+# bot/resilience.py
+#
+# Capa de llamadas resiliente al LLM, compartida por los nodos:
+#   - plazo máximo (deadline) por nodo, sumando reintentos
+#   - reintentos con backoff exponencial y jitter sólo ante errores transitorios
+#   - hedging opcional: si una llamada tarda más que el p95 observado, se lanza
+#     una segunda y se usa la primera que termine
+#   - circuit breaker: con el proveedor caído se falla al instante y los nodos
+#     devuelven una respuesta degradada en lugar de esperar
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+from loguru import logger
+
+from bot.config import (
+    LLM_DEADLINE_NLP,
+    LLM_DEADLINE_ANSWER,
+    LLM_DEADLINE_NLP_BATCH_ITEM,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE,
+    LLM_RETRY_MAX,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET,
+)
+
+T = TypeVar("T")
+
+
+class LLMUnavailableError(RuntimeError):
+    """
+    El LLM no ha respondido a tiempo o está caído: el nodo debe degradar.
+    """
+
+
+class DeadlineExceeded(LLMUnavailableError, TimeoutError):
+    pass
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Errores transitorios: timeouts, fallos de red, 429 y 5xx. Un 400 o un 401
+    no se arreglan reintentando.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    try:
+        import openai
+    except ImportError:  # pragma: no cover - openai viene con langchain_openai
+        openai = None
+    if openai is not None and isinstance(
+        exc, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+    ):
+        return True
+    return getattr(exc, "status_code", None) in _RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """
+    Se abre tras `failure_threshold` fallos transitorios seguidos. Abierto,
+    rechaza las llamadas durante `reset_timeout` segundos; después (half-open)
+    deja pasar una única llamada de prueba y rechaza las demás mientras está
+    en vuelo: un éxito lo cierra y un fallo lo reabre. Así un proveedor que se
+    recupera no recibe toda la carga de golpe.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def acquire(self) -> Optional[str]:
+        """
+        Permiso para llamar: "closed", "probe" (la llamada de prueba en
+        half-open, que debe terminar con record_* o end_probe) o None.
+        """
+        with self._lock:
+            estado = self.state
+            if estado == "closed":
+                return "closed"
+            if estado == "open" or self._probing:
+                return None
+            self._probing = True
+            return "probe"
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def end_probe(self) -> None:
+        """
+        Libera la prueba sin veredicto (error no transitorio, cancelación).
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Circuit breaker abierto tras {} fallos", self._failures)
+                self._opened_at = self.clock()
+
+
+class LatencyTracker:
+    """
+    Latencias de las últimas llamadas correctas (ventana deslizante).
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, segundos: float) -> None:
+        with self._lock:
+            self._samples.append(segundos)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            muestras = sorted(self._samples)
+        if not muestras:
+            return None
+        return muestras[max(0, math.ceil(p * len(muestras)) - 1)]
+
+
+# Hilos para las llamadas síncronas (permiten abandonar una llamada lenta)
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+
+class ResilientCaller:
+    """
+    Ejecuta una llamada al LLM con deadline, reintentos, hedging y breaker.
+
+    `fn` es una función sin argumentos (o una corrutina en acall) que hace la
+    llamada; así la capa sirve igual para invoke, ainvoke o stream.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        deadline: float,
+        max_retries: int = 2,
+        retry_base: float = 0.25,
+        retry_max: float = 2.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        asleep=asyncio.sleep,
+        rng: Optional[random.Random] = None,
+    ):
+        self.nombre = nombre
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.clock = clock
+        self.sleep = sleep
+        self.asleep = asleep
+        self.rng = rng or random.Random()
+        self.latencias = LatencyTracker()
+        self.stats: Dict[str, int] = {"calls": 0, "retries": 0, "hedges": 0, "failures": 0, "rejected": 0}
+
+    # ------------------------------------------------------------------
+    # Piezas comunes
+    # ------------------------------------------------------------------
+
+    def _backoff(self, intento: int) -> float:
+        # "Full jitter": evita que todos los clientes reintenten a la vez
+        return self.rng.uniform(0, min(self.retry_max, self.retry_base * 2 ** intento))
+
+    def _hedge_delay(self, hedge: Optional[bool]) -> Optional[float]:
+        if not (self.hedge if hedge is None else hedge):
+            return None
+        if len(self.latencias) < self.hedge_min_samples:
+            return None
+        return self.latencias.percentile(0.95)
+
+    def _check_breaker(self) -> bool:
+        """
+        Lanza CircuitOpenError si el breaker rechaza la llamada; True si
+        esta llamada es la prueba de half-open.
+        """
+        permiso = self.breaker.acquire()
+        if permiso is None:
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.nombre}: proveedor LLM no disponible (circuit breaker abierto)")
+        return permiso == "probe"
+
+    def _on_error(self, exc: BaseException) -> None:
+        if not is_retryable(exc):
+            raise exc
+        self.breaker.record_failure()
+        logger.warning("Llamada LLM '{}' fallida: {!r}", self.nombre, exc)
+
+    def _give_up(self, ultimo: Optional[BaseException]) -> LLMUnavailableError:
+        self.stats["failures"] += 1
+        if isinstance(ultimo, LLMUnavailableError):
+            return ultimo
+        return LLMUnavailableError(f"{self.nombre}: sin respuesta del LLM tras reintentos ({ultimo!r})")
+
+    # ------------------------------------------------------------------
+    # Síncrono
+    # ------------------------------------------------------------------
+
+    def call(
+        self, fn: Callable[[], T], hedge: Optional[bool] = None, retry: bool = True, deadline: Optional[float] = None
+    ) -> T:
+        self.stats["calls"] += 1
+        fin = self.clock() + (self.deadline if deadline is None else deadline)
+        intentos = self.max_retries + 1 if retry else 1
+        ultimo: Optional[BaseException] = None
+
+        for intento in range(intentos):
+            sonda = self._check_breaker()
+            restante = fin - self.clock()
+            if restante <= 0:
+                if sonda:
+                    self.breaker.end_probe()
+                break
+            t0 = self.clock()
+            try:
+                result = self._attempt(fn, restante, self._hedge_delay(hedge))
+                self.breaker.record_success()
+            except Exception as e:
+                self._on_error(e)
+                ultimo = e
+                if intento + 1 < intentos:
+                    espera = self._backoff(intento)
+                    if self.clock() + espera >= fin:
+                        break
+                    self.stats["retries"] += 1
+                    self.sleep(espera)
+                continue
+            finally:
+                # La prueba de half-open no debe quedarse tomada (error no
+                # transitorio, cancelación); record_* ya la ha liberado
+                if sonda:
+                    self.breaker.end_probe()
+            self.latencias.add(self.clock() - t0)
+            return result
+
+        raise self._give_up(ultimo) from ultimo
+
+    def _attempt(self, fn: Callable[[], T], restante: float, hedge_delay: Optional[float]) -> T:
+        first = _EXECUTOR.submit(fn)
+        if hedge_delay is None or hedge_delay >= restante:
+            try:
+                return first.result(timeout=restante)
+            except FutureTimeout:
+                if first.done():
+                    raise  # la propia llamada lanzó un TimeoutError
+                raise DeadlineExceeded(f"{self.nombre}: deadline de {self.deadline}s superado")
+
+        fin = self.clock() + restante
+        done, _ = wait([first], timeout=hedge_delay)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        logger.info("Llamada LLM '{}' lenta (> p95 {:.2f}s): se lanza una segunda", self.nombre, hedge_delay)
+        pendientes = {first, _EXECUTOR.submit(fn)}
+        error: Optional[BaseException] = None
+        while pendientes:
+            done, pendientes = wait(pendientes, timeout=max(0.0, fin - self.clock()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{self.nombre}: deadline de {self.deadline}s superado")
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                error = f.exception()
+        raise error
+
+    # ------------------------------------------------------------------
+    # Asíncrono
+    # ------------------------------------------------------------------
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        hedge: Optional[bool] = None,
+        retry: bool = True,
+        deadline: Optional[float] = None,
+    ) -> T:
+        self.stats["calls"] += 1
+        fin = self.clock() + (self.deadline if deadline is None else deadline)
+        intentos = self.max_retries + 1 if retry else 1
+        ultimo: Optional[BaseException] = None
+
+        for intento in range(intentos):
+            sonda = self._check_breaker()
+            restante = fin - self.clock()
+            if restante <= 0:
+                if sonda:
+                    self.breaker.end_probe()
+                break
+            t0 = self.clock()
+            try:
+                result = await self._aattempt(fn, restante, self._hedge_delay(hedge))
+                self.breaker.record_success()
+            except Exception as e:
+                self._on_error(e)
+                ultimo = e
+                if intento + 1 < intentos:
+                    espera = self._backoff(intento)
+                    if self.clock() + espera >= fin:
+                        break
+                    self.stats["retries"] += 1
+                    await self.asleep(espera)
+                continue
+            finally:
+                # La prueba de half-open no debe quedarse tomada (error no
+                # transitorio, cancelación); record_* ya la ha liberado
+                if sonda:
+                    self.breaker.end_probe()
+            self.latencias.add(self.clock() - t0)
+            return result
+
+        raise self._give_up(ultimo) from ultimo
+
+    async def _aattempt(self, fn: Callable[[], Awaitable[T]], restante: float, hedge_delay: Optional[float]) -> T:
+        fin = self.clock() + restante
+        tareas = {asyncio.ensure_future(fn())}
+        try:
+            if hedge_delay is not None and hedge_delay < restante:
+                done, _ = await asyncio.wait(tareas, timeout=hedge_delay)
+                if not done:
+                    self.stats["hedges"] += 1
+                    logger.info("Llamada LLM '{}' lenta (> p95 {:.2f}s): se lanza una segunda", self.nombre, hedge_delay)
+                    tareas.add(asyncio.ensure_future(fn()))
+
+            error: Optional[BaseException] = None
+            pendientes = set(tareas)
+            while pendientes:
+                done, pendientes = await asyncio.wait(
+                    pendientes, timeout=max(0.0, fin - self.clock()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded(f"{self.nombre}: deadline de {self.deadline}s superado")
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            # La(s) perdedora(s) se cancelan para liberar la conexión
+            for t in tareas:
+                if not t.done():
+                    t.cancel()
+
+
+# ----------------------------------------------------------------------
+# Instancias compartidas por nodo
+# ----------------------------------------------------------------------
+
+# Un único breaker: todos los nodos hablan con el mismo proveedor
+BREAKER = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+
+_DEADLINES = {
+    "nlp": LLM_DEADLINE_NLP,
+    "answer": LLM_DEADLINE_ANSWER,
+    "fused": LLM_DEADLINE_ANSWER,
+}
+_CALLERS: Dict[str, ResilientCaller] = {}
+_CALLERS_LOCK = threading.Lock()
+
+
+def get_caller(nombre: str) -> ResilientCaller:
+    caller = _CALLERS.get(nombre)
+    if caller is None:
+        with _CALLERS_LOCK:
+            caller = _CALLERS.get(nombre)
+            if caller is None:
+                caller = _CALLERS[nombre] = ResilientCaller(
+                    nombre,
+                    deadline=_DEADLINES.get(nombre, LLM_DEADLINE_ANSWER),
+                    max_retries=LLM_MAX_RETRIES,
+                    retry_base=LLM_RETRY_BASE,
+                    retry_max=LLM_RETRY_MAX,
+                    hedge=LLM_HEDGE,
+                    hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                    breaker=BREAKER,
+                )
+    return caller
+
+
+def batch_deadline(n: int) -> float:
+    """
+    Deadline de un lote de n mensajes de NLP: el de un mensaje más
+    LLM_DEADLINE_NLP_BATCH_ITEM por cada mensaje adicional.
+    """
+    return LLM_DEADLINE_NLP + LLM_DEADLINE_NLP_BATCH_ITEM * max(0, n - 1)
+
+
+def client_options(nombre: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    kwargs de get_llm para usar con esta capa: los reintentos los hace
+    ResilientCaller (no el SDK) y el timeout HTTP no pasa del deadline.
+    """
+    return {"max_retries": 0, "timeout": deadline or _DEADLINES.get(nombre, LLM_DEADLINE_ANSWER)}
@@ -0,0 +1,115 @@
+# bot/speculative.py
+#
+# Modo "speculative" (GRAPH_MODE=speculative): la búsqueda en la FAQ con el
+# mensaje en bruto arranca a la vez que la llamada NLP, así que deja de estar
+# en el camino crítico. Cuando llega la intención, los candidatos ya
+# recuperados se reordenan en lugar de volver a buscar.
+#
+# Las dos ramas se ejecutan en el mismo paso del grafo y LangGraph no admite
+# dos escrituras del mismo campo en un paso: por eso devuelven sólo los campos
+# que cambian (un dict), no el BotState entero.
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from bot.config import FAQ_CANDIDATES, FAQ_ENTITY_BOOST, FAQ_RETRIEVER, SPECULATIVE_INTENT_BOOST
+from bot.knowledge import apply_entity_boost, message_retriever, retrieve_hits, simple_match_score
+from bot.models import BotState, NLPResult
+from bot.nlp_agent import anlp_node, nlp_node
+
+
+def _as_dict(hit: Any) -> Dict[str, Any]:
+    return hit if isinstance(hit, dict) else hit.model_dump()
+
+
+def speculative_retrieval_node(state: BotState) -> Dict[str, Any]:
+    """
+    Candidatos de la FAQ buscando sólo con el mensaje (sin esperar al NLP).
+    Se piden FAQ_CANDIDATES para tener margen al reordenar.
+    """
+    logger.info("Ejecutando speculative_retrieval_node...")
+    hits = retrieve_hits(state.user_message, retriever=message_retriever(), top=FAQ_CANDIDATES)
+    return {"speculative_hits": hits}
+
+
+async def aspeculative_retrieval_node(state: BotState) -> Dict[str, Any]:
+    return await asyncio.to_thread(speculative_retrieval_node, state)
+
+
+def nlp_branch_node(state: BotState) -> Dict[str, Any]:
+    """
+    nlp_node como rama paralela: sólo devuelve lo que escribe el NLP.
+    """
+    new_state = nlp_node(state)
+    return {"nlp": new_state.nlp, "debug": new_state.debug}
+
+
+async def anlp_branch_node(state: BotState) -> Dict[str, Any]:
+    new_state = await anlp_node(state)
+    return {"nlp": new_state.nlp, "debug": new_state.debug}
+
+
+def rerank_hits(hits: List[Any], nlp: Optional[NLPResult], top: int = 3) -> List[Dict[str, Any]]:
+    """
+    Reordena los candidatos especulativos con el NLP: el score se multiplica
+    por (1 + SPECULATIVE_INTENT_BOOST * coincidencia intención/categoría) y
+    después se aplica el boost por entidades de siempre.
+    """
+    filas = [_as_dict(h) for h in hits]
+    if nlp is None:
+        return filas[:top]
+
+    intencion = nlp.intent.intencion
+    matches = [
+        (fila, fila["score"] * (1 + SPECULATIVE_INTENT_BOOST * simple_match_score(intencion, fila["categoria"])))
+        for fila in filas
+    ]
+    matches = apply_entity_boost(matches, nlp.entidades, FAQ_ENTITY_BOOST)
+
+    reordenados = [{**fila, "score": score} for fila, score in matches]
+    reordenados.sort(key=lambda h: h["score"], reverse=True)
+    return reordenados[:top]
+
+
+def merge_knowledge_node(state: BotState) -> BotState:
+    """
+    Punto de unión de las dos ramas: decide los knowledge_hits.
+
+    Con el recuperador "categoria" la intención manda (mismos hits que
+    knowledge_node; sólo es una consulta a índices en memoria) y los
+    candidatos especulativos sirven de respaldo si no hay coincidencias.
+    Con los demás recuperadores se reordenan los candidatos especulativos.
+    """
+    logger.info("Ejecutando merge_knowledge_node...")
+    nlp = state.nlp
+
+    top_hits: List[Dict[str, Any]] = []
+    origen = "speculative"
+    if FAQ_RETRIEVER == "categoria" and nlp is not None and nlp.intent.intencion:
+        intencion = nlp.intent.intencion
+        top_hits = retrieve_hits(
+            f"{state.user_message} {intencion}", intencion, nlp.intent.tipo_mensaje, nlp.entidades
+        )
+        origen = "categoria"
+    if not top_hits:
+        top_hits = rerank_hits(state.speculative_hits, nlp)
+        origen = "speculative"
+
+    new_state = state.model_copy()
+    new_state.knowledge_hits = top_hits
+    # Los candidatos ya no hacen falta: no viajan hasta el final del grafo
+    new_state.speculative_hits = []
+
+    debug = new_state.debug.copy()
+    debug["knowledge_hits"] = top_hits
+    debug["knowledge_source"] = origen
+    new_state.debug = debug
+
+    logger.info("merge_knowledge_node finalizado correctamente ({}).", origen)
+    return new_state
+
+
+async def amerge_knowledge_node(state: BotState) -> BotState:
+    return await asyncio.to_thread(merge_knowledge_node, state)
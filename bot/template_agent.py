@@ -0,0 +1,132 @@
+# bot/template_agent.py
+#
+# Fast path de plantillas (TEMPLATE_FAST_PATH=1): si la FAQ devuelve un único
+# hit exacto (coincidencia fuerte por categoría, hit["exacto"]) y el NLP está
+# seguro, la respuesta se monta con la respuesta_base de esa fila más un saludo
+# y una despedida configurables, sin llamar al LLM para parafrasearla.
+
+import inspect
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from langchain_core.runnables import RunnableConfig
+
+from bot.answer import answer_from_text, token_sink
+from bot.config import (
+    TEMPLATE_FAST_PATH,
+    TEMPLATE_MIN_CONFIDENCE,
+    TEMPLATE_GREETING,
+    TEMPLATE_CLOSING,
+)
+from bot.models import BotState, NLPResult
+
+# Huecos {tipo_entidad} en la respuesta_base, el saludo o la despedida
+_HUECO = re.compile(r"\{(\w+)\}")
+
+TEMPLATE_STATS: Dict[str, int] = {"template": 0, "llm": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def template_stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        stats = dict(TEMPLATE_STATS)
+    total = stats["template"] + stats["llm"]
+    return {**stats, "rate": stats["template"] / total if total else 0.0}
+
+
+def _field(hit: Any, campo: str) -> Any:
+    if isinstance(hit, dict):
+        return hit.get(campo)
+    return getattr(hit, campo, None)
+
+
+def entity_values(nlp: Optional[NLPResult]) -> Dict[str, str]:
+    if nlp is None:
+        return {}
+    return {e.tipo: e.valor for e in nlp.entidades if e.valor}
+
+
+def fill(texto: str, valores: Dict[str, str]) -> Optional[str]:
+    """
+    Sustituye los huecos {tipo} por el valor de la entidad de ese tipo.
+    None si falta alguno.
+    """
+    faltan = [h for h in _HUECO.findall(texto) if h not in valores]
+    if faltan:
+        return None
+    return _HUECO.sub(lambda m: valores[m.group(1)], texto)
+
+
+def use_template(state: BotState) -> bool:
+    """
+    Un único hit exacto, confianza >= TEMPLATE_MIN_CONFIDENCE, cliente no
+    enfadado y todos los huecos de la respuesta_base rellenables.
+
+    "Exacto" lo marca la recuperación (retrieve_hits), no el score: BM25,
+    FTS5 y vector usan otras escalas y el boost por entidades puede llevar
+    una coincidencia parcial a 1.0.
+    """
+    nlp = state.nlp
+    hits = state.knowledge_hits
+    if not TEMPLATE_FAST_PATH or nlp is None or len(hits) != 1:
+        return False
+    if not _field(hits[0], "exacto"):
+        return False
+    if nlp.intent.confianza < TEMPLATE_MIN_CONFIDENCE or nlp.intent.sentimiento == "negativo":
+        return False
+    return fill(_field(hits[0], "respuesta_base") or "", entity_values(nlp)) is not None
+
+
+def route_after_knowledge(state: BotState) -> str:
+    """
+    Arista condicional tras knowledge_agent: plantilla o LLM.
+    """
+    ruta = "template" if use_template(state) else "llm"
+    with _STATS_LOCK:
+        TEMPLATE_STATS[ruta] += 1
+    return "template_agent" if ruta == "template" else "answer_agent"
+
+
+def render_answer(state: BotState) -> str:
+    valores = entity_values(state.nlp)
+    partes: List[str] = []
+    # Saludo y despedida se omiten si les falta alguna entidad
+    saludo = fill(TEMPLATE_GREETING, valores)
+    if saludo:
+        partes.append(saludo)
+    partes.append(fill(_field(state.knowledge_hits[0], "respuesta_base") or "", valores) or "")
+    despedida = fill(TEMPLATE_CLOSING, valores)
+    if despedida:
+        partes.append(despedida)
+    return " ".join(p.strip() for p in partes if p.strip())
+
+
+def _with_template(state: BotState) -> BotState:
+    new_state = answer_from_text(state, render_answer(state))
+    new_state.debug["answer_template"] = True
+    return new_state
+
+
+def template_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    """
+    Respuesta desde la fila de la FAQ, sin LLM. Mismo AnswerResult que answer_node.
+    """
+    logger.info("Ejecutando template_node...")
+    new_state = _with_template(state)
+    sink = token_sink(config)
+    if sink is not None:
+        sink(new_state.answer["respuesta"])
+    return new_state
+
+
+async def atemplate_node(state: BotState, config: Optional[RunnableConfig] = None) -> BotState:
+    logger.info("Ejecutando atemplate_node...")
+    new_state = _with_template(state)
+    sink = token_sink(config)
+    if sink is not None:
+        res = sink(new_state.answer["respuesta"])
+        if inspect.isawaitable(res):
+            await res
+    return new_state
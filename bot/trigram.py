@@ -0,0 +1,107 @@
+# bot/trigram.py
+
+import re
+from typing import List, Dict, Any, Sequence, Set, Tuple
+
+import numpy as np
+
+from bot.bm25 import normalize_text
+
+
+_NO_ALNUM_RE = re.compile(r"[\W_]+")
+
+
+def normalize_for_trigrams(texto: str) -> str:
+    """
+    Minúsculas, sin tildes y con "_" y signos como separadores:
+    "Envíos_Canarias" -> "envios canarias".
+    """
+    return _NO_ALNUM_RE.sub(" ", normalize_text(texto)).strip()
+
+
+def trigrams(texto: str) -> Set[str]:
+    """
+    Trigramas de caracteres de cada palabra, con relleno al estilo pg_trgm
+    ("  e", " en", "env", ..., "os ") para dar peso al principio y al final.
+    """
+    grams: Set[str] = set()
+    for palabra in normalize_for_trigrams(texto).split():
+        padded = f"  {palabra} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Índice de trigramas de caracteres para búsqueda aproximada (tolerante a
+    erratas, plurales y tildes) sobre categorías y preguntas de la FAQ.
+
+    Cada "elemento" es un texto normalizado distinto; `item_rows` dice a qué
+    filas pertenece. La similitud es el coeficiente de Dice entre conjuntos
+    de trigramas, calculado sólo para los elementos que comparten alguno
+    (postings + bincount), sin recorrer todas las filas.
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        campos: Tuple[str, ...] = ("categoria", "pregunta_canonica"),
+    ):
+        self.rows = rows
+        item_ids: Dict[str, int] = {}
+        self.item_rows: List[List[int]] = []
+        postings: Dict[str, List[int]] = {}
+        sizes: List[int] = []
+
+        for row_id in range(len(rows)):
+            row = rows[row_id]
+            for campo in campos:
+                texto = normalize_for_trigrams(row.get(campo, "") or "")
+                if not texto:
+                    continue
+                item = item_ids.get(texto)
+                if item is None:
+                    item = item_ids[texto] = len(sizes)
+                    grams = trigrams(texto)
+                    sizes.append(len(grams))
+                    self.item_rows.append([])
+                    for g in grams:
+                        postings.setdefault(g, []).append(item)
+                if not self.item_rows[item] or self.item_rows[item][-1] != row_id:
+                    self.item_rows[item].append(row_id)
+
+        self.sizes = np.asarray(sizes, dtype=np.float32)
+        self.postings: Dict[str, np.ndarray] = {
+            g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()
+        }
+
+    def similar(
+        self, texto: str, k: int = 3, min_similarity: float = 0.3
+    ) -> List[Tuple[int, float]]:
+        """
+        Devuelve hasta k filas (row_id, similitud) con similitud >= min_similarity,
+        de mayor a menor. Una fila puntúa con el mejor de sus textos.
+        """
+        grams = trigrams(texto)
+        listas = [self.postings[g] for g in grams if g in self.postings]
+        if not listas or not len(self.sizes):
+            return []
+
+        compartidos = np.bincount(np.concatenate(listas), minlength=len(self.sizes))
+        candidatos = np.flatnonzero(compartidos)
+        dice = 2.0 * compartidos[candidatos] / (len(grams) + self.sizes[candidatos])
+
+        mask = dice >= min_similarity
+        candidatos, dice = candidatos[mask], dice[mask]
+        orden = np.lexsort((candidatos, -dice))
+
+        mejores: Dict[int, float] = {}
+        for item, sim in zip(candidatos[orden].tolist(), dice[orden].tolist()):
+            for row_id in self.item_rows[item]:
+                if row_id not in mejores:
+                    mejores[row_id] = sim
+            if len(mejores) >= k:
+                break
+
+        ranked = sorted(mejores.items(), key=lambda m: (-m[1], m[0]))
+        return ranked[:k]
@@ -0,0 +1,210 @@
+# bot/vector_index.py
+
+import hashlib
+import tempfile
+import zlib
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from bot.bm25 import tokenize, faq_document, top_k_per_row
+
+
+def _features(texto: str) -> List[str]:
+    """
+    Rasgos de un texto: palabras normalizadas y trigramas de caracteres de
+    cada palabra (así "envio" y "envios" comparten casi todos los rasgos).
+    """
+    feats: List[str] = []
+    for tok in tokenize(texto):
+        feats.append("w:" + tok)
+        padded = f"#{tok}#"
+        feats.extend("c:" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return feats
+
+
+class HashingVectorizer:
+    """
+    Vectorizador local (sin red) basado en el "hashing trick".
+
+    Cada rasgo va a una de `dims` posiciones mediante crc32, que es estable
+    entre procesos (a diferencia de hash()). No hace falta guardar vocabulario.
+    """
+
+    def __init__(self, dims: int = 512):
+        self.dims = dims
+        # rasgo -> posición (los rasgos se repiten mucho entre filas)
+        self._buckets: Dict[str, int] = {}
+
+    def _bucket(self, feat: str) -> int:
+        b = self._buckets.get(feat)
+        if b is None:
+            b = self._buckets[feat] = zlib.crc32(feat.encode("utf-8")) % self.dims
+        return b
+
+    def counts(self, texto: str) -> np.ndarray:
+        return self.counts_many([texto])[0]
+
+    def counts_many(self, textos: List[str]) -> np.ndarray:
+        """
+        Matriz (textos x dims) de frecuencias, rellenada con un único bincount.
+        """
+        flat: List[int] = []
+        for i, texto in enumerate(textos):
+            base = i * self.dims
+            flat.extend(base + self._bucket(f) for f in _features(texto))
+        counts = np.bincount(
+            np.asarray(flat, dtype=np.int64), minlength=len(textos) * self.dims
+        )
+        return counts.astype(np.float32).reshape(len(textos), self.dims)
+
+
+class VectorIndex:
+    """
+    Índice vectorial TF-IDF (con hashing) sobre las filas de la FAQ.
+
+    matrix: (num_filas, dims), filas normalizadas L2.
+    Una consulta es un único producto matriz-vector más argpartition.
+    """
+
+    def __init__(self, matrix: np.ndarray, idf: np.ndarray, vectorizer: HashingVectorizer):
+        self.matrix = matrix
+        self.idf = idf
+        self.vectorizer = vectorizer
+        # Filas de origen (las rellena from_rows)
+        self.rows: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def build(cls, documents: List[str], dims: int = 512) -> "VectorIndex":
+        vectorizer = HashingVectorizer(dims)
+        counts = vectorizer.counts_many(documents)
+
+        df = (counts > 0).sum(axis=0).astype(np.float32)
+        idf = (np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        matrix = np.log1p(counts) * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return cls(matrix.astype(np.float32), idf, vectorizer)
+
+    def subset(self, row_ids: List[int]) -> "VectorIndex":
+        """
+        Índice sobre un subconjunto de filas (p. ej. una partición por tipo):
+        se reutilizan sus vectores y el idf del índice completo.
+        """
+        return VectorIndex(self.matrix[np.asarray(row_ids, dtype=np.int64)], self.idf, self.vectorizer)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], dims: int = 512) -> "VectorIndex":
+        index = cls.build([faq_document(row) for row in rows], dims=dims)
+        index.rows = rows
+        return index
+
+    def query_vector(self, consulta: str) -> np.ndarray:
+        vec = np.log1p(self.vectorizer.counts(consulta)) * self.idf
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def query_matrix(self, consultas: List[str]) -> np.ndarray:
+        """
+        Matriz (consultas x dims) con los vectores normalizados de cada consulta.
+        """
+        q = np.log1p(self.vectorizer.counts_many(consultas)) * self.idf
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        return q / np.where(norms == 0, 1.0, norms)
+
+    def search_many(
+        self, consultas: List[str], k: int = 3, min_score: float = 0.0
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Como search, pero para un lote: un único producto de matrices
+        (consultas x dims) @ (dims x filas) y top-k por filas.
+        """
+        if not len(self.matrix):
+            return [[] for _ in consultas]
+        scores = self.query_matrix(consultas) @ self.matrix.T
+        return top_k_per_row(scores, k, min_score)
+
+    def search(self, consulta: str, k: int = 3, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Devuelve los k mejores (row_id, similitud coseno) por encima de
+        min_score, de mayor a menor (a igualdad, por row_id, como search_many).
+        """
+        if not len(self.matrix):
+            return []
+
+        scores = self.matrix @ self.query_vector(consulta)
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > min_score]
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Temporal único: dos procesos guardando a la vez no se pisan
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as f:
+            np.savez(f, matrix=self.matrix, idf=self.idf)
+        tmp = Path(f.name)
+        try:
+            tmp.replace(path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "VectorIndex":
+        with np.load(path) as data:
+            matrix, idf = data["matrix"], data["idf"]
+        return cls(matrix, idf, HashingVectorizer(matrix.shape[1]))
+
+
+def file_sha256(path: str) -> str:
+    """
+    Hash del contenido de un fichero (para invalidar índices persistidos).
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_or_build(
+    rows: List[Dict[str, Any]],
+    digest: str,
+    cache_dir: str,
+    dims: int = 512,
+) -> VectorIndex:
+    """
+    Carga el índice persistido para el contenido con hash `digest` o, si no
+    existe, lo construye y lo guarda en cache_dir.
+    """
+    path = Path(cache_dir) / f"faq-{digest[:16]}-{dims}.npz"
+    if path.exists():
+        try:
+            index = VectorIndex.load(path)
+            if index.matrix.shape[0] == len(rows):
+                logger.info("Índice vectorial cargado de disco: {}", path)
+                index.rows = rows
+                return index
+            logger.warning("Índice vectorial {} no cuadra con la FAQ, se reconstruye.", path)
+        except Exception as e:
+            logger.warning("No se pudo leer el índice vectorial {}: {}", path, e)
+
+    index = VectorIndex.from_rows(rows, dims=dims)
+    try:
+        index.save(path)
+        logger.info("Índice vectorial guardado en {}", path)
+    except OSError as e:
+        logger.warning("No se pudo guardar el índice vectorial en {}: {}", path, e)
+    return index
@@ -1,4 +1,5 @@
 from bot.graph import build_graph, initial_state
+from bot.config import ANSWER_STREAMING
 from pydantic import BaseModel
 from loguru import logger
 import json
@@ -13,6 +14,13 @@ def to_json_safe(obj):
         return obj
 
 
+def print_token(token: str) -> None:
+    """
+    Callback de streaming: imprime cada fragmento de la respuesta al llegar.
+    """
+    print(token, end="", flush=True)
+
+
 
 
 
@@ -30,17 +38,28 @@ def main():
 
             # Estado inicial como BotState
             state = initial_state(msg)
-            logger.info(
+            # lazy: el JSON sólo se genera si el nivel DEBUG está activo
+            logger.opt(lazy=True).debug(
                 "Estado inicial:\n{}",
-                state.model_dump_json(indent=4, ensure_ascii=False),
+                lambda: state.model_dump_json(indent=4, ensure_ascii=False),
             )
 
             final_state = None
 
+            # En modo streaming answer_node va enviando los tokens a print_token
+            if ANSWER_STREAMING:
+                print("Agente: ", end="", flush=True)
+                pasos = app.stream(state, config={"configurable": {"on_token": print_token}})
+            else:
+                pasos = app.stream(state)
+
             # Ejecutamos el grafo paso a paso con LangGraph
-            for step in app.stream(state):
+            for step in pasos:
                 # step es un BotState después de cada nodo
                 final_state = step
+
+            if ANSWER_STREAMING:
+                print()
             
             
             print(type(final_state))
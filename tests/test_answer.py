@@ -108,7 +108,7 @@ def test_answer_node_happy_path_no_revision(monkeypatch):
     def fake_chat_openai(*args, **kwargs):
         return FakeLLMOk()
 
-    monkeypatch.setattr(answer, "ChatOpenAI", fake_chat_openai)
+    monkeypatch.setattr(answer, "get_llm", fake_chat_openai)
 
     hits: List[Dict[str, Any]] = [
         {
@@ -178,7 +178,7 @@ def test_answer_node_marks_necesita_revision_when_llm_says_so(monkeypatch):
     def fake_chat_openai(*args, **kwargs):
         return FakeLLMNeedsHuman()
 
-    monkeypatch.setattr(answer, "ChatOpenAI", fake_chat_openai)
+    monkeypatch.setattr(answer, "get_llm", fake_chat_openai)
 
     state = {
         "user_message": "Tengo una pregunta complicada.",
@@ -207,3 +207,168 @@ def test_answer_node_marks_necesita_revision_when_llm_says_so(monkeypatch):
     assert "agente humano" in ans["respuesta"].lower()
     assert "answer_raw" in new_state["debug"]
     assert new_state["debug"]["answer_raw"] == ans["respuesta"]
+
+
+# ==========================
+# Caché de respuestas
+# ==========================
+
+class FakeLLMContador(FakeLLMOk):
+    llamadas = 0
+
+    def invoke(self, messages):
+        FakeLLMContador.llamadas += 1
+        return super().invoke(messages)
+
+
+def _estado(intencion="shipping_policy", entidades=None, respuesta_base="Enviamos en 24-48h."):
+    from bot.models import BotState, NLPResult, IntentResult, Entity
+
+    return BotState(
+        user_message="¿Cuánto tarda el envío?",
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje="pregunta",
+                intencion=intencion,
+                confianza=0.9,
+                sentimiento="neutral",
+            ),
+            entidades=[Entity(**e) for e in (entidades or [])],
+        ),
+        knowledge_hits=[
+            {
+                "categoria": "shipping_policy",
+                "pregunta_canonica": "¿Cuál es vuestra política de envíos?",
+                "respuesta_base": respuesta_base,
+                "score": 1.0,
+            }
+        ],
+    )
+
+
+def _cache_limpia(monkeypatch):
+    from bot.cache import LRUTTLCache
+
+    cache = LRUTTLCache(maxsize=100, ttl=3600, namespace="answer")
+    monkeypatch.setattr(answer, "ANSWER_CACHE", cache)
+    monkeypatch.setattr(answer, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(answer, "get_prompt", lambda key: "SYSTEM_PROMPT_FAKE")
+    FakeLLMContador.llamadas = 0
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: FakeLLMContador())
+    return cache
+
+
+def test_answer_node_reutiliza_respuesta_para_misma_intencion_y_hits(monkeypatch):
+    _cache_limpia(monkeypatch)
+
+    primero = answer.answer_node(_estado())
+    segundo = answer.answer_node(_estado(intencion="Shipping policy"))
+
+    assert FakeLLMContador.llamadas == 1
+    assert primero.debug["answer_cache"] == "miss"
+    assert segundo.debug["answer_cache"] == "hit"
+    assert segundo.answer["respuesta"] == primero.answer["respuesta"]
+    assert segundo.answer["metadata"]["num_hits"] == 1
+
+
+def test_answer_cache_se_invalida_al_cambiar_la_fila_faq(monkeypatch):
+    _cache_limpia(monkeypatch)
+
+    answer.answer_node(_estado())
+    nuevo = answer.answer_node(_estado(respuesta_base="Enviamos en 24h."))
+
+    assert FakeLLMContador.llamadas == 2
+    assert nuevo.debug["answer_cache"] == "miss"
+
+
+def test_answer_cache_no_guarda_mensajes_personalizados(monkeypatch):
+    cache = _cache_limpia(monkeypatch)
+    entidades = [{"tipo": "numero_pedido", "valor": "12345"}]
+
+    answer.answer_node(_estado(entidades=entidades))
+    resultado = answer.answer_node(_estado(entidades=entidades))
+
+    assert FakeLLMContador.llamadas == 2
+    assert len(cache) == 0
+    assert "answer_cache" not in resultado.debug
+
+
+def test_answer_cache_key_no_depende_del_orden_de_los_hits():
+    estado = _estado()
+    otro = {"categoria": "returns", "pregunta_canonica": "¿Devoluciones?", "respuesta_base": "30 días."}
+    hits = estado.knowledge_hits + [otro]
+
+    a = answer.answer_cache_key(estado.nlp, hits, "P")
+    b = answer.answer_cache_key(estado.nlp, list(reversed(hits)), "P")
+    assert a == b
+
+
+def test_answer_cache_key_incluye_las_entidades_no_personales():
+    canarias = _estado(entidades=[{"tipo": "lugar", "valor": "Canarias"}, {"tipo": "producto", "valor": "Zapatillas"}])
+    orden = _estado(entidades=[{"tipo": "producto", "valor": "zapatillas"}, {"tipo": "lugar", "valor": "canarias"}])
+    baleares = _estado(entidades=[{"tipo": "lugar", "valor": "Baleares"}, {"tipo": "producto", "valor": "Zapatillas"}])
+
+    clave = answer.answer_cache_key(canarias.nlp, canarias.knowledge_hits, "P")
+    assert clave == answer.answer_cache_key(orden.nlp, orden.knowledge_hits, "P")
+    assert clave != answer.answer_cache_key(baleares.nlp, baleares.knowledge_hits, "P")
+
+
+# ==========================
+# Streaming
+# ==========================
+
+class FakeLLMStreaming(FakeLLMOk):
+    fragmentos = ["Enviamos ", "en ", "", "24-48h."]
+
+    def stream(self, messages):
+        for f in self.fragmentos:
+            yield types.SimpleNamespace(content=f)
+
+
+def test_answer_node_reenvia_tokens_y_monta_la_respuesta(monkeypatch):
+    _cache_limpia(monkeypatch)
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: FakeLLMStreaming())
+    tokens = []
+
+    estado = answer.answer_node(_estado(), config={"configurable": {"on_token": tokens.append}})
+
+    assert tokens == ["Enviamos ", "en ", "24-48h."]
+    assert estado.answer["respuesta"] == "Enviamos en 24-48h."
+    assert estado.answer["necesita_revision_humano"] is False
+    assert estado.debug["answer_ttft_ms"] >= 0
+
+
+def test_answer_node_streaming_atraviesa_el_grafo(monkeypatch):
+    from bot import graph
+
+    _cache_limpia(monkeypatch)
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: FakeLLMStreaming())
+    monkeypatch.setattr(graph, "nlp_node", lambda state: _estado())
+    monkeypatch.setattr(graph, "knowledge_node", lambda state: state)
+    tokens = []
+
+    app = graph.build_graph()
+    pasos = list(app.stream(graph.initial_state("hola"), config={"configurable": {"on_token": tokens.append}}))
+
+    assert "".join(tokens) == "Enviamos en 24-48h."
+    assert pasos[-1]["answer_agent"]["answer"]["respuesta"] == "Enviamos en 24-48h."
+
+
+def test_answer_node_pone_el_texto_fijo_antes_que_los_datos(monkeypatch):
+    _cache_limpia(monkeypatch)
+    mensajes = []
+
+    class FakeLLMCaptura(FakeLLMOk):
+        def invoke(self, messages):
+            mensajes.extend(messages)
+            return super().invoke(messages)
+
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: FakeLLMCaptura())
+
+    answer.answer_node(_estado())
+
+    sistema, usuario = mensajes
+    assert sistema.content.startswith("SYSTEM_PROMPT_FAKE")
+    assert "INSTRUCCIONES:" in sistema.content
+    assert usuario.content.startswith("BASE DE CONOCIMIENTO:")
+    assert usuario.content.endswith("¿Cuánto tarda el envío?")
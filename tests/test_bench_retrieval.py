@@ -0,0 +1,35 @@
+# tests/test_bench_retrieval.py
+
+import json
+
+from benchmarks import bench_retrieval
+
+
+def test_generate_catalog_es_determinista_y_con_categorias_unicas():
+    a = bench_retrieval.generate_catalog(100)
+    b = bench_retrieval.generate_catalog(100)
+
+    assert a == b
+    assert len({r["categoria"] for r in a}) == 100
+
+
+def test_run_escribe_json_con_metricas(tmp_path):
+    """
+    Ejecución mínima (sin red): un tamaño pequeño y todos los recuperadores.
+    """
+    output = tmp_path / "bench.json"
+
+    bench_retrieval.run(
+        sizes=[200],
+        retrievers=bench_retrieval.RETRIEVERS,
+        num_queries=10,
+        output=str(output),
+    )
+
+    data = json.loads(output.read_text(encoding="utf-8"))
+    assert {r["retriever"] for r in data["results"]} == set(bench_retrieval.RETRIEVERS)
+    for r in data["results"]:
+        assert r["rows"] == 200
+        assert r["p99_ms"] >= r["p50_ms"] >= 0
+        assert r["load_s"] >= 0
+        assert r["load_peak_mb"] >= 0
@@ -0,0 +1,18 @@
+# tests/test_bench_state.py
+
+import json
+
+from benchmarks import bench_state
+
+
+def test_run_escribe_json_con_coste_por_nodo(tmp_path):
+    output = tmp_path / "bench.json"
+
+    bench_state.run(nodes=[1, 3], iterations=5, output=str(output))
+
+    data = json.loads(output.read_text(encoding="utf-8"))
+    assert {(r["mode"], r["nodes"]) for r in data["results"]} == {
+        (m, n) for m in bench_state.MODES for n in (1, 3)
+    }
+    assert set(data["per_node_us"]) == set(bench_state.MODES)
+    assert all(r["us_per_invoke"] > 0 for r in data["results"])
@@ -0,0 +1,78 @@
+# tests/test_bm25.py
+
+import pytest
+
+from bot import bm25
+
+
+FAQ_ROWS = [
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+        "respuesta_base": "Los envíos a España peninsular tardan entre 24 y 48 horas laborables.",
+    },
+    {
+        "categoria": "envios_canarias",
+        "pregunta_canonica": "¿Envían a Canarias?",
+        "respuesta_base": "Sí, enviamos a Canarias. El plazo de entrega es de 5 a 7 días laborables.",
+    },
+    {
+        "categoria": "devoluciones",
+        "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?",
+        "respuesta_base": "Aceptamos devoluciones durante los primeros 30 días.",
+    },
+]
+
+
+def test_tokenize_normaliza_tildes_y_guiones_bajos():
+    """
+    Debe pasar a minúsculas, quitar tildes y separar por '_'.
+    """
+    assert bm25.tokenize("Envíos_Canarias ¿Cuánto?") == ["envios", "canarias", "cuanto"]
+
+
+def test_bm25_search_usa_pregunta_y_respuesta():
+    """
+    La consulta debe encontrar filas por el texto de la pregunta y la
+    respuesta, no sólo por la categoría.
+    """
+    index = bm25.BM25Index.from_rows(FAQ_ROWS)
+
+    hits = index.search("¿Cuánto tarda el envío a Canarias?", k=3)
+
+    assert hits[0][0] == 1
+    assert all(score > 0 for _, score in hits)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+
+def test_bm25_search_sin_coincidencias_devuelve_vacio():
+    index = bm25.BM25Index.from_rows(FAQ_ROWS)
+    assert index.search("zapatillas rojas", k=3) == []
+    assert bm25.BM25Index.from_rows([]).search("envios") == []
+
+
+def test_bm25_search_respeta_k_y_orden_de_fila_en_empates():
+    """
+    Con documentos idénticos, a igualdad de score manda el orden de fila.
+    """
+    rows = [{"categoria": "pago", "pregunta_canonica": "", "respuesta_base": ""}] * 5
+    index = bm25.BM25Index.from_rows(rows)
+
+    assert [i for i, _ in index.search("pago", k=3)] == [0, 1, 2]
+
+
+def test_bm25_search_many_equivale_a_search():
+    """
+    El lote debe dar lo mismo que llamar a search consulta a consulta,
+    en el orden de entrada.
+    """
+    index = bm25.BM25Index.from_rows(FAQ_ROWS)
+    consultas = ["envíos a Canarias", "zapatillas", "devoluciones", "plazo envíos España"]
+
+    lote = index.search_many(consultas, k=2)
+
+    assert len(lote) == len(consultas)
+    for consulta, hits in zip(consultas, lote):
+        esperado = index.search(consulta, k=2)
+        assert [i for i, _ in hits] == [i for i, _ in esperado]
+        assert [s for _, s in hits] == pytest.approx([s for _, s in esperado])
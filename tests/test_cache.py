@@ -0,0 +1,145 @@
+# tests/test_cache.py
+
+import sqlite3
+
+from bot import cache
+from bot.cache import LRUTTLCache, normalize_message
+
+
+def test_normalize_message_ignora_tildes_signos_y_mayusculas():
+    assert normalize_message("¿Cuánto tarda el envío?") == "cuanto tarda el envio"
+    assert normalize_message("  CUANTO   tarda el envio ") == "cuanto tarda el envio"
+
+
+def test_lru_expulsa_la_entrada_menos_usada():
+    c = LRUTTLCache(maxsize=2, ttl=None)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "a" pasa a ser la más reciente
+    c.set("c", 3)
+
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_ttl_caduca_las_entradas(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: ahora[0])
+
+    c = LRUTTLCache(maxsize=10, ttl=60)
+    c.set("a", {"x": 1})
+    ahora[0] += 59
+    assert c.get("a") == {"x": 1}
+    ahora[0] += 2
+    assert c.get("a") is None
+    assert len(c) == 0
+
+
+def test_contadores_de_aciertos_y_fallos():
+    c = LRUTTLCache(maxsize=10)
+    c.get("a")
+    c.set("a", 1)
+    c.get("a")
+    c.get("a")
+
+    stats = c.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_capa_en_disco_sobrevive_a_reinicios(tmp_path):
+    db = str(tmp_path / "cache.db")
+    c = LRUTTLCache(maxsize=10, ttl=3600, disk_path=db, namespace="nlp")
+    c.set("clave", {"nlp": {"a": 1}, "raw": "{}"})
+
+    nueva = LRUTTLCache(maxsize=10, ttl=3600, disk_path=db, namespace="nlp")
+    assert nueva.get("clave") == {"nlp": {"a": 1}, "raw": "{}"}
+    assert nueva.stats()["disk_hits"] == 1
+
+    # Los namespaces no se mezclan
+    otra = LRUTTLCache(maxsize=10, ttl=3600, disk_path=db, namespace="answer")
+    assert otra.get("clave") is None
+
+
+def test_lfu_expulsa_la_entrada_con_menos_aciertos():
+    c = LRUTTLCache(maxsize=2, ttl=None, eviction="lfu")
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.get("a")
+    c.get("b")
+    c.set("c", 3)
+
+    assert c.get("b") is None
+    assert c.get("a") == 1
+
+
+def test_lfu_expulsa_igual_que_el_recorrido_completo():
+    """
+    Los buckets por frecuencia eligen la misma víctima que buscar el mínimo
+    de aciertos entre todas las claves (empates: la usada hace más tiempo).
+    """
+    import random
+    from collections import OrderedDict
+
+    rng = random.Random(7)
+    c = LRUTTLCache(maxsize=20, ttl=None, eviction="lfu")
+    usos: "OrderedDict[str, int]" = OrderedDict()
+
+    for _ in range(5000):
+        clave = f"k{rng.randrange(60)}"
+        if rng.random() < 0.5:
+            esperado = clave in usos
+            assert (c.get(clave) is not None) == esperado
+            if esperado:
+                usos[clave] += 1
+                usos.move_to_end(clave)
+        else:
+            c.set(clave, 1)
+            usos[clave] = usos.get(clave, 0)
+            usos.move_to_end(clave)
+            if len(usos) > 20:
+                victima = min((k for k in usos if k != clave), key=usos.__getitem__)
+                del usos[victima]
+        assert set(c._data) == set(usos)
+
+
+def test_fifo_expulsa_la_primera_insertada_aunque_se_use():
+    c = LRUTTLCache(maxsize=2, ttl=None, eviction="fifo")
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+
+    assert c.get("a") is None
+    assert c.get("b") == 2
+
+
+def _filas(db, namespace):
+    with sqlite3.connect(db) as con:
+        return con.execute("SELECT key FROM cache WHERE namespace = ? ORDER BY rowid", (namespace,)).fetchall()
+
+
+def test_disco_borra_la_fila_caducada_al_leerla(tmp_path, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: ahora[0])
+    db = str(tmp_path / "cache.db")
+    LRUTTLCache(maxsize=10, ttl=60, disk_path=db).set("a", 1)
+
+    ahora[0] += 61
+    assert LRUTTLCache(maxsize=10, ttl=60, disk_path=db).get("a") is None
+    assert _filas(db, "default") == []
+
+
+def test_disco_se_recorta_a_maxsize_por_namespace(tmp_path):
+    db = str(tmp_path / "cache.db")
+    LRUTTLCache(maxsize=10, disk_path=db, namespace="otro").set("x", 0)
+    c = LRUTTLCache(maxsize=3, disk_path=db, disk_purge_every=5)
+    for i in range(5):
+        c.set(f"k{i}", i)
+
+    assert _filas(db, "default") == [("k2",), ("k3",), ("k4",)]
+    assert _filas(db, "otro") == [("x",)]
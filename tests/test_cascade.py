@@ -0,0 +1,174 @@
+# tests/test_cascade.py
+
+import asyncio
+import json
+import types
+
+import pytest
+
+from bot import answer, cascade, nlp_agent
+from bot.models import BotState, NLPResult
+
+
+class FakeModelo:
+    """LLM que responde según el modelo con el que se pidió a get_llm."""
+
+    def __init__(self, modelo, respuestas, llamadas):
+        self.modelo = modelo
+        self.respuestas = respuestas
+        self.llamadas = llamadas
+
+    def _respuesta(self):
+        self.llamadas.append(self.modelo)
+        return types.SimpleNamespace(
+            content=self.respuestas[self.modelo],
+            usage_metadata={"input_tokens": 100, "output_tokens": 20},
+            response_metadata={},
+        )
+
+    def invoke(self, messages):
+        return self._respuesta()
+
+    async def ainvoke(self, messages):
+        return self._respuesta()
+
+
+@pytest.fixture
+def cascada(monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADE_STATS", {})
+    monkeypatch.setitem(cascade._CASCADAS, "answer", ["pequeno", "grande"])
+    monkeypatch.setitem(cascade._CASCADAS, "nlp", ["pequeno", "grande"])
+    monkeypatch.setattr(answer, "get_prompt", lambda key: "SYSTEM_PROMPT_FAKE")
+    monkeypatch.setattr(answer, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(nlp_agent, "get_prompt", lambda key: "PROMPT_FAKE")
+    monkeypatch.setattr(nlp_agent, "NLP_CACHE_ENABLED", False)
+    llamadas = []
+
+    def _instalar(modulo, respuestas):
+        monkeypatch.setattr(modulo, "get_llm", lambda model, **k: FakeModelo(model, respuestas, llamadas))
+        return llamadas
+
+    return _instalar
+
+
+def _estado(score=1.0, sentimiento="neutral"):
+    return BotState(
+        user_message="¿Cuánto tarda el envío?",
+        nlp=NLPResult(
+            intent={"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": 0.9, "sentimiento": sentimiento}
+        ),
+        knowledge_hits=[
+            {"categoria": "envios", "pregunta_canonica": "¿Plazo?", "respuesta_base": "2-4 días.", "score": score}
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "retriever, score, nivel",
+    [
+        ("categoria", 0.4, 1),
+        ("categoria", 1.0, 0),
+        # Coseno: un buen hit vectorial rara vez pasa de 0.5
+        ("vector", 0.4, 0),
+        ("vector", 0.1, 1),
+        # BM25/FTS5 no tienen cota: por defecto no escalan por score
+        ("bm25", 0.4, 0),
+        ("sqlite", 12.0, 0),
+    ],
+)
+def test_answer_start_tier_usa_el_umbral_del_recuperador(retriever, score, nivel):
+    estado = _estado(score=score)
+    estado.knowledge_hits[0].retriever = retriever
+    assert answer.answer_start_tier(estado, ["pequeno", "grande"])[0] == nivel
+
+
+def test_answer_start_tier_sin_hits_empieza_por_el_grande():
+    estado = _estado()
+    estado.knowledge_hits = []
+    assert answer.answer_start_tier(estado, ["pequeno", "grande"]) == (1, "score")
+
+
+def test_token_usage_lee_ambos_formatos():
+    nuevo = types.SimpleNamespace(usage_metadata={"input_tokens": 5, "output_tokens": 2})
+    viejo = types.SimpleNamespace(response_metadata={"token_usage": {"prompt_tokens": 7, "completion_tokens": 3}})
+    assert cascade.token_usage(nuevo) == {"prompt_tokens": 5, "completion_tokens": 2}
+    assert cascade.token_usage(viejo) == {"prompt_tokens": 7, "completion_tokens": 3}
+    assert cascade.token_usage(None) == {"prompt_tokens": 0, "completion_tokens": 0}
+
+
+def test_sin_cascada_se_usa_el_modelo_configurado(monkeypatch):
+    monkeypatch.setitem(cascade._CASCADAS, "answer", [])
+    assert cascade.cascade_models("answer") == [cascade.OPENAI_MODEL_NAME]
+
+
+def test_answer_se_queda_en_el_modelo_pequeno(cascada):
+    llamadas = cascada(answer, {"pequeno": "Tarda de 2 a 4 días.", "grande": "-"})
+
+    out = answer.answer_node(_estado())
+
+    assert llamadas == ["pequeno"]
+    assert out.answer["respuesta"] == "Tarda de 2 a 4 días."
+    assert out.debug["answer_model"] == "pequeno"
+    assert out.debug["answer_escalation"] is None
+    tier = out.debug["answer_tiers"][0]
+    assert tier["prompt_tokens"] == 100 and tier["completion_tokens"] == 20 and tier["latency_ms"] >= 0
+
+
+def test_answer_escala_si_el_pequeno_pide_revision(cascada):
+    llamadas = cascada(
+        answer,
+        {"pequeno": "No tengo suficiente información, mejor derivar a un agente humano.", "grande": "Tarda 3 días."},
+    )
+
+    out = answer.answer_node(_estado())
+
+    assert llamadas == ["pequeno", "grande"]
+    assert out.answer["respuesta"] == "Tarda 3 días."
+    assert out.answer["necesita_revision_humano"] is False
+    assert out.debug["answer_escalation"] == "revision"
+    assert [t["modelo"] for t in out.debug["answer_tiers"]] == ["pequeno", "grande"]
+
+    stats = cascade.cascade_stats()["answer"]
+    assert stats["escalations"] == 1
+    assert stats["modelos"]["grande"]["calls"] == 1
+
+
+@pytest.mark.parametrize(
+    "estado, motivo",
+    [(_estado(score=0.2), "score"), (_estado(sentimiento="negativo"), "sentimiento")],
+)
+def test_answer_empieza_por_el_grande(cascada, estado, motivo):
+    llamadas = cascada(answer, {"pequeno": "-", "grande": "Respuesta cuidada."})
+
+    out = asyncio.run(answer.aanswer_node(estado))
+
+    assert llamadas == ["grande"]
+    assert out.debug["answer_escalation"] == motivo
+
+
+def _nlp_raw(confianza):
+    return json.dumps(
+        {
+            "intent": {"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": confianza, "sentimiento": "neutral"},
+            "entidades": [],
+        }
+    )
+
+
+def test_nlp_escala_con_poca_confianza(cascada):
+    llamadas = cascada(nlp_agent, {"pequeno": _nlp_raw(0.3), "grande": _nlp_raw(0.95)})
+
+    out = nlp_agent.nlp_node(BotState(user_message="¿y lo mío?"))
+
+    assert llamadas == ["pequeno", "grande"]
+    assert out.nlp.intent.confianza == 0.95
+    assert out.debug["nlp_model"] == "grande"
+
+
+def test_nlp_no_escala_si_el_pequeno_acierta(cascada):
+    llamadas = cascada(nlp_agent, {"pequeno": _nlp_raw(0.9), "grande": "-"})
+
+    out = asyncio.run(nlp_agent.anlp_node(BotState(user_message="¿Cuánto tarda?")))
+
+    assert llamadas == ["pequeno"]
+    assert out.debug["nlp_model"] == "pequeno"
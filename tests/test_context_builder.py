@@ -0,0 +1,72 @@
+# tests/test_context_builder.py
+
+from bot.context_builder import (
+    SIN_CONTEXTO,
+    build_context,
+    compact_nlp_json,
+    dedupe_hits,
+    estimate_tokens,
+    short_form,
+)
+from bot.models import NLPResult, IntentResult
+
+
+def _hit(categoria, pregunta, respuesta, score=1.0):
+    return {"categoria": categoria, "pregunta_canonica": pregunta, "respuesta_base": respuesta, "score": score}
+
+
+def test_estimate_tokens_crece_con_el_texto():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hola") == 1
+    assert estimate_tokens("¿Cuánto tardan los envíos?") == 9
+    assert estimate_tokens("palabra " * 100) == 200
+
+
+def test_short_form_corta_por_frases_completas():
+    texto = "Enviamos en 24-48 horas. " + "Hay excepciones en festivos y zonas remotas. " * 10
+    corto = short_form(texto, 20)
+    assert corto.startswith("Enviamos en 24-48 horas.")
+    assert corto.endswith(".")
+    assert estimate_tokens(corto) <= 20
+    # Un texto corto no se toca
+    assert short_form("Sí.", 20) == "Sí."
+
+
+def test_dedupe_quita_duplicados_exactos_y_casi_duplicados():
+    hits = [
+        _hit("envios", "¿Cuánto tardan los envíos?", "Entre 24 y 48 horas laborables.", 3.0),
+        _hit("envios_2", "¿Cuánto tardan los envíos?", "Entre 24 y 48 horas laborables.", 2.0),
+        _hit("plazos", "¿Cuánto tardan los envíos a casa?", "Entre 24 y 48 horas laborables!", 1.5),
+        _hit("devoluciones", "¿Puedo devolver?", "Tienes 30 días.", 1.0),
+    ]
+    assert [h["categoria"] for h in dedupe_hits(hits)] == ["envios", "devoluciones"]
+
+
+def test_build_context_respeta_el_presupuesto():
+    larga = "Texto de relleno sobre la política. " * 60
+    hits = [
+        _hit("a", "¿Pregunta A?", larga),
+        _hit("b", "¿Pregunta B?", "Respuesta corta B."),
+        _hit("c", "¿Pregunta C?", "Otra respuesta distinta sobre C. " * 30),
+    ]
+
+    contexto = build_context(hits, budget=60, short_tokens=20)
+
+    assert estimate_tokens(contexto) <= 60
+    lineas = contexto.split("\n")
+    assert lineas[0].startswith("[a] ¿Pregunta A?: Texto de relleno")
+    assert "[b] ¿Pregunta B?: Respuesta corta B." in lineas
+    assert not any(l.startswith("[c]") for l in lineas)
+
+
+def test_build_context_sin_hits():
+    assert build_context([]) == SIN_CONTEXTO
+
+
+def test_compact_nlp_json_sin_blancos():
+    nlp = NLPResult(
+        intent=IntentResult(tipo_mensaje="pregunta", intencion="envios", confianza=0.9, sentimiento="neutral")
+    )
+    compacto = compact_nlp_json(nlp)
+    assert "\n" not in compacto and ": " not in compacto
+    assert len(compacto) < len(nlp.model_dump_json(indent=4))
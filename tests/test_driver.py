@@ -0,0 +1,57 @@
+# tests/test_driver.py
+
+import asyncio
+
+from bot import driver, graph
+
+
+class Contador:
+    def __init__(self):
+        self.en_vuelo = 0
+        self.maximo = 0
+
+
+def _fakes(monkeypatch, contador):
+    async def fake_nlp(state):
+        contador.en_vuelo += 1
+        contador.maximo = max(contador.maximo, contador.en_vuelo)
+        # Simula la espera de red de la llamada al LLM
+        await asyncio.sleep(0.01)
+        contador.en_vuelo -= 1
+        if state.user_message == "falla":
+            raise RuntimeError("timeout")
+        return state.model_copy(update={"debug": {**state.debug, "nlp": True}})
+
+    async def fake_knowledge(state):
+        return state
+
+    async def fake_answer(state):
+        return state.model_copy(
+            update={"answer": {"respuesta": f"Re: {state.user_message}", "necesita_revision_humano": False}}
+        )
+
+    monkeypatch.setattr(graph, "anlp_node", fake_nlp)
+    monkeypatch.setattr(graph, "aknowledge_node", fake_knowledge)
+    monkeypatch.setattr(graph, "aanswer_node", fake_answer)
+
+
+def test_run_conversations_respeta_el_limite_y_el_orden(monkeypatch):
+    contador = Contador()
+    _fakes(monkeypatch, contador)
+    mensajes = [f"mensaje {i}" for i in range(50)]
+
+    estados = asyncio.run(driver.run_conversations(mensajes, concurrencia=8))
+
+    assert [e.answer.respuesta for e in estados] == [f"Re: {m}" for m in mensajes]
+    assert 1 < contador.maximo <= 8
+
+
+def test_run_conversations_aisla_los_errores(monkeypatch):
+    _fakes(monkeypatch, Contador())
+
+    estados = asyncio.run(driver.run_conversations(["hola", "falla", "adiós"], concurrencia=2))
+
+    assert estados[0].answer.respuesta == "Re: hola"
+    assert estados[1].answer is None
+    assert "timeout" in estados[1].debug["error"]
+    assert estados[2].answer.respuesta == "Re: adiós"
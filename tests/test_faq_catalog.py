@@ -0,0 +1,77 @@
+# tests/test_faq_catalog.py
+
+import csv
+
+from bot import faq_catalog
+from bot.bm25 import BM25Index
+
+
+FAQ_ROWS = [
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+        "respuesta_base": "Entre 24 y 48 horas laborables.",
+    },
+    {
+        "categoria": "envios_canarias",
+        "pregunta_canonica": "¿Envían a Canarias?",
+        "respuesta_base": "Sí, de 5 a 7 días laborables.",
+    },
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Hacéis envíos urgentes?",
+        "respuesta_base": "Sí, en 24 horas con sobrecoste.",
+    },
+]
+
+
+def _compile(tmp_path, rows=FAQ_ROWS):
+    csv_path = tmp_path / "faq.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["categoria", "pregunta_canonica", "respuesta_base"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    out = tmp_path / "faq.faqc"
+    faq_catalog.compile_faq(str(csv_path), str(out))
+    return faq_catalog.CompiledFaq(str(out))
+
+
+def test_compiled_faq_devuelve_las_mismas_filas(tmp_path):
+    catalogo = _compile(tmp_path)
+
+    assert len(catalogo) == 3
+    assert list(catalogo) == FAQ_ROWS
+    assert catalogo[-1] == FAQ_ROWS[-1]
+    assert catalogo.categorias() == ["envios", "envios_canarias", "envios"]
+
+
+def test_compiled_faq_interna_categorias(tmp_path):
+    """
+    Las categorías repetidas se guardan una sola vez.
+    """
+    catalogo = _compile(tmp_path)
+
+    assert catalogo.categorias_tabla == ["envios", "envios_canarias"]
+    assert catalogo.row_cat.tolist() == [0, 1, 0]
+
+
+def test_compiled_faq_bm25_equivale_al_de_las_filas(tmp_path):
+    """
+    El BM25 construido con los tokens precalculados debe puntuar igual que
+    el construido tokenizando las filas.
+    """
+    catalogo = _compile(tmp_path)
+
+    desde_catalogo = catalogo.bm25_index()
+    desde_filas = BM25Index.from_rows(FAQ_ROWS)
+
+    consulta = "envíos urgentes a Canarias"
+    assert (desde_catalogo.scores(consulta) == desde_filas.scores(consulta)).all()
+
+
+def test_compiled_faq_catalogo_vacio(tmp_path):
+    catalogo = _compile(tmp_path, rows=[])
+
+    assert len(catalogo) == 0
+    assert list(catalogo) == []
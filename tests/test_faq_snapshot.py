@@ -0,0 +1,73 @@
+# tests/test_faq_snapshot.py
+
+from bot import faq_snapshot
+
+
+CSV_INICIAL = (
+    "categoria,pregunta_canonica,respuesta_base\n"
+    "envios,¿Cuánto tardan los envíos?,Entre 24 y 48 horas.\n"
+)
+
+
+def test_read_snapshot_guarda_metadatos(tmp_path):
+    path = tmp_path / "faq.csv"
+    path.write_text(CSV_INICIAL, encoding="utf-8")
+
+    snap = faq_snapshot.read_snapshot(str(path))
+
+    assert len(snap) == 1
+    assert snap[0]["categoria"] == "envios"
+    assert snap.size == len(CSV_INICIAL.encode("utf-8"))
+    assert snap.fieldnames == ["categoria", "pregunta_canonica", "respuesta_base"]
+    assert not snap.is_stale()
+
+
+def test_append_snapshot_lee_solo_filas_nuevas(tmp_path):
+    """
+    Si sólo se añaden filas al final, la snapshot nueva conserva las
+    anteriores y el hash coincide con el de leer el fichero completo.
+    """
+    path = tmp_path / "faq.csv"
+    path.write_text(CSV_INICIAL, encoding="utf-8")
+    prev = faq_snapshot.read_snapshot(str(path))
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("pagos,¿Cómo puedo pagar?,Con tarjeta o PayPal.\n")
+
+    assert prev.is_stale()
+    snap = faq_snapshot.append_snapshot(prev)
+
+    assert [r["categoria"] for r in snap] == ["envios", "pagos"]
+    assert len(prev) == 1
+    assert snap.sha256 == faq_snapshot.read_snapshot(str(path)).sha256
+
+
+def test_append_snapshot_devuelve_none_si_se_edita_el_contenido(tmp_path):
+    path = tmp_path / "faq.csv"
+    path.write_text(CSV_INICIAL, encoding="utf-8")
+    prev = faq_snapshot.read_snapshot(str(path))
+
+    path.write_text(
+        CSV_INICIAL.replace("48 horas", "72 horas") + "pagos,¿Pago?,Tarjeta.\n",
+        encoding="utf-8",
+    )
+
+    assert faq_snapshot.append_snapshot(prev) is None
+
+
+def test_append_snapshot_detecta_una_edicion_del_mismo_tamano_lejos_del_final(tmp_path):
+    """
+    Una edición que no cambia el tamaño, seguida de un append, no se ve en
+    los últimos bytes: el prefijo se comprueba entero por su hash.
+    """
+    relleno = "".join(f"cat_{i},¿Pregunta {i}?,Respuesta larga número {i}.\n" for i in range(200))
+    path = tmp_path / "faq.csv"
+    path.write_text(CSV_INICIAL + relleno, encoding="utf-8")
+    prev = faq_snapshot.read_snapshot(str(path))
+
+    path.write_text(
+        CSV_INICIAL.replace("24 y 48", "48 y 72") + relleno + "pagos,¿Pago?,Tarjeta.\n",
+        encoding="utf-8",
+    )
+
+    assert faq_snapshot.append_snapshot(prev) is None
@@ -0,0 +1,99 @@
+# tests/test_faq_sqlite.py
+
+import threading
+
+from bot import faq_sqlite
+
+
+FAQ_ROWS = [
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+        "respuesta_base": "Entre 24 y 48 horas laborables.",
+    },
+    {
+        "categoria": "envios_canarias",
+        "pregunta_canonica": "¿Envían a Canarias?",
+        "respuesta_base": "Sí, de 5 a 7 días laborables.",
+    },
+    {
+        "categoria": "devoluciones",
+        "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?",
+        "respuesta_base": "Aceptamos devoluciones durante 30 días.",
+    },
+]
+
+
+def test_search_ordena_por_bm25_y_limita(tmp_path):
+    store = faq_sqlite.FaqSqliteStore(str(tmp_path / "faq.db"))
+    store.replace_all(FAQ_ROWS)
+
+    hits = store.search("¿Enviáis a Canarias?", k=1)
+
+    assert len(hits) == 1
+    row, score = hits[0]
+    assert row["categoria"] == "envios_canarias"
+    assert score > 0
+    assert store.search("zapatillas", k=3) == []
+    assert store.search("¿?", k=3) == []
+
+
+def test_modo_wal_y_conexion_por_hilo(tmp_path):
+    store = faq_sqlite.FaqSqliteStore(str(tmp_path / "faq.db"))
+
+    mode = store.connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+    assert store.connection() is store.connection()
+
+    otras = []
+    t = threading.Thread(target=lambda: otras.append(store.connection()))
+    t.start()
+    t.join()
+    assert otras[0] is not store.connection()
+
+
+def test_editar_una_fila_actualiza_el_indice(tmp_path):
+    """
+    Las ediciones son simples UPDATE/DELETE: el índice FTS se mantiene
+    con triggers, sin recargar todo el catálogo.
+    """
+    store = faq_sqlite.FaqSqliteStore(str(tmp_path / "faq.db"))
+    store.replace_all(FAQ_ROWS)
+
+    row_id = store.upsert_row(
+        {
+            "categoria": "pagos",
+            "pregunta_canonica": "¿Aceptáis PayPal?",
+            "respuesta_base": "Sí, aceptamos PayPal.",
+        }
+    )
+    assert store.search("paypal")[0][0]["categoria"] == "pagos"
+
+    store.upsert_row(
+        {"categoria": "pagos", "pregunta_canonica": "¿Aceptáis Bizum?", "respuesta_base": "Sí."},
+        row_id=row_id,
+    )
+    assert store.search("paypal") == []
+    assert store.search("bizum")[0][0]["categoria"] == "pagos"
+
+    store.delete_row(row_id)
+    assert store.search("bizum") == []
+    assert store.count() == 3
+
+
+def test_search_filtra_por_tipo(tmp_path):
+    """
+    Con tipo, sólo se devuelven filas de ese tipo o sin tipo.
+    """
+    store = faq_sqlite.FaqSqliteStore(str(tmp_path / "faq.db"))
+    store.replace_all(
+        [
+            {"categoria": "envio_retrasado", "pregunta_canonica": "Mi envío llega tarde", "respuesta_base": "Lo sentimos.", "tipo": "queja"},
+            {"categoria": "plazo_envio", "pregunta_canonica": "¿Cuándo llega mi envío?", "respuesta_base": "24-48h.", "tipo": "pregunta"},
+            {"categoria": "contacto", "pregunta_canonica": "Contacto sobre un envío", "respuesta_base": "Escríbenos.", "tipo": ""},
+        ]
+    )
+
+    categorias = {row["categoria"] for row, _ in store.search("envío", k=5, tipo="queja")}
+
+    assert categorias == {"envio_retrasado", "contacto"}
@@ -0,0 +1,113 @@
+# tests/test_fused_agent.py
+
+import json
+import types
+
+import pytest
+
+from bot import answer, fused_agent, graph
+from bot.models import BotState
+
+
+SALIDA = {
+    "intent": {"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": 0.95, "sentimiento": "neutral"},
+    "entidades": [{"tipo": "lugar", "valor": "España"}],
+    "respuesta": "Los envíos a España tardan 24-48 horas.",
+    "necesita_revision_humano": False,
+}
+
+HITS = [
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+        "respuesta_base": "Entre 24 y 48 horas laborables.",
+        "score": 2.1,
+    }
+]
+
+
+class FakeLLMFused:
+    def __init__(self, contenido):
+        self.contenido = contenido
+        self.llamadas = []
+        self.bind_kwargs = None
+
+    def bind(self, **kwargs):
+        self.bind_kwargs = kwargs
+        return self
+
+    def invoke(self, messages):
+        self.llamadas.append(messages)
+        return types.SimpleNamespace(content=self.contenido)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def _instalar(contenido):
+        llm = FakeLLMFused(contenido)
+        monkeypatch.setattr(fused_agent, "get_llm", lambda *a, **k: llm)
+        monkeypatch.setattr(fused_agent, "get_prompt", lambda key: f"PROMPT {key}")
+        return llm
+    return _instalar
+
+
+def test_fused_node_rellena_nlp_y_answer_con_una_llamada(fake):
+    llm = fake(json.dumps(SALIDA))
+
+    estado = fused_agent.fused_node(BotState(user_message="¿Cuánto tarda a España?", knowledge_hits=HITS))
+
+    assert len(llm.llamadas) == 1
+    assert llm.bind_kwargs == {"response_format": {"type": "json_object"}}
+    assert "Entre 24 y 48 horas laborables." in llm.llamadas[0][1].content
+    assert estado.nlp.intent.intencion == "envios"
+    assert estado.nlp.entidades[0].valor == "España"
+    assert estado.answer["respuesta"] == SALIDA["respuesta"]
+    assert estado.answer["necesita_revision_humano"] is False
+    assert estado.answer["metadata"]["num_hits"] == 1
+    assert estado.debug["answer_raw"] == SALIDA["respuesta"]
+
+
+def test_fused_node_respeta_la_revision_pedida_por_el_modelo(fake):
+    fake(json.dumps({**SALIDA, "necesita_revision_humano": True}))
+
+    estado = fused_agent.fused_node(BotState(user_message="hola", knowledge_hits=HITS))
+
+    assert estado.answer["necesita_revision_humano"] is True
+    assert estado.answer["razon"]
+
+
+def test_fused_node_salida_invalida_genera_la_respuesta_aparte(fake, monkeypatch):
+    fake("esto NO es JSON")
+    llamadas = []
+
+    def fake_answer_node(state, config=None):
+        llamadas.append(state)
+        return answer.answer_from_text(state, "Respuesta de respaldo.")
+
+    monkeypatch.setattr(fused_agent, "answer_node", fake_answer_node)
+
+    estado = fused_agent.fused_node(BotState(user_message="hola", knowledge_hits=HITS))
+
+    assert len(llamadas) == 1
+    assert estado.nlp.intent.intencion == "unknown"
+    assert estado.answer["respuesta"] == "Respuesta de respaldo."
+
+
+def test_grafo_fused_deja_el_mismo_estado_que_el_pipeline(fake, monkeypatch):
+    fake(json.dumps(SALIDA))
+    monkeypatch.setattr(
+        graph, "message_knowledge_node",
+        lambda state: state.model_copy(update={"knowledge_hits": HITS}),
+    )
+
+    app = graph.build_graph(modo="fused")
+    final = BotState.model_validate(dict(app.invoke(graph.initial_state("¿Cuánto tarda a España?"))))
+
+    assert final.nlp.intent.intencion == "envios"
+    assert final.knowledge_hits[0].categoria == "envios"
+    assert final.answer.respuesta == SALIDA["respuesta"]
+
+
+def test_build_graph_rechaza_modos_desconocidos():
+    with pytest.raises(ValueError):
+        graph.build_graph(modo="otro")
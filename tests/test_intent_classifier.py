@@ -0,0 +1,67 @@
+# tests/test_intent_classifier.py
+
+import json
+
+from bot.intent_classifier import (
+    IntentClassifier,
+    examples_from_log,
+    examples_from_rows,
+    log_classification,
+)
+
+
+ROWS = [
+    {"categoria": "envios", "pregunta_canonica": "¿Cuánto tardan los envíos a España?", "respuesta_base": "24-48h."},
+    {"categoria": "envios_canarias", "pregunta_canonica": "¿Envían a Canarias?", "respuesta_base": "Sí."},
+    {"categoria": "devoluciones", "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?", "respuesta_base": "30 días.", "tipo": "devolucion"},
+]
+
+
+def test_clasifica_con_confianza_alta_las_preguntas_de_la_faq():
+    modelo = IntentClassifier.train(examples_from_rows(ROWS))
+
+    intent = modelo.predict("cuanto tardan los envios a españa")
+    assert intent.intencion == "envios"
+    assert intent.confianza > 0.9
+
+    devolucion = modelo.predict("politica de devoluciones")
+    assert devolucion.intencion == "devoluciones"
+    assert devolucion.tipo_mensaje == "devolucion"
+
+
+def test_mensajes_fuera_de_dominio_tienen_confianza_baja():
+    modelo = IntentClassifier.train(examples_from_rows(ROWS[:1]))
+    # Con una sola intención la confianza tampoco es 1 por defecto
+    assert modelo.predict("hola, ¿qué tal el día?").confianza < 0.5
+
+
+def test_guardar_y_cargar_da_las_mismas_predicciones(tmp_path):
+    modelo = IntentClassifier.train(examples_from_rows(ROWS))
+    path = str(tmp_path / "modelo.npz")
+    modelo.save(path)
+
+    cargado = IntentClassifier.load(path)
+    textos = ["envian a canarias", "quiero devolver algo"]
+    assert cargado.predict_many(textos) == modelo.predict_many(textos)
+
+
+def test_reentrenar_desde_el_registro_del_llm(tmp_path):
+    log = str(tmp_path / "nlp_log.jsonl")
+    raw = json.dumps(
+        {
+            "intent": {"tipo_mensaje": "queja", "intencion": "pedido_retrasado", "confianza": 0.9, "sentimiento": "negativo"},
+            "entidades": [],
+        }
+    )
+    for mensaje in ("mi pedido no llega", "el pedido lleva retraso", "todavía no ha llegado mi pedido"):
+        log_classification(log, mensaje, raw)
+    log_classification(log, "basura", "esto NO es JSON")
+
+    ejemplos = examples_from_log(log)
+    assert len(ejemplos) == 3
+
+    modelo = IntentClassifier.train(examples_from_rows(ROWS) + ejemplos)
+    intent = modelo.predict("mi pedido no ha llegado todavia")
+    assert intent.intencion == "pedido_retrasado"
+    assert intent.tipo_mensaje == "queja"
+    assert intent.sentimiento == "negativo"
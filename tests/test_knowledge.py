@@ -3,6 +3,7 @@
 import types
 
 from bot import knowledge
+from bot.models import BotState, NLPResult, IntentResult, Entity, KnowledgeHit
 
 
 # ==========================
@@ -206,3 +207,396 @@ def test_knowledge_node_handles_missing_nlp_gracefully(monkeypatch):
 
     assert new_state["knowledge_hits"] == []
     assert new_state["debug"]["knowledge_hits"] == []
+
+
+# ==========================
+# Tests de FaqIndex
+# ==========================
+
+def _fake_rows(categorias):
+    return [
+        {"categoria": c, "pregunta_canonica": f"¿{c}?", "respuesta_base": f"Respuesta {c}"}
+        for c in categorias
+    ]
+
+
+def test_faq_index_same_scores_as_simple_match_score():
+    """
+    El índice debe devolver exactamente las filas con score > 0 que daría
+    el recorrido lineal con simple_match_score, y con el mismo score.
+    """
+    rows = _fake_rows(
+        ["envios", "envios_canarias", "devoluciones", "pago tarjeta", "", "pago", "tienda fisica"]
+    )
+    index = knowledge.FaqIndex(rows)
+
+    for intencion in ["envios", "envios_canarias_urgente", "pago con tarjeta", "canarias", "xx", "", "a"]:
+        esperado = [
+            (i, knowledge.simple_match_score(intencion, r["categoria"]))
+            for i, r in enumerate(rows)
+        ]
+        esperado = [e for e in esperado if e[1] > 0]
+        assert index.match(intencion) == esperado
+
+
+def test_knowledge_node_uses_index_and_keeps_top3_order(monkeypatch):
+    """
+    knowledge_node debe devolver el mismo top 3 que el recorrido lineal:
+    scores de mayor a menor y, a igualdad, en orden de fila.
+    """
+    rows = _fake_rows(["pago", "envios", "pago tarjeta", "pago movil", "pago paypal"])
+    monkeypatch.setattr(knowledge, "load_faq", lambda: rows)
+
+    state = BotState(
+        user_message="¿Puedo pagar con tarjeta?",
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje="pregunta",
+                intencion="pago",
+                confianza=0.9,
+                sentimiento="neutral",
+            )
+        ),
+    )
+
+    new_state = knowledge.knowledge_node(state)
+
+    categorias = [h["categoria"] for h in new_state.knowledge_hits]
+    assert categorias == ["pago", "pago tarjeta", "pago movil"]
+    assert all(h["score"] == 1.0 for h in new_state.knowledge_hits)
+
+
+def test_knowledge_node_bm25_usa_mensaje_del_cliente(monkeypatch):
+    """
+    Con FAQ_RETRIEVER = "bm25", la búsqueda usa el mensaje del cliente
+    además de la intención, aunque la intención no coincida con la categoría.
+    """
+    rows = [
+        {
+            "categoria": "envios",
+            "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+            "respuesta_base": "Entre 24 y 48 horas.",
+        },
+        {
+            "categoria": "envios_canarias",
+            "pregunta_canonica": "¿Envían a Canarias?",
+            "respuesta_base": "Sí, de 5 a 7 días laborables.",
+        },
+    ]
+    monkeypatch.setattr(knowledge, "load_faq", lambda: rows)
+    monkeypatch.setattr(knowledge, "FAQ_RETRIEVER", "bm25")
+
+    state = BotState(
+        user_message="¿Hacéis envíos a Canarias?",
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje="pregunta",
+                intencion="plazo_entrega_islas",
+                confianza=0.8,
+                sentimiento="neutral",
+            )
+        ),
+    )
+
+    new_state = knowledge.knowledge_node(state)
+
+    assert new_state.knowledge_hits[0]["categoria"] == "envios_canarias"
+
+
+def test_retrieve_hits_no_escribe_en_stdout(monkeypatch, capsys):
+    """
+    La salida estándar es del driver (JSONL) y del streaming de main.py.
+    """
+    monkeypatch.setattr(knowledge, "load_faq", lambda: _fake_rows(["envios", "pago"]))
+
+    knowledge.retrieve_hits("¿Cuánto tarda el envío?", "envios", retriever="categoria")
+
+    assert capsys.readouterr().out == ""
+
+
+# ==========================
+# Tests de recarga en caliente
+# ==========================
+
+def test_faq_index_extended_equivale_a_reconstruir():
+    """
+    Ampliar el índice con filas nuevas debe dar los mismos resultados que
+    construirlo de cero, sin modificar el índice original.
+    """
+    rows = _fake_rows(["envios", "pago tarjeta"])
+    index = knowledge.FaqIndex(rows)
+
+    ampliadas = rows + _fake_rows(["envios_canarias", "pago movil", "envios"])
+    extendido = index.extended(ampliadas, len(rows))
+    completo = knowledge.FaqIndex(ampliadas)
+
+    for intencion in ["envios", "pago", "canarias", "pago movil"]:
+        assert extendido.match(intencion) == completo.match(intencion)
+
+    assert index.match("pago") == [(1, 1.0)]
+
+
+def test_load_faq_no_relee_un_csv_vacio(tmp_path, monkeypatch):
+    """
+    Un CSV sin filas se carga una vez y no se vuelve a leer en cada llamada.
+    """
+    path = tmp_path / "faq.csv"
+    path.write_text("categoria,pregunta_canonica,respuesta_base\n", encoding="utf-8")
+    monkeypatch.setattr(knowledge, "FAQ_CSV_PATH", str(path))
+    monkeypatch.setattr(knowledge, "FAQ_CACHE", None)
+
+    lecturas = []
+    real_read = knowledge.read_snapshot
+    monkeypatch.setattr(
+        knowledge, "read_snapshot", lambda p: lecturas.append(p) or real_read(p)
+    )
+
+    assert knowledge.load_faq() == []
+    assert knowledge.load_faq() == []
+    assert len(lecturas) == 1
+
+
+def test_reload_faq_if_changed_publica_snapshot_nueva(tmp_path, monkeypatch):
+    """
+    Tras añadir una fila, la recarga publica una snapshot nueva con su
+    índice ya construido; la anterior no se modifica.
+    """
+    path = tmp_path / "faq.csv"
+    path.write_text(
+        "categoria,pregunta_canonica,respuesta_base\n"
+        "envios,¿Cuánto tardan los envíos?,Entre 24 y 48 horas.\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(knowledge, "FAQ_CSV_PATH", str(path))
+    monkeypatch.setattr(knowledge, "FAQ_CACHE", None)
+
+    antes = knowledge.load_faq()
+    assert knowledge.reload_faq_if_changed() is False
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("pagos,¿Cómo puedo pagar?,Con tarjeta.\n")
+
+    assert knowledge.reload_faq_if_changed() is True
+    despues = knowledge.load_faq()
+
+    assert despues is not antes
+    assert len(antes) == 1
+    assert len(despues) == 2
+    assert "categoria" in despues.indexes
+    assert knowledge.get_faq_index(despues).match("pagos") == [(1, 1.0)]
+
+
+def test_load_faq_abre_catalogo_compilado(tmp_path, monkeypatch):
+    """
+    Con FAQ_COMPILED_PATH definido, load_faq abre el catálogo compilado y
+    knowledge_node funciona igual sobre él.
+    """
+    from bot import faq_catalog
+
+    csv_path = tmp_path / "faq.csv"
+    csv_path.write_text(
+        "categoria,pregunta_canonica,respuesta_base\n"
+        "envios,¿Cuánto tardan los envíos?,Entre 24 y 48 horas.\n"
+        "pagos,¿Cómo puedo pagar?,Con tarjeta.\n",
+        encoding="utf-8",
+    )
+    out = tmp_path / "faq.faqc"
+    faq_catalog.compile_faq(str(csv_path), str(out))
+
+    monkeypatch.setattr(knowledge, "FAQ_COMPILED_PATH", str(out))
+    monkeypatch.setattr(knowledge, "FAQ_CACHE", None)
+
+    rows = knowledge.load_faq()
+    assert isinstance(rows, faq_catalog.CompiledFaq)
+
+    state = BotState(
+        user_message="¿Puedo pagar con tarjeta?",
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje="pregunta",
+                intencion="pagos",
+                confianza=0.9,
+                sentimiento="neutral",
+            )
+        ),
+    )
+    new_state = knowledge.knowledge_node(state)
+
+    assert new_state.knowledge_hits[0]["categoria"] == "pagos"
+    assert new_state.knowledge_hits[0]["respuesta_base"] == "Con tarjeta."
+
+
+def test_knowledge_node_sqlite_no_carga_la_faq(tmp_path, monkeypatch):
+    """
+    Con FAQ_RETRIEVER = "sqlite", la búsqueda va a la base SQLite (que se
+    importa del CSV la primera vez) y no se llama a load_faq.
+    """
+    csv_path = tmp_path / "faq.csv"
+    csv_path.write_text(
+        "categoria,pregunta_canonica,respuesta_base\n"
+        "envios,¿Cuánto tardan los envíos?,Entre 24 y 48 horas.\n"
+        "pagos,¿Cómo puedo pagar?,Con tarjeta o PayPal.\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(knowledge, "FAQ_CSV_PATH", str(csv_path))
+    monkeypatch.setattr(knowledge, "FAQ_SQLITE_PATH", str(tmp_path / "faq.db"))
+    monkeypatch.setattr(knowledge, "FAQ_STORE", None)
+    monkeypatch.setattr(knowledge, "FAQ_RETRIEVER", "sqlite")
+
+    def fail_load_faq():
+        raise AssertionError("load_faq no debería llamarse")
+
+    monkeypatch.setattr(knowledge, "load_faq", fail_load_faq)
+
+    state = BotState(
+        user_message="¿Puedo pagar con PayPal?",
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje="pregunta",
+                intencion="metodos_pago",
+                confianza=0.9,
+                sentimiento="neutral",
+            )
+        ),
+    )
+    new_state = knowledge.knowledge_node(state)
+
+    assert new_state.knowledge_hits[0]["categoria"] == "pagos"
+
+
+# ==========================
+# Tests de particiones por tipo
+# ==========================
+
+def _state(mensaje, intencion, tipo_mensaje, entidades=()):
+    return BotState(
+        user_message=mensaje,
+        nlp=NLPResult(
+            intent=IntentResult(
+                tipo_mensaje=tipo_mensaje,
+                intencion=intencion,
+                confianza=0.9,
+                sentimiento="neutral",
+            ),
+            entidades=[Entity(tipo=t, valor=v) for t, v in entidades],
+        ),
+    )
+
+
+TYPED_ROWS = [
+    {"categoria": "envios", "pregunta_canonica": "¿Cuánto tarda el envío?", "respuesta_base": "24-48h.", "tipo": "pregunta"},
+    {"categoria": "envios", "pregunta_canonica": "Mi envío no ha llegado", "respuesta_base": "Lo sentimos, lo revisamos.", "tipo": "queja"},
+    {"categoria": "envios_canarias", "pregunta_canonica": "Envíos a Canarias", "respuesta_base": "5-7 días.", "tipo": ""},
+]
+
+
+def test_partition_for_incluye_tipo_y_filas_sin_tipo(monkeypatch):
+    particion = knowledge.partition_for(TYPED_ROWS, "queja")
+
+    assert list(particion) == [TYPED_ROWS[1], TYPED_ROWS[2]]
+    assert list(knowledge.partition_for(TYPED_ROWS, "devolucion")) == [TYPED_ROWS[2]]
+    assert knowledge.partition_for(TYPED_ROWS, None) is TYPED_ROWS
+
+    sin_tipos = _fake_rows(["envios"])
+    assert knowledge.partition_for(sin_tipos, "queja") is sin_tipos
+
+
+def test_particiones_para_todos_los_tipos_de_una_vez():
+    filas = list(TYPED_ROWS)
+    particiones = knowledge.get_partitions(filas)
+
+    assert set(particiones) == {"pregunta", "queja", "devolucion", "otro"}
+    assert list(particiones["otro"]) == [TYPED_ROWS[2]]
+    # partition_for no añade particiones nuevas
+    knowledge.partition_for(filas, "desconocido")
+    assert set(knowledge.get_partitions(filas)) == set(particiones)
+
+
+def test_knowledge_node_busca_solo_en_la_particion(monkeypatch):
+    monkeypatch.setattr(knowledge, "load_faq", lambda: TYPED_ROWS)
+
+    new_state = knowledge.knowledge_node(_state("¡Mi pedido no llega!", "envios", "queja"))
+
+    preguntas = [h["pregunta_canonica"] for h in new_state.knowledge_hits]
+    assert "Mi envío no ha llegado" in preguntas
+    assert "¿Cuánto tarda el envío?" not in preguntas
+
+
+def test_knowledge_node_boost_por_entidades(monkeypatch):
+    """
+    A igualdad de score, la fila que menciona la entidad extraída sube.
+    """
+    monkeypatch.setattr(knowledge, "load_faq", lambda: TYPED_ROWS)
+
+    new_state = knowledge.knowledge_node(
+        _state("¿Cuánto tarda a Canarias?", "envios", "pregunta", [("lugar", "Canarias")])
+    )
+
+    assert new_state.knowledge_hits[0]["categoria"] == "envios_canarias"
+    assert new_state.knowledge_hits[0]["score"] > new_state.knowledge_hits[1]["score"]
+
+
+# ==========================
+# Tests de search_many
+# ==========================
+
+def test_search_many_devuelve_knowledge_hits_en_orden(monkeypatch):
+    rows = [
+        {"categoria": "envios", "pregunta_canonica": "¿Cuánto tardan los envíos?", "respuesta_base": "24-48h."},
+        {"categoria": "devoluciones", "pregunta_canonica": "¿Cómo devuelvo un pedido?", "respuesta_base": "30 días."},
+        {"categoria": "pagos", "pregunta_canonica": "¿Cómo pago?", "respuesta_base": "Con tarjeta."},
+    ]
+    monkeypatch.setattr(knowledge, "load_faq", lambda: rows)
+    intents = ["pagos", "devoluciones", "nada_que_ver", "envios"]
+
+    for retriever in ["categoria", "bm25", "vector"]:
+        results = knowledge.search_many(intents, k=2, retriever=retriever, chunk_size=3)
+
+        assert len(results) == len(intents)
+        assert all(isinstance(h, KnowledgeHit) for hits in results for h in hits)
+        assert results[0][0].categoria == "pagos"
+        assert results[1][0].categoria == "devoluciones"
+        assert results[3][0].categoria == "envios"
+
+
+def test_knowledge_node_fallback_trigramas_con_erratas(monkeypatch):
+    """
+    Si la intención no casa con ninguna categoría (p. ej. 'envio_canarias'
+    frente a 'envios_canarias'), se usa la búsqueda aproximada por trigramas.
+    """
+    rows = _fake_rows(["envios_canarias", "devoluciones", "pagos"])
+    monkeypatch.setattr(knowledge, "load_faq", lambda: rows)
+
+    new_state = knowledge.knowledge_node(_state("¿Enviáis a Canarias?", "envio_canarias", "pregunta"))
+    assert new_state.knowledge_hits[0]["categoria"] == "envios_canarias"
+    assert 0 < new_state.knowledge_hits[0]["score"] < 1.0
+
+    monkeypatch.setattr(knowledge, "FAQ_FUZZY", False)
+    new_state = knowledge.knowledge_node(_state("¿Enviáis a Canarias?", "envio_canarias", "pregunta"))
+    assert new_state.knowledge_hits == []
+
+
+def test_message_knowledge_node_busca_sin_nlp(monkeypatch):
+    """
+    En modo fused la recuperación va antes del NLP: con el recuperador por
+    categoría (que necesita intención) se busca con BM25 sobre el mensaje.
+    """
+    rows = [
+        {
+            "categoria": "envios",
+            "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+            "respuesta_base": "Entre 24 y 48 horas.",
+        },
+        {
+            "categoria": "envios_canarias",
+            "pregunta_canonica": "¿Envían a Canarias?",
+            "respuesta_base": "Sí, de 5 a 7 días laborables.",
+        },
+    ]
+    monkeypatch.setattr(knowledge, "load_faq", lambda: rows)
+    monkeypatch.setattr(knowledge, "FAQ_RETRIEVER", "categoria")
+
+    new_state = knowledge.message_knowledge_node(BotState(user_message="¿Hacéis envíos a Canarias?"))
+
+    assert new_state.nlp is None
+    assert new_state.knowledge_hits[0]["categoria"] == "envios_canarias"
@@ -0,0 +1,110 @@
+# tests/test_lean.py
+
+import asyncio
+
+from bot import graph, lean
+from bot.models import BotState, NLPResult
+
+
+def _nlp():
+    return NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": 0.9, "sentimiento": "neutral"}
+    )
+
+
+HIT = {"categoria": "envios", "pregunta_canonica": "¿Plazo?", "respuesta_base": "2-4 días.", "score": 0.8}
+
+
+def test_state_delta_solo_lo_que_cambia():
+    antes = BotState(user_message="hola", debug={"a": 1})
+    despues = antes.model_copy()
+    despues.nlp = _nlp()
+    despues.debug = {**antes.debug, "nlp_raw": "{}"}
+
+    delta = lean.state_delta(antes, despues)
+
+    assert set(delta) == {"nlp", "debug"}
+    assert delta["debug"] == {"nlp_raw": "{}"}
+
+
+def test_state_delta_de_un_nodo_que_no_cambia_nada():
+    antes = BotState(user_message="hola")
+    assert lean.state_delta(antes, antes) == {"debug": {}}
+
+
+def test_merge_debug():
+    assert lean.merge_debug(None, {"a": 1}) == {"a": 1}
+    assert lean.merge_debug({"a": 1}, {"b": 2}) == {"a": 1, "b": 2}
+    assert lean.merge_debug({"a": 1}, {}) == {"a": 1}
+
+
+def test_lean_node_no_valida_entre_nodos():
+    # knowledge_hits con un dict incompleto: BotState(**valores) fallaría
+    vistos = []
+
+    def nodo(state):
+        vistos.append(state.knowledge_hits)
+        return state.model_copy(update={"answer": {"respuesta": "ok"}})
+
+    delta = lean.lean_node(nodo)({"user_message": "hola", "knowledge_hits": [{"categoria": "x"}], "debug": {}})
+
+    assert vistos == [[{"categoria": "x"}]]
+    assert delta == {"answer": {"respuesta": "ok"}, "debug": {}}
+
+
+def _fakes(monkeypatch):
+    monkeypatch.setattr(
+        graph, "nlp_node", lambda s: s.model_copy(update={"nlp": _nlp(), "debug": {**s.debug, "nlp_raw": "{}"}})
+    )
+    monkeypatch.setattr(
+        graph,
+        "knowledge_node",
+        lambda s: s.model_copy(update={"knowledge_hits": [HIT], "debug": {**s.debug, "knowledge_hits": [HIT]}}),
+    )
+
+    def fake_answer(s, config=None):
+        return s.model_copy(
+            update={
+                "answer": {"respuesta": "Tarda 2-4 días.", "necesita_revision_humano": False},
+                "debug": {**s.debug, "answer_raw": "Tarda 2-4 días."},
+            }
+        )
+
+    async def fake_aanswer(s, config=None):
+        return fake_answer(s, config)
+
+    async def fake_anlp(s):
+        return graph.nlp_node(s)
+
+    async def fake_aknowledge(s):
+        return graph.knowledge_node(s)
+
+    monkeypatch.setattr(graph, "answer_node", fake_answer)
+    monkeypatch.setattr(graph, "aanswer_node", fake_aanswer)
+    monkeypatch.setattr(graph, "anlp_node", fake_anlp)
+    monkeypatch.setattr(graph, "aknowledge_node", fake_aknowledge)
+
+
+def test_grafo_lean_deja_el_mismo_estado_final(monkeypatch):
+    _fakes(monkeypatch)
+
+    normal = BotState.model_validate(dict(graph.build_graph(lean=False).invoke(graph.initial_state("hola"))))
+    ligero = BotState.model_validate(dict(graph.build_graph(lean=True).invoke(graph.initial_state("hola"))))
+
+    assert ligero == normal
+    assert ligero.debug == {"nlp_raw": "{}", "knowledge_hits": [HIT], "answer_raw": "Tarda 2-4 días."}
+
+
+def test_grafo_lean_async_publica_deltas(monkeypatch):
+    _fakes(monkeypatch)
+    app = graph.build_graph(asincrono=True, lean=True)
+
+    async def _pasos():
+        return [paso async for paso in app.astream(graph.initial_state("hola"))]
+
+    pasos = asyncio.run(_pasos())
+
+    # Cada nodo publica sólo sus campos, no el estado entero
+    assert set(pasos[0]["nlp_agent"]) == {"nlp", "debug"}
+    assert set(pasos[1]["knowledge_agent"]) == {"knowledge_hits", "debug"}
+    assert pasos[2]["answer_agent"]["debug"] == {"answer_raw": "Tarda 2-4 días."}
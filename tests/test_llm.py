@@ -0,0 +1,106 @@
+# tests/test_llm.py
+
+import asyncio
+import threading
+
+import pytest
+
+from bot import llm
+
+
+class FakeChatOpenAI:
+    instancias = 0
+
+    def __init__(self, **kwargs):
+        FakeChatOpenAI.instancias += 1
+        self.kwargs = kwargs
+
+
+@pytest.fixture
+def fake_registry(monkeypatch):
+    FakeChatOpenAI.instancias = 0
+    monkeypatch.setattr(llm, "ChatOpenAI", FakeChatOpenAI)
+    llm.close_llm_clients()
+    yield
+    llm.close_llm_clients()
+
+
+def test_get_llm_reutiliza_el_cliente_por_configuracion(fake_registry):
+    a = llm.get_llm(model="modelo-x", temperature=0)
+    b = llm.get_llm(model="modelo-x", temperature=0)
+    c = llm.get_llm(model="modelo-x", temperature=0.7)
+
+    assert a is b
+    assert a is not c
+    assert FakeChatOpenAI.instancias == 2
+
+
+def test_get_llm_comparte_el_pool_http(fake_registry):
+    a = llm.get_llm(model="modelo-x")
+    b = llm.get_llm(model="modelo-y")
+
+    assert a.kwargs["http_client"] is b.kwargs["http_client"]
+    assert a.kwargs["http_async_client"] is b.kwargs["http_async_client"]
+
+
+def test_get_llm_es_seguro_entre_hilos(fake_registry):
+    clientes = []
+
+    def worker():
+        clientes.append(llm.get_llm(model="modelo-z"))
+
+    hilos = [threading.Thread(target=worker) for _ in range(16)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert len({id(c) for c in clientes}) == 1
+    assert FakeChatOpenAI.instancias == 1
+
+
+def test_get_llm_usa_un_pool_asincrono_por_bucle(fake_registry):
+    async def _pedir():
+        a = llm.get_llm(model="modelo-x")
+        assert llm.get_llm(model="modelo-x") is a
+        return a
+
+    primero = asyncio.run(_pedir())
+    segundo = asyncio.run(_pedir())
+    fuera = llm.get_llm(model="modelo-x")
+
+    # Un segundo asyncio.run no reutiliza conexiones del bucle ya cerrado
+    assert primero is not segundo
+    assert primero.kwargs["http_async_client"] is not segundo.kwargs["http_async_client"]
+    assert fuera.kwargs["http_async_client"] is not segundo.kwargs["http_async_client"]
+    # El pool síncrono sí es único
+    assert primero.kwargs["http_client"] is segundo.kwargs["http_client"] is fuera.kwargs["http_client"]
+
+
+def test_aclose_llm_clients_cierra_el_pool_del_bucle(fake_registry):
+    async def _usar_y_cerrar():
+        cliente = llm.get_llm(model="modelo-x").kwargs["http_async_client"]
+        await llm.aclose_llm_clients()
+        return cliente
+
+    cliente = asyncio.run(_usar_y_cerrar())
+
+    assert cliente.is_closed
+
+
+def test_close_llm_clients_cierra_los_pools_asincronos(monkeypatch):
+    monkeypatch.setattr(llm, "ChatOpenAI", FakeChatOpenAI)
+    llm.close_llm_clients()
+    fuera = llm.get_llm(model="modelo-x").kwargs["http_async_client"]
+    bucle = asyncio.new_event_loop()
+
+    async def _pedir():
+        return llm.get_llm(model="modelo-x").kwargs["http_async_client"]
+
+    try:
+        dentro = bucle.run_until_complete(_pedir())
+        llm.close_llm_clients()
+    finally:
+        bucle.close()
+
+    assert fuera.is_closed and dentro.is_closed
@@ -51,7 +51,7 @@ def test_nlp_node_happy_path(monkeypatch):
     def fake_chat_openai(*args, **kwargs):
         return FakeLLMGood()
 
-    monkeypatch.setattr(nlp_agent, "ChatOpenAI", fake_chat_openai)
+    monkeypatch.setattr(nlp_agent, "get_llm", fake_chat_openai)
 
     state = {
         "user_message": "Quiero saber vuestra política de envíos para zapatillas.",
@@ -103,7 +103,7 @@ def test_nlp_node_fallback_when_json_invalid(monkeypatch):
     def fake_chat_openai(*args, **kwargs):
         return FakeLLMBadJSON()
 
-    monkeypatch.setattr(nlp_agent, "ChatOpenAI", fake_chat_openai)
+    monkeypatch.setattr(nlp_agent, "get_llm", fake_chat_openai)
 
     state = {
         "user_message": "Mensaje cualquiera.",
@@ -141,7 +141,7 @@ def test_nlp_node_uses_correct_prompt_key(monkeypatch):
     def fake_chat_openai(*args, **kwargs):
         return FakeLLMGood()
 
-    monkeypatch.setattr(nlp_agent, "ChatOpenAI", fake_chat_openai)
+    monkeypatch.setattr(nlp_agent, "get_llm", fake_chat_openai)
 
     state = {
         "user_message": "Hola, quiero hacer una consulta.",
@@ -155,3 +155,150 @@ def test_nlp_node_uses_correct_prompt_key(monkeypatch):
 
     # Comprobamos que se ha llamado con la clave correcta
     assert "nlp_agent.system" in called_keys
+
+
+# ==========================
+# Caché de clasificaciones
+# ==========================
+
+class FakeLLMContador(FakeLLMGood):
+    llamadas = 0
+
+    def invoke(self, messages):
+        FakeLLMContador.llamadas += 1
+        return super().invoke(messages)
+
+
+def _cache_limpia(monkeypatch):
+    from bot.cache import LRUTTLCache
+
+    cache = LRUTTLCache(maxsize=100, ttl=3600, namespace="nlp")
+    monkeypatch.setattr(nlp_agent, "NLP_CACHE", cache)
+    monkeypatch.setattr(nlp_agent, "NLP_CACHE_ENABLED", True)
+    monkeypatch.setattr(nlp_agent, "get_prompt", lambda key: "PROMPT_FAKE")
+    return cache
+
+
+def test_nlp_node_sirve_mensajes_equivalentes_desde_cache(monkeypatch):
+    from bot.models import BotState
+
+    cache = _cache_limpia(monkeypatch)
+    FakeLLMContador.llamadas = 0
+    monkeypatch.setattr(nlp_agent, "get_llm", lambda *a, **k: FakeLLMContador())
+
+    primero = nlp_agent.nlp_node(BotState(user_message="¿Cuánto tarda el envío?"))
+    segundo = nlp_agent.nlp_node(BotState(user_message="cuanto tarda el envio"))
+
+    assert FakeLLMContador.llamadas == 1
+    assert primero.debug["nlp_cache"] == "miss"
+    assert segundo.debug["nlp_cache"] == "hit"
+    assert segundo.nlp == primero.nlp
+    assert segundo.debug["nlp_raw"] == primero.debug["nlp_raw"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_nlp_node_no_cachea_el_fallback(monkeypatch):
+    from bot.models import BotState
+
+    cache = _cache_limpia(monkeypatch)
+    monkeypatch.setattr(nlp_agent, "get_llm", lambda *a, **k: FakeLLMBadJSON())
+
+    nlp_agent.nlp_node(BotState(user_message="Mensaje cualquiera."))
+
+    assert len(cache) == 0
+
+
+def test_nlp_cache_key_cambia_con_el_prompt():
+    a = nlp_agent.nlp_cache_key("Hola", "PROMPT v1")
+    b = nlp_agent.nlp_cache_key("Hola", "PROMPT v2")
+    assert a != b
+    assert a.endswith(":hola")
+
+
+def test_anlp_node_usa_ainvoke(monkeypatch):
+    import asyncio
+    from bot.models import BotState
+
+    class FakeLLMAsync(FakeLLMGood):
+        def invoke(self, messages):
+            raise AssertionError("el nodo async no debe bloquear con invoke")
+
+        async def ainvoke(self, messages):
+            return FakeLLMGood.invoke(self, messages)
+
+    _cache_limpia(monkeypatch)
+    monkeypatch.setattr(nlp_agent, "get_llm", lambda *a, **k: FakeLLMAsync())
+
+    estado = asyncio.run(nlp_agent.anlp_node(BotState(user_message="¿Enviáis zapatillas?")))
+
+    assert estado.nlp.intent.intencion == "shipping_policy"
+    assert estado.debug["nlp_cache"] == "miss"
+
+
+# ==========================
+# Fast path local
+# ==========================
+
+def _fast_path(monkeypatch):
+    from bot.intent_classifier import IntentClassifier, examples_from_rows
+
+    _cache_limpia(monkeypatch)
+    rows = [
+        {"categoria": "envios", "pregunta_canonica": "¿Cuánto tardan los envíos a España?"},
+        {"categoria": "devoluciones", "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?"},
+    ]
+    monkeypatch.setattr(nlp_agent, "INTENT_CLASSIFIER", IntentClassifier.train(examples_from_rows(rows)))
+    monkeypatch.setattr(nlp_agent, "NLP_FAST_PATH", True)
+    monkeypatch.setattr(nlp_agent, "NLP_FAST_PATH_THRESHOLD", 0.9)
+    monkeypatch.setattr(nlp_agent, "FAST_PATH_STATS", {"fast": 0, "llm": 0})
+    FakeLLMContador.llamadas = 0
+    monkeypatch.setattr(nlp_agent, "get_llm", lambda *a, **k: FakeLLMContador())
+
+
+def test_nlp_node_evita_el_llm_si_el_clasificador_esta_seguro(monkeypatch):
+    from bot.models import BotState
+
+    _fast_path(monkeypatch)
+
+    estado = nlp_agent.nlp_node(BotState(user_message="¿Cuánto tardan los envíos a España?"))
+
+    assert FakeLLMContador.llamadas == 0
+    assert estado.nlp.intent.intencion == "envios"
+    assert estado.debug["nlp_fast_path"] is True
+    assert nlp_agent.fast_path_stats()["rate"] == 1.0
+
+
+def test_nlp_node_usa_el_llm_si_hay_poca_confianza_o_datos_personales(monkeypatch):
+    from bot.models import BotState
+
+    _fast_path(monkeypatch)
+
+    nlp_agent.nlp_node(BotState(user_message="Hola, buenas tardes"))
+    nlp_agent.nlp_node(BotState(user_message="¿Cuánto tardan los envíos del pedido 123456?"))
+
+    assert FakeLLMContador.llamadas == 2
+    assert nlp_agent.fast_path_stats() == {"fast": 0, "llm": 2, "rate": 0.0}
+
+
+def test_nlp_node_usa_el_llm_si_el_mensaje_suena_a_queja(monkeypatch):
+    from bot.models import BotState
+
+    _fast_path(monkeypatch)
+
+    # El clasificador está seguro de la intención, pero no sabe de sentimiento
+    assert nlp_agent.get_intent_classifier().predict(
+        "¿Cuál es vuestra política de devoluciones? Fatal servicio"
+    ).confianza >= 0.9
+
+    nlp_agent.nlp_node(BotState(user_message="¿Cuál es vuestra política de devoluciones? Fatal servicio"))
+    nlp_agent.nlp_node(BotState(user_message="¿¿Cuánto tardan los envíos a España?? Llevo una semana!!"))
+
+    assert FakeLLMContador.llamadas == 2
+    assert nlp_agent.fast_path_stats()["fast"] == 0
+
+
+def test_complaint_cues():
+    assert nlp_agent.complaint_cues("Es una VERGÜENZA")
+    assert nlp_agent.complaint_cues("quiero poner una reclamación")
+    assert not nlp_agent.complaint_cues("¿Cuánto tardan los envíos a España?")
+    assert not nlp_agent.complaint_cues("¿Cuál es vuestra política de devoluciones?")
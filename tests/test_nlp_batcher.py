@@ -0,0 +1,154 @@
+# tests/test_nlp_batcher.py
+
+import asyncio
+import json
+import types
+
+import pytest
+
+from bot import nlp_agent, nlp_batcher
+from bot.models import BotState
+from bot.nlp_batcher import NLPBatcher, parse_batch_response
+from bot.resilience import CircuitBreaker, ResilientCaller
+
+
+def _nlp(intencion):
+    return {
+        "intent": {"tipo_mensaje": "pregunta", "intencion": intencion, "confianza": 0.9, "sentimiento": "neutral"},
+        "entidades": [],
+    }
+
+
+class FakeLLMLotes:
+    """Responde a los lotes con un array JSON y a los mensajes sueltos con un objeto."""
+
+    def __init__(self, romper_lote=False, romper_id=None):
+        self.llamadas = []
+        self.romper_lote = romper_lote
+        self.romper_id = romper_id
+
+    async def ainvoke(self, messages):
+        contenido = messages[-1].content
+        self.llamadas.append(contenido)
+        try:
+            lote = json.loads(contenido)
+        except json.JSONDecodeError:
+            return types.SimpleNamespace(content=json.dumps(_nlp(f"suelto:{contenido}")))
+
+        if self.romper_lote:
+            return types.SimpleNamespace(content="[esto no es JSON")
+        items = []
+        for item in lote:
+            if item["id"] == self.romper_id:
+                items.append({"id": item["id"], "intent": "roto"})
+            else:
+                items.append({"id": item["id"], **_nlp(f"lote:{item['mensaje']}")})
+        # Orden invertido: el reparto debe hacerse por id
+        return types.SimpleNamespace(content=json.dumps(items[::-1]))
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    def _instalar(**kwargs):
+        llm = FakeLLMLotes(**kwargs)
+        monkeypatch.setattr(nlp_batcher, "get_llm", lambda *a, **k: llm)
+        monkeypatch.setattr(nlp_batcher, "get_prompt", lambda key: "PROMPT_FAKE")
+        return llm
+    return _instalar
+
+
+def _clasificar(batcher, mensajes):
+    async def _todo():
+        return await asyncio.gather(*(batcher.classify(m) for m in mensajes))
+    return [json.loads(r)["intent"]["intencion"] for r in asyncio.run(_todo())]
+
+
+def test_agrupa_los_mensajes_concurrentes_en_una_llamada(fake_llm):
+    llm = fake_llm()
+    batcher = NLPBatcher(max_items=10, max_wait_ms=5)
+
+    intenciones = _clasificar(batcher, ["a", "b", "c"])
+
+    assert intenciones == ["lote:a", "lote:b", "lote:c"]
+    assert len(llm.llamadas) == 1
+    assert batcher.stats == {"batches": 1, "items": 3, "fallbacks": 0, "degraded": 0}
+
+
+def test_corta_el_lote_al_llegar_al_maximo(fake_llm):
+    llm = fake_llm()
+    batcher = NLPBatcher(max_items=2, max_wait_ms=1000)
+
+    assert _clasificar(batcher, ["a", "b", "c", "d"]) == ["lote:a", "lote:b", "lote:c", "lote:d"]
+    assert len(llm.llamadas) == 2
+
+
+def test_reintenta_uno_a_uno_si_el_lote_es_invalido(fake_llm):
+    llm = fake_llm(romper_lote=True)
+    batcher = NLPBatcher(max_items=10, max_wait_ms=5)
+
+    assert _clasificar(batcher, ["a", "b"]) == ["suelto:a", "suelto:b"]
+    assert len(llm.llamadas) == 3
+    assert batcher.stats["fallbacks"] == 2
+
+
+def test_solo_reintenta_el_elemento_mal_formado(fake_llm):
+    llm = fake_llm(romper_id=1)
+    batcher = NLPBatcher(max_items=10, max_wait_ms=5)
+
+    assert _clasificar(batcher, ["a", "b", "c"]) == ["lote:a", "suelto:b", "lote:c"]
+    assert len(llm.llamadas) == 2
+
+
+def test_parse_batch_response_acepta_array_envuelto():
+    raw = json.dumps({"resultados": [_nlp("x"), _nlp("y")]})
+    resultados = parse_batch_response(raw, 3)
+    assert [json.loads(r)["intent"]["intencion"] for r in resultados[:2]] == ["x", "y"]
+    assert resultados[2] is None
+
+
+def test_lote_sin_llm_degrada_todas_las_conversaciones(fake_llm, monkeypatch):
+    llm = fake_llm()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(nlp_batcher, "get_caller", lambda nombre: ResilientCaller(nombre, deadline=1.0, breaker=breaker))
+    monkeypatch.setattr(nlp_agent, "get_prompt", lambda key: "PROMPT_FAKE")
+    monkeypatch.setattr(nlp_agent, "NLP_BATCHING", True)
+    monkeypatch.setattr(nlp_agent, "NLP_CACHE_ENABLED", False)
+    batcher = NLPBatcher(max_items=10, max_wait_ms=5)
+    monkeypatch.setattr(nlp_agent, "get_nlp_batcher", lambda: batcher)
+
+    async def _todo():
+        return await asyncio.gather(*(nlp_agent.anlp_node(BotState(user_message=m)) for m in ["a", "b", "c"]))
+
+    estados = asyncio.run(_todo())
+
+    assert [e.nlp.intent.intencion for e in estados] == ["unknown"] * 3
+    assert all("nlp_degraded" in e.debug for e in estados)
+    # Ni el lote ni los reintentos uno a uno llegan al proveedor
+    assert llm.llamadas == []
+    assert batcher.stats["degraded"] == 3 and batcher.stats["fallbacks"] == 0
+
+
+def test_lote_fuera_de_plazo_se_clasifica_uno_a_uno(fake_llm, monkeypatch):
+    llm = fake_llm()
+    original = llm.ainvoke
+
+    async def lento(messages):
+        if messages[-1].content.startswith("["):
+            await asyncio.sleep(0.5)
+        return await original(messages)
+
+    llm.ainvoke = lento
+    monkeypatch.setattr(nlp_batcher, "get_caller", lambda nombre: ResilientCaller(nombre, deadline=5.0, max_retries=0))
+    monkeypatch.setattr(nlp_batcher, "batch_deadline", lambda n: 0.05)
+    batcher = NLPBatcher(max_items=10, max_wait_ms=5)
+
+    # DeadlineExceeded del lote no degrada: cada mensaje va por su cuenta
+    assert _clasificar(batcher, ["a", "b"]) == ["suelto:a", "suelto:b"]
+    assert batcher.stats["fallbacks"] == 2 and batcher.stats["degraded"] == 0
+
+
+def test_batch_deadline_crece_con_el_lote():
+    from bot.resilience import batch_deadline
+
+    assert batch_deadline(1) < batch_deadline(2) < batch_deadline(16)
@@ -0,0 +1,58 @@
+# tests/test_prompt_store.py
+
+import types
+
+from bot import prompt_store
+from bot.prompt_store import compile_template, prefix_cache_stats, record_prefix_cache
+
+
+CAMPOS = (("CONTEXTO", "contexto"), ("MENSAJE", "mensaje"))
+
+
+def test_el_texto_fijo_va_primero_y_los_campos_al_final():
+    plantilla = compile_template("prueba", "SISTEMA", "\nINSTRUCCIONES FIJAS", CAMPOS)
+
+    sistema, usuario = plantilla.messages(contexto="ctx", mensaje="hola")
+
+    assert sistema.content == "SISTEMA\nINSTRUCCIONES FIJAS"
+    assert usuario.content == "CONTEXTO:\nctx\n\nMENSAJE:\nhola"
+
+
+def test_dos_peticiones_comparten_todo_el_prefijo_fijo():
+    plantilla = compile_template("prueba", "SISTEMA", "\nINSTRUCCIONES", CAMPOS)
+    a = plantilla.messages(contexto="ctx", mensaje="uno")
+    b = plantilla.messages(contexto="ctx", mensaje="otro distinto")
+
+    assert a[0].content == b[0].content
+    assert b[1].content.startswith("CONTEXTO:\nctx\n\nMENSAJE:\n")
+
+
+def test_version_estable_y_cambia_con_el_texto_fijo():
+    v1 = compile_template("prueba", "SISTEMA", "\nA", CAMPOS).version
+    assert compile_template("prueba", "SISTEMA", "\nA", CAMPOS).version == v1
+    assert compile_template("prueba", "SISTEMA", "\nB", CAMPOS).version != v1
+    assert compile_template("prueba", "OTRO", "\nA", CAMPOS).version != v1
+
+
+def test_los_valores_con_llaves_no_se_interpretan():
+    plantilla = compile_template("prueba", "S", "", (("", "mensaje"),))
+    assert plantilla.render(mensaje='{"a": "{b}"}') == '{"a": "{b}"}'
+
+
+def test_estadisticas_de_prefix_cache_desde_los_metadatos(monkeypatch):
+    monkeypatch.setattr(prompt_store, "PREFIX_CACHE_STATS", {})
+    plantilla = compile_template("stats", "S", "", (("", "mensaje"),))
+
+    def respuesta(prompt_tokens, cached):
+        usage = {"prompt_tokens": prompt_tokens, "prompt_tokens_details": {"cached_tokens": cached}}
+        return types.SimpleNamespace(content="x", response_metadata={"token_usage": usage})
+
+    record_prefix_cache(plantilla, respuesta(2000, 0))
+    record_prefix_cache(plantilla, respuesta(2000, 1536))
+    # Respuestas sin metadatos de uso no cuentan
+    record_prefix_cache(plantilla, types.SimpleNamespace(content="x"))
+
+    stats = prefix_cache_stats()["stats"]
+    assert stats["calls"] == 2
+    assert stats["cache_hits"] == 1
+    assert stats["cached_ratio"] == 1536 / 4000
@@ -0,0 +1,353 @@
+# tests/test_resilience.py
+
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+from bot import answer, nlp_agent
+from bot.models import BotState, NLPResult
+from bot.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    LLMUnavailableError,
+    ResilientCaller,
+    is_retryable,
+)
+
+
+class ErrorTransitorio(Exception):
+    status_code = 503
+
+
+class ErrorPermanente(Exception):
+    status_code = 400
+
+
+class StubLLM:
+    """
+    Proveedor local: cada llamada consume el siguiente paso del guion, que es
+    una latencia en segundos o una excepción.
+    """
+
+    def __init__(self, guion, contenido="ok"):
+        self.guion = list(guion)
+        self.contenido = contenido
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def _paso(self):
+        with self._lock:
+            self.llamadas += 1
+            n = self.llamadas
+            paso = self.guion.pop(0) if self.guion else 0
+        return n, paso
+
+    def invoke(self, messages=None):
+        n, paso = self._paso()
+        if isinstance(paso, Exception):
+            raise paso
+        time.sleep(paso)
+        return types.SimpleNamespace(content=f"{self.contenido}-{n}")
+
+    async def ainvoke(self, messages=None):
+        n, paso = self._paso()
+        if isinstance(paso, Exception):
+            raise paso
+        await asyncio.sleep(paso)
+        return types.SimpleNamespace(content=f"{self.contenido}-{n}")
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _caller(**kwargs):
+    esperas = []
+    opciones = dict(deadline=2.0, max_retries=2, sleep=esperas.append, breaker=CircuitBreaker(5, 30))
+    opciones.update(kwargs)
+    return ResilientCaller("test", **opciones), esperas
+
+
+def test_is_retryable():
+    assert is_retryable(ErrorTransitorio())
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionError())
+    assert not is_retryable(ErrorPermanente())
+    assert not is_retryable(ValueError())
+
+
+def test_reintenta_errores_transitorios_con_backoff():
+    llm = StubLLM([ErrorTransitorio(), ErrorTransitorio()])
+    caller, esperas = _caller()
+
+    assert caller.call(llm.invoke).content == "ok-3"
+    assert llm.llamadas == 3
+    assert len(esperas) == 2
+    # Full jitter: cada espera está acotada por base * 2^intento
+    assert 0 <= esperas[0] <= 0.25 and 0 <= esperas[1] <= 0.5
+
+
+def test_error_no_reintentable_se_propaga_sin_reintentar():
+    llm = StubLLM([ErrorPermanente()])
+    caller, esperas = _caller()
+
+    with pytest.raises(ErrorPermanente):
+        caller.call(llm.invoke)
+    assert llm.llamadas == 1
+    assert esperas == []
+
+
+def test_agotar_reintentos_lanza_llm_unavailable():
+    llm = StubLLM([ErrorTransitorio()] * 3)
+    caller, _ = _caller()
+
+    with pytest.raises(LLMUnavailableError):
+        caller.call(llm.invoke)
+    assert caller.stats["failures"] == 1
+
+
+def test_deadline_corta_una_llamada_lenta():
+    llm = StubLLM([1.0])
+    caller, _ = _caller(deadline=0.05, max_retries=0)
+
+    t0 = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(llm.invoke)
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_hedging_usa_la_primera_respuesta():
+    llm = StubLLM([0.5, 0.0])
+    caller, _ = _caller(hedge=True, hedge_min_samples=3)
+    for _ in range(3):
+        caller.latencias.add(0.02)
+
+    t0 = time.monotonic()
+    assert caller.call(llm.invoke).content == "ok-2"
+    assert time.monotonic() - t0 < 0.4
+    assert caller.stats["hedges"] == 1
+
+
+def test_hedging_desactivado_sin_muestras_suficientes():
+    llm = StubLLM([0.05])
+    caller, _ = _caller(hedge=True, hedge_min_samples=3)
+
+    assert caller.call(llm.invoke).content == "ok-1"
+    assert caller.stats["hedges"] == 0
+    assert llm.llamadas == 1
+
+
+def test_acall_hedging_y_reintentos():
+    async def _noop(_):
+        return None
+
+    llm = StubLLM([ErrorTransitorio(), 0.5, 0.0])
+    caller, _ = _caller(hedge=True, hedge_min_samples=1, asleep=_noop)
+    caller.latencias.add(0.02)
+
+    resultado = asyncio.run(caller.acall(llm.ainvoke))
+    assert resultado.content == "ok-3"
+    assert caller.stats == {**caller.stats, "retries": 1, "hedges": 1}
+
+
+def test_acall_deadline():
+    llm = StubLLM([1.0])
+    caller, _ = _caller(deadline=0.05, max_retries=0)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(caller.acall(llm.ainvoke))
+
+
+def test_circuit_breaker_abre_y_se_recupera():
+    reloj = Reloj()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=reloj)
+    llm = StubLLM([ErrorTransitorio(), ErrorTransitorio()])
+    caller, _ = _caller(breaker=breaker, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            caller.call(llm.invoke)
+    assert breaker.state == "open"
+
+    # Abierto: falla al instante, sin llamar al proveedor
+    with pytest.raises(CircuitOpenError):
+        caller.call(llm.invoke)
+    assert llm.llamadas == 2
+
+    reloj.t = 11
+    assert breaker.state == "half_open"
+    assert caller.call(llm.invoke).content == "ok-3"
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_half_open_reabre_con_un_fallo():
+    reloj = Reloj()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=reloj)
+    breaker.record_failure()
+    reloj.t = 11
+    assert breaker.state == "half_open"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def _caller_caido():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    return ResilientCaller("caido", deadline=1.0, breaker=breaker)
+
+
+def test_answer_node_degrada_con_el_mejor_hit(monkeypatch):
+    monkeypatch.setattr(answer, "get_prompt", lambda key: "SYSTEM_PROMPT_FAKE")
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: StubLLM([]))
+    monkeypatch.setattr(answer, "get_caller", lambda nombre: _caller_caido())
+    monkeypatch.setattr(answer, "ANSWER_CACHE_ENABLED", False)
+
+    nlp = NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": "envio", "confianza": 0.9, "sentimiento": "neutral"}
+    )
+    hit = {"categoria": "envios", "pregunta_canonica": "¿Plazo?", "respuesta_base": "De 2 a 4 días.", "score": 1.0}
+    state = BotState(user_message="¿Cuándo llega?", nlp=nlp, knowledge_hits=[hit])
+
+    out = answer.answer_node(state)
+    assert out.answer["respuesta"] == "De 2 a 4 días."
+    assert out.answer["necesita_revision_humano"] is True
+    assert "answer_degraded" in out.debug
+
+    sin_hits = answer.answer_node(BotState(user_message="hola", nlp=nlp))
+    assert sin_hits.answer["respuesta"] == answer.DEGRADED_ANSWER
+
+
+def test_nlp_node_degrada_a_intencion_por_defecto(monkeypatch):
+    monkeypatch.setattr(nlp_agent, "get_prompt", lambda key: "PROMPT_FAKE")
+    monkeypatch.setattr(nlp_agent, "get_llm", lambda *a, **k: StubLLM([]))
+    monkeypatch.setattr(nlp_agent, "get_caller", lambda nombre: _caller_caido())
+    monkeypatch.setattr(nlp_agent, "NLP_CACHE_ENABLED", False)
+
+    out = nlp_agent.nlp_node(BotState(user_message="hola"))
+    assert out.nlp.intent.intencion == "unknown"
+    assert "nlp_degraded" in out.debug
+
+
+class StreamLento:
+    """
+    LLM en streaming que emite un token cada `pausa` segundos.
+    """
+
+    def __init__(self, tokens, pausa):
+        self.tokens = tokens
+        self.pausa = pausa
+        self.cerrado = threading.Event()
+
+    def stream(self, messages=None):
+        try:
+            for t in self.tokens:
+                time.sleep(self.pausa)
+                yield types.SimpleNamespace(content=t)
+        finally:
+            self.cerrado.set()
+
+    async def astream(self, messages=None):
+        for t in self.tokens:
+            await asyncio.sleep(self.pausa)
+            yield types.SimpleNamespace(content=t)
+
+
+def _streaming_con_deadline(monkeypatch, llm):
+    monkeypatch.setattr(answer, "get_prompt", lambda key: "SYSTEM_PROMPT_FAKE")
+    monkeypatch.setattr(answer, "get_llm", lambda *a, **k: llm)
+    caller = ResilientCaller("stream", deadline=0.25, breaker=CircuitBreaker(5, 30))
+    monkeypatch.setattr(answer, "get_caller", lambda nombre: caller)
+    monkeypatch.setattr(answer, "ANSWER_CACHE_ENABLED", False)
+    nlp = NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": "envio", "confianza": 0.9, "sentimiento": "neutral"}
+    )
+    hit = {"categoria": "envios", "pregunta_canonica": "¿Plazo?", "respuesta_base": "RESPUESTA FAQ", "score": 1.0}
+    return BotState(user_message="¿Cuándo llega?", nlp=nlp, knowledge_hits=[hit])
+
+
+def test_streaming_abandonado_no_manda_mas_tokens(monkeypatch):
+    llm = StreamLento(["uno ", "dos ", "tres ", "cuatro ", "cinco "], pausa=0.1)
+    state = _streaming_con_deadline(monkeypatch, llm)
+    recibidos = []
+
+    out = answer.answer_node(state, {"configurable": {"on_token": recibidos.append}})
+
+    assert out.answer["respuesta"] == "RESPUESTA FAQ"
+    assert out.debug["answer_stream_aborted"] is True
+    assert recibidos[-1] == "\nRESPUESTA FAQ"
+    # El hilo abandonado termina cerrando el stream sin reenviar nada más
+    assert llm.cerrado.wait(2)
+    assert recibidos[-1] == "\nRESPUESTA FAQ"
+    assert "tres " not in recibidos
+
+
+def test_astreaming_abandonado_manda_la_respuesta_degradada(monkeypatch):
+    llm = StreamLento(["uno ", "dos ", "tres ", "cuatro "], pausa=0.1)
+    state = _streaming_con_deadline(monkeypatch, llm)
+    recibidos = []
+
+    async def _run():
+        out = await answer.aanswer_node(state, {"configurable": {"on_token": recibidos.append}})
+        await asyncio.sleep(0.3)
+        return out
+
+    out = asyncio.run(_run())
+
+    assert out.answer["respuesta"] == "RESPUESTA FAQ"
+    assert recibidos[-1] == "\nRESPUESTA FAQ"
+    assert "tres " not in recibidos
+
+
+def test_circuit_breaker_half_open_deja_pasar_una_sola_prueba():
+    reloj = Reloj()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=reloj)
+    breaker.record_failure()
+    reloj.t = 11
+
+    assert breaker.acquire() == "probe"
+    # Mientras la prueba está en vuelo, el resto se rechaza
+    assert breaker.acquire() is None
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.acquire() == "closed"
+
+
+def test_half_open_rechaza_llamadas_concurrentes_a_la_prueba():
+    reloj = Reloj()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=reloj)
+    breaker.record_failure()
+    reloj.t = 11
+    llm = StubLLM([0.3])
+    caller = ResilientCaller("sonda", deadline=2.0, max_retries=0, breaker=breaker)
+
+    prueba = threading.Thread(target=caller.call, args=(llm.invoke,))
+    prueba.start()
+    time.sleep(0.05)
+    with pytest.raises(CircuitOpenError):
+        caller.call(llm.invoke)
+    prueba.join()
+
+    assert llm.llamadas == 1
+    assert breaker.state == "closed"
+
+
+def test_prueba_con_error_no_transitorio_se_libera():
+    reloj = Reloj()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=reloj)
+    breaker.record_failure()
+    reloj.t = 11
+    caller = ResilientCaller("sonda", deadline=2.0, max_retries=0, breaker=breaker)
+
+    with pytest.raises(ErrorPermanente):
+        caller.call(StubLLM([ErrorPermanente()]).invoke)
+
+    assert breaker.acquire() == "probe"
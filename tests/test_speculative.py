@@ -0,0 +1,136 @@
+# tests/test_speculative.py
+
+import asyncio
+import threading
+import time
+
+from bot import graph, speculative
+from bot.models import BotState, Entity, NLPResult
+
+
+def _nlp(intencion, entidades=()):
+    return NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": intencion, "confianza": 0.9, "sentimiento": "neutral"},
+        entidades=[Entity(tipo="lugar", valor=v) for v in entidades],
+    )
+
+
+def _hit(categoria, score, respuesta="..."):
+    return {"categoria": categoria, "pregunta_canonica": f"¿{categoria}?", "respuesta_base": respuesta, "score": score}
+
+
+def test_rerank_sube_la_categoria_de_la_intencion():
+    hits = [_hit("pagos", 2.0), _hit("envios", 1.5), _hit("devoluciones", 1.0)]
+
+    out = speculative.rerank_hits(hits, _nlp("envios"))
+
+    assert [h["categoria"] for h in out] == ["envios", "pagos", "devoluciones"]
+    assert out[0]["score"] == 1.5 * (1 + speculative.SPECULATIVE_INTENT_BOOST)
+
+
+def test_rerank_aplica_boost_por_entidades():
+    hits = [_hit("envios", 2.0, "Plazo estándar."), _hit("envios islas", 1.8, "A Canarias, 5 días.")]
+
+    out = speculative.rerank_hits(hits, _nlp("otra cosa", ["Canarias"]))
+
+    assert out[0]["categoria"] == "envios islas"
+
+
+def test_rerank_sin_nlp_conserva_el_orden():
+    hits = [_hit("a", 3.0), _hit("b", 2.0), _hit("c", 1.0), _hit("d", 0.5)]
+    assert speculative.rerank_hits(hits, None) == hits[:3]
+
+
+def test_merge_usa_especulativos_si_la_categoria_no_encuentra_nada(monkeypatch):
+    monkeypatch.setattr(speculative, "FAQ_RETRIEVER", "categoria")
+    monkeypatch.setattr(speculative, "retrieve_hits", lambda *a, **k: [])
+    state = BotState(user_message="hola", nlp=_nlp("envios"), speculative_hits=[_hit("envios", 1.2)])
+
+    out = speculative.merge_knowledge_node(state)
+
+    assert out.knowledge_hits[0]["categoria"] == "envios"
+    assert out.speculative_hits == []
+    assert out.debug["knowledge_source"] == "speculative"
+
+
+def test_merge_con_bm25_no_vuelve_a_buscar(monkeypatch):
+    def _no_buscar(*a, **k):
+        raise AssertionError("no debería volver a buscar")
+
+    monkeypatch.setattr(speculative, "FAQ_RETRIEVER", "bm25")
+    monkeypatch.setattr(speculative, "retrieve_hits", _no_buscar)
+    state = BotState(
+        user_message="hola", nlp=_nlp("envios"), speculative_hits=[_hit("pagos", 2.0), _hit("envios", 1.5)]
+    )
+
+    out = speculative.merge_knowledge_node(state)
+
+    assert [h["categoria"] for h in out.debug["knowledge_hits"]] == ["envios", "pagos"]
+
+
+def _instalar_fakes(monkeypatch, espera=0.2):
+    """NLP y búsqueda lentas; registra qué hilos se solapan."""
+    en_vuelo = {"n": 0, "max": 0}
+    lock = threading.Lock()
+
+    def _entrar():
+        with lock:
+            en_vuelo["n"] += 1
+            en_vuelo["max"] = max(en_vuelo["max"], en_vuelo["n"])
+
+    def _salir():
+        with lock:
+            en_vuelo["n"] -= 1
+
+    def fake_nlp(state):
+        _entrar()
+        time.sleep(espera)
+        _salir()
+        return state.model_copy(update={"nlp": _nlp("envios"), "debug": {**state.debug, "nlp_raw": "{}"}})
+
+    async def fake_anlp(state):
+        _entrar()
+        await asyncio.sleep(espera)
+        _salir()
+        return state.model_copy(update={"nlp": _nlp("envios"), "debug": {**state.debug, "nlp_raw": "{}"}})
+
+    def fake_retrieve(consulta, *a, **k):
+        _entrar()
+        time.sleep(espera)
+        _salir()
+        return [_hit("pagos", 2.0), _hit("envios", 1.5)]
+
+    monkeypatch.setattr(speculative, "nlp_node", fake_nlp)
+    monkeypatch.setattr(speculative, "anlp_node", fake_anlp)
+    monkeypatch.setattr(speculative, "retrieve_hits", fake_retrieve)
+    monkeypatch.setattr(speculative, "FAQ_RETRIEVER", "bm25")
+    monkeypatch.setattr(graph, "answer_node", lambda s: s.model_copy(update={"answer": {"respuesta": "ok"}}))
+
+    async def fake_aanswer(s):
+        return s.model_copy(update={"answer": {"respuesta": "ok"}})
+
+    monkeypatch.setattr(graph, "aanswer_node", fake_aanswer)
+    return en_vuelo
+
+
+def test_grafo_speculative_busca_en_paralelo_con_el_nlp(monkeypatch):
+    en_vuelo = _instalar_fakes(monkeypatch)
+
+    app = graph.build_graph(modo="speculative")
+    final = BotState.model_validate(dict(app.invoke(graph.initial_state("¿Cuánto tarda?"))))
+
+    assert en_vuelo["max"] == 2
+    assert final.nlp.intent.intencion == "envios"
+    assert final.knowledge_hits[0].categoria == "envios"
+    assert final.answer.respuesta == "ok"
+    assert final.debug["nlp_raw"] == "{}"
+
+
+def test_grafo_speculative_async(monkeypatch):
+    en_vuelo = _instalar_fakes(monkeypatch)
+
+    app = graph.build_graph(asincrono=True, modo="speculative")
+    final = BotState.model_validate(dict(asyncio.run(app.ainvoke(graph.initial_state("¿Cuánto tarda?")))))
+
+    assert en_vuelo["max"] == 2
+    assert final.knowledge_hits[0].categoria == "envios"
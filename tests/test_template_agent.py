@@ -0,0 +1,121 @@
+# tests/test_template_agent.py
+
+import pytest
+
+from bot import graph, template_agent
+from bot.models import BotState, Entity, NLPResult
+
+
+def _nlp(confianza=0.95, sentimiento="neutral", entidades=None):
+    return NLPResult(
+        intent={"tipo_mensaje": "pregunta", "intencion": "envios", "confianza": confianza, "sentimiento": sentimiento},
+        entidades=[Entity(tipo=t, valor=v) for t, v in (entidades or {}).items()],
+    )
+
+
+def _hit(score=1.0, respuesta="Los envíos tardan de 2 a 4 días.", exacto=True):
+    return {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Plazo?",
+        "respuesta_base": respuesta,
+        "score": score,
+        "exacto": exacto,
+    }
+
+
+@pytest.fixture(autouse=True)
+def _plantillas(monkeypatch):
+    monkeypatch.setattr(template_agent, "TEMPLATE_FAST_PATH", True)
+    monkeypatch.setattr(template_agent, "TEMPLATE_MIN_CONFIDENCE", 0.9)
+    monkeypatch.setattr(template_agent, "TEMPLATE_GREETING", "Hola {nombre},")
+    monkeypatch.setattr(template_agent, "TEMPLATE_CLOSING", "¡Un saludo!")
+    monkeypatch.setitem(template_agent.TEMPLATE_STATS, "template", 0)
+    monkeypatch.setitem(template_agent.TEMPLATE_STATS, "llm", 0)
+
+
+def test_fill_sustituye_entidades_y_detecta_huecos_vacios():
+    assert template_agent.fill("Pedido {numero_pedido} enviado", {"numero_pedido": "1234"}) == "Pedido 1234 enviado"
+    assert template_agent.fill("Pedido {numero_pedido} enviado", {}) is None
+    assert template_agent.fill("Sin huecos", {}) == "Sin huecos"
+
+
+@pytest.mark.parametrize(
+    "state, esperado",
+    [
+        (BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit()]), "template_agent"),
+        # Más de un hit: el LLM elige/combina
+        (BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit(), _hit()]), "answer_agent"),
+        (BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit(score=0.5, exacto=False)]), "answer_agent"),
+        # Score >= 1.0 de BM25 o por boost de entidades: no es una coincidencia exacta
+        (BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit(score=1.37, exacto=False)]), "answer_agent"),
+        (BotState(user_message="m", nlp=_nlp(confianza=0.6), knowledge_hits=[_hit()]), "answer_agent"),
+        (BotState(user_message="m", nlp=_nlp(sentimiento="negativo"), knowledge_hits=[_hit()]), "answer_agent"),
+        # Hueco sin entidad con la que rellenarlo
+        (BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit(respuesta="Tu pedido {numero_pedido}.")]), "answer_agent"),
+        (BotState(user_message="m", knowledge_hits=[_hit()]), "answer_agent"),
+    ],
+)
+def test_route_after_knowledge(state, esperado):
+    assert template_agent.route_after_knowledge(state) == esperado
+
+
+def test_route_desactivado(monkeypatch):
+    monkeypatch.setattr(template_agent, "TEMPLATE_FAST_PATH", False)
+    state = BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit()])
+    assert template_agent.route_after_knowledge(state) == "answer_agent"
+
+
+def test_template_node_monta_la_respuesta_de_la_faq():
+    state = BotState(
+        user_message="¿Dónde está mi pedido?",
+        nlp=_nlp(entidades={"nombre": "Ana", "numero_pedido": "98765"}),
+        knowledge_hits=[_hit(respuesta="Tu pedido {numero_pedido} sale hoy.")],
+    )
+    recibidos = []
+
+    out = template_agent.template_node(state, {"configurable": {"on_token": recibidos.append}})
+
+    assert out.answer["respuesta"] == "Hola Ana, Tu pedido 98765 sale hoy. ¡Un saludo!"
+    assert out.answer["necesita_revision_humano"] is False
+    assert out.debug["answer_template"] is True
+    assert recibidos == [out.answer["respuesta"]]
+
+
+def test_saludo_sin_entidad_se_omite():
+    state = BotState(user_message="m", nlp=_nlp(), knowledge_hits=[_hit()])
+    assert template_agent.render_answer(state) == "Los envíos tardan de 2 a 4 días. ¡Un saludo!"
+
+
+def test_grafo_salta_el_llm_con_hit_exacto(monkeypatch):
+    def _no_llamar(*a, **k):
+        raise AssertionError("answer_node no debería ejecutarse")
+
+    monkeypatch.setattr(graph, "nlp_node", lambda s: s.model_copy(update={"nlp": _nlp()}))
+    monkeypatch.setattr(graph, "knowledge_node", lambda s: s.model_copy(update={"knowledge_hits": [_hit()]}))
+    monkeypatch.setattr(graph, "answer_node", _no_llamar)
+
+    final = BotState.model_validate(dict(graph.build_graph(modo="pipeline").invoke(graph.initial_state("m"))))
+
+    assert final.answer.respuesta == "Los envíos tardan de 2 a 4 días. ¡Un saludo!"
+    stats = template_agent.template_stats()
+    assert stats["template"] == 1 and stats["rate"] == 1.0
+
+
+def test_retrieve_hits_solo_marca_exacta_la_coincidencia_fuerte(monkeypatch):
+    from bot import knowledge
+
+    filas = [
+        {"categoria": "envios", "pregunta_canonica": "¿Plazo?", "respuesta_base": "2-4 días a Canarias."},
+        {"categoria": "politica de envios", "pregunta_canonica": "¿Política?", "respuesta_base": "Envío gratis a Canarias."},
+    ]
+    monkeypatch.setattr(knowledge, "load_faq", lambda: filas)
+    monkeypatch.setattr(knowledge, "FAQ_ENTITY_BOOST", 0.5)
+    canarias = [Entity(tipo="lugar", valor="Canarias")]
+
+    fuerte = knowledge.retrieve_hits("m", "envios", entidades=canarias, retriever="categoria")
+    assert [h["exacto"] for h in fuerte] == [True, True]
+
+    # 2/3 tokens x 1.5 de boost = 1.0, pero sigue siendo una coincidencia parcial
+    parcial = knowledge.retrieve_hits("m", "politica de devoluciones", entidades=canarias, retriever="categoria")
+    assert parcial[0]["score"] == pytest.approx(1.0)
+    assert parcial[0]["exacto"] is False
@@ -0,0 +1,36 @@
+# tests/test_trigram.py
+
+from bot import trigram
+
+
+FAQ_ROWS = [
+    {"categoria": "envios_canarias", "pregunta_canonica": "¿Envían a Canarias?"},
+    {"categoria": "devoluciones", "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?"},
+    {"categoria": "envios", "pregunta_canonica": "¿Cuánto tardan los envíos a España?"},
+    {"categoria": "pagos", "pregunta_canonica": "¿Cómo puedo pagar?"},
+]
+
+
+def test_normalize_for_trigrams():
+    """
+    Minúsculas, sin tildes y '_' como separador.
+    """
+    assert trigram.normalize_for_trigrams("Envíos_Canarias") == "envios canarias"
+    assert trigram.normalize_for_trigrams("¿Devolución?") == "devolucion"
+
+
+def test_similar_tolera_erratas_plurales_y_tildes():
+    index = trigram.TrigramIndex(FAQ_ROWS)
+
+    assert index.similar("envio_canarias", k=1)[0][0] == 0
+    assert index.similar("devolución", k=1)[0][0] == 1
+    assert index.similar("pgos", k=1, min_similarity=0.2)[0][0] == 3
+
+
+def test_similar_respeta_umbral_y_orden():
+    index = trigram.TrigramIndex(FAQ_ROWS)
+
+    hits = index.similar("envios canarias", k=3, min_similarity=0.3)
+    assert hits[0] == (0, 1.0)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    assert index.similar("zzzz", k=3) == []
@@ -0,0 +1,100 @@
+# tests/test_vector_index.py
+
+import csv
+
+from bot import vector_index
+
+
+FAQ_ROWS = [
+    {
+        "categoria": "envios",
+        "pregunta_canonica": "¿Cuánto tardan los envíos a España?",
+        "respuesta_base": "Los envíos a España peninsular tardan entre 24 y 48 horas laborables.",
+    },
+    {
+        "categoria": "envios_canarias",
+        "pregunta_canonica": "¿Envían a Canarias?",
+        "respuesta_base": "Sí, enviamos a Canarias. El plazo de entrega es de 5 a 7 días laborables.",
+    },
+    {
+        "categoria": "devoluciones",
+        "pregunta_canonica": "¿Cuál es vuestra política de devoluciones?",
+        "respuesta_base": "Aceptamos devoluciones durante los primeros 30 días.",
+    },
+]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["categoria", "pregunta_canonica", "respuesta_base"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_hashing_vectorizer_es_estable():
+    """
+    El mismo texto debe dar siempre el mismo vector (crc32, no hash()).
+    """
+    vec = vector_index.HashingVectorizer(dims=64)
+    a = vec.counts("devolución del pedido")
+    b = vec.counts("devolución del pedido")
+    assert a.shape == (64,)
+    assert (a == b).all()
+    assert a.sum() > 0
+
+
+def test_vector_search_top_k_ordenado():
+    index = vector_index.VectorIndex.from_rows(FAQ_ROWS, dims=256)
+
+    hits = index.search("quiero hacer una devolución", k=2)
+
+    assert len(hits) <= 2
+    assert hits[0][0] == 2
+    assert hits[0][1] <= 1.0 + 1e-6
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+
+def test_load_or_build_persiste_por_hash_del_csv(tmp_path):
+    """
+    La primera llamada guarda el índice; la segunda lo lee de disco.
+    Si cambia el contenido del CSV, cambia el fichero del índice.
+    """
+    csv_path = tmp_path / "faq.csv"
+    cache_dir = tmp_path / "idx"
+    _write_csv(csv_path, FAQ_ROWS)
+
+    digest = vector_index.file_sha256(str(csv_path))
+
+    first = vector_index.load_or_build(FAQ_ROWS, digest, str(cache_dir), dims=128)
+    files = list(cache_dir.iterdir())
+    assert len(files) == 1
+
+    second = vector_index.load_or_build(FAQ_ROWS, digest, str(cache_dir), dims=128)
+    assert second.rows is FAQ_ROWS
+    assert (second.matrix == first.matrix).all()
+
+    _write_csv(csv_path, FAQ_ROWS[:2])
+    digest = vector_index.file_sha256(str(csv_path))
+    vector_index.load_or_build(FAQ_ROWS[:2], digest, str(cache_dir), dims=128)
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_vector_search_many_equivale_a_search():
+    index = vector_index.VectorIndex.from_rows(FAQ_ROWS, dims=256)
+    consultas = ["devolución", "envío a Canarias", "cuánto tarda España"]
+
+    lote = index.search_many(consultas, k=2)
+
+    for consulta, hits in zip(consultas, lote):
+        esperado = index.search(consulta, k=2)
+        assert [i for i, _ in hits] == [i for i, _ in esperado]
+
+
+def test_vector_search_empates_por_row_id():
+    filas = [FAQ_ROWS[0], FAQ_ROWS[2], FAQ_ROWS[2], FAQ_ROWS[2]]
+    index = vector_index.VectorIndex.from_rows(filas, dims=256)
+
+    hits = index.search("devolución", k=3)
+
+    assert [i for i, _ in hits] == [1, 2, 3]
+    assert [i for i, _ in hits] == [i for i, _ in index.search_many(["devolución"], k=3)[0]]